@@ -1,7 +1,13 @@
+import os
+import sys
 from typing import List
 import behave
 from nats.aio.msg import Msg
 
+# Raw messages are encoded by the fetcher, its wire format reads them back
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "packages", "market-data", "ohlc-fetcher", "src"))
+from wire_format import decode_message
+
 base_subject = "market-data.raw"
 
 @behave.given(u'a request is made for "{coin_pair}" data')
@@ -15,6 +21,7 @@ def step_subject_pushed(context, subject):
     msgs: List[Msg] = context.loop.run_until_complete(sub.fetch(1, timeout=3600))
     assert len(msgs) == 1
     msg = msgs[0]
-    assert msg.data.decode("utf-8") != ""
-    print(f"Message received {msg.data.decode('utf-8')}")
+    ohlc_data = decode_message(msg.data, msg.headers)
+    assert not ohlc_data.empty
+    print(f"Message received {ohlc_data}")
     msgs[0].ack()
@@ -0,0 +1,190 @@
+"""
+Benchmarks for the feature-engineering hot path.
+
+Times every indicator group, get_features as a whole, the incremental engine, the
+decode/encode round trip and processor.process_payload with the default config on
+synthetic OHLC frames, and records the peak memory of each step. Results are saved as JSON so runs can be compared:
+
+    PYTHONPATH=src python benchmarks/features_benchmark.py --sizes 100,10000,1000000
+    PYTHONPATH=src python benchmarks/features_benchmark.py --compare benchmarks/results/<previous>.json
+
+With --compare the run fails when a step got slower than --threshold times the baseline.
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from config import Config
+from incremental_features import IncrementalFeatures
+import processor
+from processor import get_features
+from ta_features import CANDLE_PATTERNS, OSCILLATORS, TIMELY_FEATURES, registry
+from wire_format import decode_message, encode_message
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def synthetic_ohlc(rows: int, seed: int = 42) -> DataFrame:
+    """
+    Random walk candles shaped like the frames the fetcher publishes.
+    """
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.003, rows)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.002, rows))
+    return DataFrame({
+        "Date": pd.date_range("2020-01-01", periods=rows, freq="15min").to_numpy(dtype="datetime64[ns]"),
+        "Open": open_,
+        "High": np.maximum(open_, close) * (1 + spread),
+        "Low": np.minimum(open_, close) * (1 - spread),
+        "Close": close,
+        "Volume": rng.lognormal(2, 1, rows)
+    })
+
+
+def measure(step: Callable[[], object], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        step()
+        timings.append(time.perf_counter() - started)
+
+    # Peak memory is traced on a separate run, tracing slows the code down
+    tracemalloc.start()
+    step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"min_s": min(timings), "median_s": statistics.median(timings), "peak_mb": peak / 1e6}
+
+
+def benchmark_size(rows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    candles = synthetic_ohlc(rows)
+    repeat = repeat if rows < 1_000_000 else max(1, repeat // 3)
+    steps: Dict[str, Callable[[], object]] = {
+        "oscillators": lambda: registry.build(candles, OSCILLATORS),
+        "patterns": lambda: registry.build(candles, CANDLE_PATTERNS),
+        "timely": lambda: registry.build(candles, TIMELY_FEATURES),
+        "get_features": lambda: get_features(candles),
+    }
+
+    features = get_features(candles)
+    for wire_format in ("json", "columnar"):
+        raw_message = encode_message(candles, wire_format)
+        steps[f"decode_raw_{wire_format}"] = lambda message=raw_message: decode_message(*message)
+        steps[f"encode_features_{wire_format}"] = lambda wire_format=wire_format: encode_message(features, wire_format)
+
+    if rows <= 100_000:
+        # What a worker does for every message: the pair is warm and the window is sent again
+        config = Config()
+        processor._engines.clear()
+        processor._aggregators.clear()
+        for wire_format in ("json", "columnar"):
+            data, headers = encode_message(candles, wire_format)
+            processor.process_payload(f"BENCH-{wire_format}", data, headers, config)
+            steps[f"process_message_{wire_format}"] = lambda pair=f"BENCH-{wire_format}", data=data, headers=headers: processor.process_payload(
+                pair, data, headers, config)
+
+        def incremental():
+            engine = IncrementalFeatures(volume_window=100)
+            engine.update_frame(candles)
+            return engine
+        steps["incremental_replay"] = incremental
+
+    results = {}
+    for name, step in steps.items():
+        results[name] = measure(step, repeat)
+        logger.info(f"{rows:>9} rows {name:<28} {results[name]['median_s'] * 1000:>10.2f}ms {results[name]['peak_mb']:>9.1f}MB")
+
+    # Cost of one new candle on a warm engine, the steady state of the service
+    engine = IncrementalFeatures(volume_window=100)
+    engine.update_frame(candles.iloc[:min(rows, 1000)])
+    window = candles.iloc[max(min(rows, 1000) - 100, 0):min(rows, 1000)]
+    results["incremental_message"] = measure(lambda: engine.update_frame(window), repeat * 10)
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    for size, steps in results["sizes"].items():
+        for name, result in steps.items():
+            previous = baseline.get("sizes", {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            ratio = result["median_s"] / previous["median_s"] if previous["median_s"] > 0 else 1.0
+            marker = "REGRESSION" if ratio > threshold else ""
+            print(f"{size:>9} {name:<28} {previous['median_s'] * 1000:>10.2f}ms -> {result['median_s'] * 1000:>10.2f}ms  x{ratio:.2f} {marker}")
+            if ratio > threshold:
+                regressions.append(f"{size}:{name}")
+    return regressions
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the feature-engineering pipeline")
+    parser.add_argument("--sizes", default="100,1000,10000,100000,1000000", help="Comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Results file, defaults to benchmarks/results/<timestamp>-<revision>.json")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = _parse_args(argv)
+    revision = _git_revision()
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": revision,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "sizes": {}
+    }
+    for size in (int(value) for value in args.sizes.split(",")):
+        results["sizes"][str(size)] = benchmark_size(size, args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{revision or 'unknown'}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            logger.error(f"{len(regressions)} steps slower than x{args.threshold}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
+    # The processor logs every message it handles
+    logging.getLogger("processor").setLevel(logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import List, Tuple
+
+from nats.aio.msg import Msg
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Lower bound for AckWait, the JetStream default
+MIN_ACK_WAIT_SECONDS = 30.0
+
+def tune_consumer(config: Config, latency: float) -> Tuple[float, int]:
+    """
+    AckWait and MaxAckPending for the consumer given the slowest message seen so far.
+    A message can wait for a worker, be processed and then sit in the ack batch, all of it
+    has to fit in AckWait with room to spare. MaxAckPending covers every message this
+    instance holds at once so the server never delivers more than it can work on.
+    """
+    ack_wait = max(MIN_ACK_WAIT_SECONDS, 2 * (latency + config.ack_interval))
+    max_ack_pending = config.max_in_flight + config.ack_batch
+    return ack_wait, max_ack_pending
+
+class AckBatcher:
+    """
+    Collects processed messages and acks them together, once `batch_size` of them are
+    waiting or every `interval` seconds. The acks of a batch go out in a single flush.
+    stop ends run after the flush in progress and flushes whatever is left.
+    """
+
+    def __init__(self, batch_size: int, interval: float) -> None:
+        self._batch_size = batch_size
+        self._interval = interval
+        self._pending: List[Msg] = []
+        self._stopped = asyncio.Event()
+        self.acked = 0
+
+    async def add(self, msg: Msg) -> None:
+        self._pending.append(msg)
+        if len(self._pending) >= self._batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        results = await asyncio.gather(*(msg.ack() for msg in pending), return_exceptions=True)
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        self.acked += len(pending) - failed
+        if failed:
+            logger.error(f"Failed to ack {failed} of {len(pending)} messages, JetStream will redeliver them")
+        else:
+            logger.debug(f"Acked {len(pending)} messages")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+            # Cancelling a flush midway would drop the acks it already took out of the batch
+            await asyncio.shield(self.flush())
+        await self.flush()
@@ -1,5 +1,15 @@
 import os
 
+from timeframes import parse_timeframe
+
+FEATURE_EXECUTORS = ("process", "thread", "inline")
+
+def _available_cpus() -> int:
+    # Honours the CPU set of the container instead of the cores of the host
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
 class Config:
     def __init__(self) -> None:
         self.port = int(os.getenv("PORT", 5100))
@@ -8,3 +18,29 @@ class Config:
         self.consumer_name = os.getenv("CONSUMER_NAME", "feature-engineering")
         self.raw_subject = os.getenv("RAW_SUBJECT", "market-data.raw.>")
         self.processed_subject = os.getenv("PROCESSESD_SUBJECT", "market-data.processed")
+        self.wire_format = os.getenv("WIRE_FORMAT", "columnar")
+        self.feature_engine = os.getenv("FEATURE_ENGINE", "incremental")
+        self.volume_window = int(os.getenv("VOLUME_WINDOW", 100))
+        # Comma separated subset of the registered features, all of them when empty
+        self.features = [feature for feature in os.getenv("FEATURES", "").split(",") if feature] or None
+        self.feature_executor = os.getenv("FEATURE_EXECUTOR", "process")
+        if self.feature_executor not in FEATURE_EXECUTORS:
+            raise ValueError(f"Unknown FEATURE_EXECUTOR {self.feature_executor}. Expected one of {FEATURE_EXECUTORS}")
+        self.feature_workers = int(os.getenv("FEATURE_WORKERS", _available_cpus()))
+        self.feature_queue_size = int(os.getenv("FEATURE_QUEUE_SIZE", self.feature_workers * 2))
+        self.fetch_batch = int(os.getenv("FETCH_BATCH", 32))
+        self.fetch_timeout = float(os.getenv("FETCH_TIMEOUT_SECONDS", 5))
+        self.max_in_flight = int(os.getenv("MAX_IN_FLIGHT", max(self.fetch_batch, self.feature_queue_size)))
+        self.ack_batch = int(os.getenv("ACK_BATCH", self.fetch_batch))
+        self.ack_interval = float(os.getenv("ACK_INTERVAL_SECONDS", 0.5))
+        # Directory of the on-disk feature store, disabled when empty
+        self.feature_store_path = os.getenv("FEATURE_STORE_PATH", "")
+        # Timeframe of the raw stream, the others are aggregated from it
+        self.base_timeframe = os.getenv("BASE_TIMEFRAME", "15m")
+        self.timeframes = [timeframe for timeframe in os.getenv("TIMEFRAMES", "15m,1h,4h,1d").split(",") if timeframe]
+        for timeframe in self.timeframes:
+            parse_timeframe(timeframe)
+        self.aggregate_history = int(os.getenv("AGGREGATE_HISTORY", 720))
+        # Key-value bucket of the per-pair state checkpoints, disabled when empty
+        self.checkpoint_bucket = os.getenv("CHECKPOINT_BUCKET", "feature-engineering-state")
+        self.checkpoint_interval = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", 60))
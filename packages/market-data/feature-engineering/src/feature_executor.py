@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+import zlib
+
+from config import Config
+from processor import process_payload
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class FeatureExecutor:
+    """
+    Runs process_payload away from the event loop.
+
+    - process: one single-worker process per slot. A pair always hashes to the same slot,
+      which keeps its feature engine in one place and runs its messages in arrival order.
+    - thread: a shared thread pool, engines live in this process.
+    - inline: on the event loop, like before.
+
+    At most `feature_queue_size` payloads are submitted at once; callers wait for a free
+    slot, which slows down consumption while the workers are saturated. When a worker
+    process dies it is replaced and `on_worker_lost` is called with its slot, since the
+    engines of the pairs on that slot are gone.
+    """
+
+    def __init__(self, config: Config, on_worker_lost: Optional[Callable[[int], None]] = None) -> None:
+        self._config = config
+        self._on_worker_lost = on_worker_lost
+        self._mode = config.feature_executor
+        self._workers = max(config.feature_workers, 1)
+        self._slots = asyncio.Semaphore(max(config.feature_queue_size, 1))
+        self._pools: List[Executor] = []
+        if self._mode == "process":
+            self._pools = [ProcessPoolExecutor(max_workers=1) for _ in range(self._workers)]
+        elif self._mode == "thread":
+            self._pools = [ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="features")]
+        logger.info(f"Feature executor configured [mode={self._mode}, workers={self._workers}, queue={config.feature_queue_size}]")
+
+    def slot(self, coin_pair: str) -> int:
+        # crc32 instead of hash() so the slot of a pair doesn't change between runs
+        return zlib.crc32(coin_pair.encode("utf-8")) % len(self._pools)
+
+    async def run(self, coin_pair: str, data: bytes, headers: Optional[Dict[str, str]]) -> List[Tuple[str, bytes, Dict[str, str]]]:
+        return await self.call(coin_pair, process_payload, coin_pair, data, headers, self._config)
+
+    async def call(self, coin_pair: str, function: Callable[..., T], *args) -> T:
+        """
+        Runs `function` where the engines of `coin_pair` live. With the process executor it
+        has to be a module level function.
+        """
+        async with self._slots:
+            if not self._pools:
+                return function(*args)
+
+            slot = self.slot(coin_pair)
+            pool = self._pools[slot]
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(pool, function, *args)
+            except BrokenProcessPool:
+                # Every call that was waiting on the dead worker fails, only the first one replaces it
+                if self._pools[slot] is pool:
+                    # The engines of the pairs on this slot are gone, the next full window warms them up again
+                    logger.error(f"Feature worker {slot} died. Starting a new one")
+                    self._pools[slot] = ProcessPoolExecutor(max_workers=1)
+                    if self._on_worker_lost is not None:
+                        self._on_worker_lost(slot)
+                raise
+
+    def shutdown(self) -> None:
+        for pool in self._pools:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,41 @@
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+class FeatureMatrix:
+    """
+    Preallocated float64 matrix with one column per feature. Columns are stored
+    contiguously (Fortran order) so indicators are written straight into them and the
+    whole matrix becomes a single DataFrame block at the end.
+    """
+
+    def __init__(self, index: np.ndarray, columns: Sequence[str], index_name: str = "Date") -> None:
+        self.index = index
+        self.index_name = index_name
+        self.columns = list(columns)
+        self._positions: Dict[str, int] = {name: position for position, name in enumerate(self.columns)}
+        self.values = np.empty((len(index), len(self.columns)), dtype=np.float64, order="F")
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.values[:, self._positions[name]]
+
+    def __setitem__(self, name: str, values: np.ndarray) -> None:
+        self.values[:, self._positions[name]] = values
+
+    def complete_rows(self) -> np.ndarray:
+        # Warm-up rows and divisions by zero leave nan/inf behind
+        return np.isfinite(self.values).all(axis=1)
+
+    def to_frame(self, dropna: bool = True) -> DataFrame:
+        values, index = self.values, self.index
+        if dropna:
+            rows = self.complete_rows()
+            if not rows.all():
+                values, index = values[rows], index[rows]
+        return DataFrame(values, index=pd.Index(index, name=self.index_name), columns=pd.Index(self.columns), copy=False)
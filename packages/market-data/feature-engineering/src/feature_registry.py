@@ -0,0 +1,127 @@
+"""
+Declarative registry of features and the intermediates they are built from.
+
+Features and intermediates are registered with the names of the nodes they depend on.
+The planner walks the dependencies of the requested features and computes every node
+once per frame, so an SMA or a rolling statistic shared by several features is only
+calculated a single time. Input columns of the raw frame are always available as nodes.
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pandas import DataFrame
+
+from feature_matrix import FeatureMatrix
+
+INPUT_COLUMNS = ("Date", "Open", "High", "Low", "Close", "Volume")
+
+
+class Node:
+    def __init__(self, name: str, compute: Callable[..., np.ndarray], dependencies: Sequence[str], is_feature: bool) -> None:
+        self.name = name
+        self.compute = compute
+        self.dependencies = tuple(dependencies)
+        self.is_feature = is_feature
+
+    def __repr__(self) -> str:
+        return f"Node({self.name}, dependencies={self.dependencies})"
+
+
+class FeatureRegistry:
+    def __init__(self) -> None:
+        self._nodes: Dict[str, Node] = {}
+        # Registration order is the column order of the computed features
+        self.features: List[str] = []
+
+    def _register(self, name: str, dependencies: Sequence[str], is_feature: bool):
+        if name in self._nodes or name in INPUT_COLUMNS:
+            raise ValueError(f"Node {name} is already registered")
+        for dependency in dependencies:
+            if dependency not in self._nodes and dependency not in INPUT_COLUMNS:
+                raise ValueError(f"Node {name} depends on unknown node {dependency}")
+
+        def decorator(compute: Callable[..., np.ndarray]) -> Callable[..., np.ndarray]:
+            self._nodes[name] = Node(name, compute, dependencies, is_feature)
+            if is_feature:
+                self.features.append(name)
+            return compute
+
+        return decorator
+
+    def intermediate(self, name: str, *dependencies: str):
+        return self._register(name, dependencies, is_feature=False)
+
+    def feature(self, name: str, *dependencies: str):
+        return self._register(name, dependencies, is_feature=True)
+
+    def plan(self, features: Optional[Sequence[str]] = None) -> List[Node]:
+        """
+        Nodes needed for `features` (every feature by default) in dependency order,
+        each of them listed once.
+        """
+        requested = self.features if features is None else features
+        planned: Dict[str, Node] = {}
+
+        def visit(name: str):
+            if name in planned or name in INPUT_COLUMNS:
+                return
+            node = self._nodes.get(name)
+            if node is None:
+                raise ValueError(f"Unknown feature {name}")
+            for dependency in node.dependencies:
+                visit(dependency)
+            planned[name] = node
+
+        for name in requested:
+            visit(name)
+        return list(planned.values())
+
+    def _inputs(self, data, names: Sequence[str]) -> Dict[str, np.ndarray]:
+        # The price columns come out of the frame in a single copy, each row of the block is a contiguous array
+        prices = [name for name in INPUT_COLUMNS if name in names and name != "Date"]
+        inputs: Dict[str, np.ndarray] = {}
+        if prices:
+            if isinstance(data, DataFrame):
+                block = np.ascontiguousarray(data[prices].to_numpy(dtype=np.float64).T)
+            else:
+                block = np.array([data[name] for name in prices], dtype=np.float64)
+            inputs.update(zip(prices, block))
+        if "Date" in names:
+            inputs["Date"] = np.asarray(data["Date"])
+        return inputs
+
+    def _evaluate(self, data, features: Sequence[str]) -> Iterator[Tuple[Node, np.ndarray]]:
+        plan = self.plan(features)
+        needed = {dependency for node in plan for dependency in node.dependencies}
+        values = self._inputs(data, needed)
+        # Same as pandas, a zero denominator gives inf/nan without warnings
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for node in plan:
+                result = node.compute(*(values[dependency] for dependency in node.dependencies))
+                if node.name in needed:
+                    values[node.name] = result
+                yield node, result
+
+    def compute(self, data, features: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Computes the requested features over the raw frame, returned in the requested order.
+        """
+        requested = self.features if features is None else features
+        values = {node.name: result for node, result in self._evaluate(data, requested) if node.name in requested}
+        return {name: values[name] for name in requested}
+
+    def fill(self, matrix: FeatureMatrix, data, features: Optional[Sequence[str]] = None) -> FeatureMatrix:
+        """
+        Writes the requested features (every column of the matrix by default) into their columns.
+        """
+        requested = matrix.columns if features is None else features
+        wanted = set(requested)
+        for node, result in self._evaluate(data, requested):
+            if node.name in wanted:
+                matrix[node.name] = result
+        return matrix
+
+    def build(self, data: DataFrame, features: Optional[Sequence[str]] = None) -> FeatureMatrix:
+        requested = self.features if features is None else features
+        matrix = FeatureMatrix(data["Date"].to_numpy(), requested)
+        return self.fill(matrix, data, requested)
@@ -0,0 +1,268 @@
+"""
+On-disk columnar store for computed features, keyed by (pair, timestamp).
+
+    <root>/<pair>/<YYYY-MM>/schema.json
+    <root>/<pair>/<YYYY-MM>/<column>.bin
+
+Every column of a monthly partition is a raw little-endian array in its own file, rows
+sorted by Date. Appends write the new rows at the end of each file, with Date last, so a
+reader never sees more dates than values. A row whose timestamp is already stored is
+overwritten in place: the processor writes the rows every update revised or appended,
+so a candle first stored while still open gets its final values with the next frame.
+Reads memory-map only the partitions and columns of the requested range.
+
+Rewrites build the partition in a hidden `.<YYYY-MM>.tmp` sibling and swap it in through
+`.<YYYY-MM>.old`. Readers only list `<YYYY-MM>` directories, fall back to `.old` while the
+partition is being swapped and read a partition again if it was swapped under them. The
+writer of a pair finishes or rolls back a swap interrupted by a crash before writing it.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+logger = logging.getLogger(__name__)
+
+DATE_COLUMN = "Date"
+_DATE_DTYPE = np.dtype("<i8")
+_VALUE_DTYPE = np.dtype("<f8")
+_PARTITION = re.compile(r"\d{4}-\d{2}")
+_SWAP = re.compile(r"\.(\d{4}-\d{2})\.(tmp|old)")
+# Times a reader tries a partition that keeps being swapped under it
+_READ_ATTEMPTS = 3
+
+
+def _partition_name(month: np.datetime64) -> str:
+    return str(month.astype("datetime64[M]"))
+
+
+class FeatureStore:
+    def __init__(self, root: str) -> None:
+        self._root = root
+        self._recovered: Set[str] = set()
+        os.makedirs(root, exist_ok=True)
+
+    def pairs(self) -> List[str]:
+        return sorted(name for name in os.listdir(self._root) if os.path.isdir(os.path.join(self._root, name)))
+
+    def _pair_path(self, pair: str) -> str:
+        return os.path.join(self._root, pair.replace("/", "-"))
+
+    def _partitions(self, pair: str) -> List[str]:
+        path = self._pair_path(pair)
+        if not os.path.isdir(path):
+            return []
+        names = set()
+        for name in os.listdir(path):
+            swap = _SWAP.fullmatch(name)
+            if _PARTITION.fullmatch(name):
+                names.add(name)
+            elif swap and swap.group(2) == "old":
+                # Between the two renames of a rewrite only the old partition is there
+                names.add(swap.group(1))
+        return sorted(names)
+
+    def _partition_path(self, pair: str, partition: str) -> str:
+        path = os.path.join(self._pair_path(pair), partition)
+        old_path = os.path.join(self._pair_path(pair), f".{partition}.old")
+        if not os.path.isdir(path) and os.path.isdir(old_path):
+            return old_path
+        return path
+
+    def _recover(self, pair: str) -> None:
+        """
+        Finishes the rewrites of `pair` a crash left half done. A complete .tmp (schema.json
+        is written last) replaces a missing partition, otherwise the .old one comes back.
+        Only the process writing `pair` may call this, it deletes leftovers of its rewrites.
+        """
+        path = self._pair_path(pair)
+        if not os.path.isdir(path):
+            return
+        for name in sorted(os.listdir(path)):
+            swap = _SWAP.fullmatch(name)
+            if not swap:
+                continue
+            leftover = os.path.join(path, name)
+            partition = os.path.join(path, swap.group(1))
+            if not os.path.isdir(partition):
+                tmp_path = os.path.join(path, f".{swap.group(1)}.tmp")
+                source = tmp_path if os.path.exists(os.path.join(tmp_path, "schema.json")) else leftover
+                if os.path.isdir(source):
+                    logger.warning(f"Restoring feature partition {partition} from {source}")
+                    os.replace(source, partition)
+            shutil.rmtree(leftover, ignore_errors=True)
+
+    def _columns(self, path: str) -> List[str]:
+        with open(os.path.join(path, "schema.json"), "r") as f:
+            return json.load(f)["columns"]
+
+    def _write_schema(self, path: str, columns: Sequence[str]) -> None:
+        tmp_path = os.path.join(path, "schema.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"columns": list(columns)}, f)
+        os.replace(tmp_path, os.path.join(path, "schema.json"))
+
+    def _read_dates(self, path: str) -> np.ndarray:
+        file = os.path.join(path, f"{DATE_COLUMN}.bin")
+        if not os.path.exists(file) or os.path.getsize(file) == 0:
+            return np.empty(0, dtype=_DATE_DTYPE)
+        return np.memmap(file, dtype=_DATE_DTYPE, mode="r")
+
+    def _read_column(self, path: str, column: str, rows: int) -> np.ndarray:
+        file = os.path.join(path, f"{column}.bin")
+        if not os.path.exists(file) or rows == 0:
+            # Columns added after the partition was written read as missing
+            return np.full(rows, np.nan)
+        return np.memmap(file, dtype=_VALUE_DTYPE, mode="r", shape=(rows,))
+
+    def write(self, pair: str, features: DataFrame) -> int:
+        """
+        Stores feature rows indexed by Date. Returns how many rows were new.
+        """
+        if features.empty:
+            return 0
+        dates = features.index.to_numpy(dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        values = features.to_numpy(dtype=np.float64)[order]
+        columns = [str(column) for column in features.columns]
+        if pair not in self._recovered:
+            self._recover(pair)
+            self._recovered.add(pair)
+
+        months = dates.astype("datetime64[M]")
+        boundaries = np.flatnonzero(np.diff(months.astype(np.int64))) + 1
+        added = 0
+        for rows in np.split(np.arange(len(dates)), boundaries):
+            path = os.path.join(self._pair_path(pair), _partition_name(months[rows[0]]))
+            added += self._write_partition(path, dates[rows].astype(_DATE_DTYPE), values[rows], columns)
+        return added
+
+    def _write_partition(self, path: str, dates: np.ndarray, values: np.ndarray, columns: List[str]) -> int:
+        os.makedirs(path, exist_ok=True)
+        if not os.path.exists(os.path.join(path, "schema.json")):
+            self._write_schema(path, columns)
+        stored_columns = self._columns(path)
+        stored_dates = self._read_dates(path)
+
+        if len(stored_dates) and dates[0] <= stored_dates[-1]:
+            positions = np.searchsorted(stored_dates, dates)
+            existing = (positions < len(stored_dates)) & (stored_dates[np.minimum(positions, len(stored_dates) - 1)] == dates)
+            newer = dates > stored_dates[-1]
+            if not (existing | newer).all() or set(columns) - set(stored_columns):
+                # Rows in the middle of the partition or new columns, the partition is rewritten
+                return self._rewrite_partition(path, stored_dates, stored_columns, dates, values, columns)
+            self._overwrite(path, positions[existing], values[existing], columns)
+            dates, values = dates[newer], values[newer]
+        elif set(columns) - set(stored_columns):
+            return self._rewrite_partition(path, stored_dates, stored_columns, dates, values, columns)
+
+        if len(dates) == 0:
+            return 0
+        positions = {column: position for position, column in enumerate(columns)}
+        for column in stored_columns:
+            column_values = values[:, positions[column]] if column in positions else np.full(len(dates), np.nan)
+            with open(os.path.join(path, f"{column}.bin"), "ab") as f:
+                f.write(np.ascontiguousarray(column_values, dtype=_VALUE_DTYPE).tobytes())
+        with open(os.path.join(path, f"{DATE_COLUMN}.bin"), "ab") as f:
+            f.write(dates.tobytes())
+        return len(dates)
+
+    def _overwrite(self, path: str, positions: np.ndarray, values: np.ndarray, columns: List[str]) -> None:
+        if len(positions) == 0:
+            return
+        for position, column in enumerate(columns):
+            stored = np.memmap(os.path.join(path, f"{column}.bin"), dtype=_VALUE_DTYPE, mode="r+")
+            stored[positions] = values[:, position]
+            stored.flush()
+            del stored
+
+    def _rewrite_partition(self, path: str, stored_dates: np.ndarray, stored_columns: List[str], dates: np.ndarray, values: np.ndarray, columns: List[str]) -> int:
+        merged_columns = stored_columns + [column for column in columns if column not in stored_columns]
+        stored = DataFrame(
+            {column: np.array(self._read_column(path, column, len(stored_dates))) for column in stored_columns},
+            index=np.array(stored_dates)
+        )
+        incoming = DataFrame(values, index=dates, columns=pd.Index(columns))
+        merged = incoming.combine_first(stored).reindex(columns=merged_columns)
+        added = len(merged) - len(stored)
+
+        parent, partition = os.path.split(path)
+        tmp_path = os.path.join(parent, f".{partition}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for column in merged_columns:
+            merged[column].to_numpy(dtype=_VALUE_DTYPE).tofile(os.path.join(tmp_path, f"{column}.bin"))
+        merged.index.to_numpy(dtype=_DATE_DTYPE).tofile(os.path.join(tmp_path, f"{DATE_COLUMN}.bin"))
+        self._write_schema(tmp_path, merged_columns)
+
+        old_path = os.path.join(parent, f".{partition}.old")
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logger.info(f"Rewrote feature partition {path} with {len(merged)} rows")
+        return added
+
+    def read(self, pair: str, start: Optional[np.datetime64] = None, end: Optional[np.datetime64] = None,
+             columns: Optional[Sequence[str]] = None) -> DataFrame:
+        """
+        Feature rows of `pair` with start <= Date < end, indexed by Date.
+        """
+        start_ns = np.datetime64(start, "ns").astype(np.int64) if start is not None else None
+        end_ns = np.datetime64(end, "ns").astype(np.int64) if end is not None else None
+        first_partition = _partition_name(np.datetime64(start, "M")) if start is not None else None
+        last_partition = _partition_name(np.datetime64(end, "M")) if end is not None else None
+
+        selected: List[Dict[str, np.ndarray]] = []
+        dates: List[np.ndarray] = []
+        names: List[str] = list(columns) if columns is not None else []
+        for partition in self._partitions(pair):
+            if (first_partition and partition < first_partition) or (last_partition and partition > last_partition):
+                continue
+            chunk_dates, chunk = self._read_partition(pair, partition, start_ns, end_ns, columns)
+            if len(chunk_dates) == 0:
+                continue
+            names += [column for column in chunk if column not in names]
+            dates.append(chunk_dates)
+            selected.append(chunk)
+
+        rows = sum(len(chunk) for chunk in dates)
+        result = np.full((rows, len(names)), np.nan)
+        offset = 0
+        for chunk_dates, chunk in zip(dates, selected):
+            for column, column_values in chunk.items():
+                result[offset:offset + len(chunk_dates), names.index(column)] = column_values
+            offset += len(chunk_dates)
+
+        index = pd.Index(np.concatenate(dates).view("datetime64[ns]") if dates else np.empty(0, dtype="datetime64[ns]"), name=DATE_COLUMN)
+        return DataFrame(result, index=index, columns=pd.Index(names))
+
+    def _read_partition(self, pair: str, partition: str, start_ns: Optional[int], end_ns: Optional[int],
+                        columns: Optional[Sequence[str]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        for attempt in range(1, _READ_ATTEMPTS + 1):
+            path = self._partition_path(pair, partition)
+            try:
+                inode = os.stat(path).st_ino
+                stored_dates = self._read_dates(path)
+                lower = np.searchsorted(stored_dates, start_ns) if start_ns is not None else 0
+                upper = np.searchsorted(stored_dates, end_ns) if end_ns is not None else len(stored_dates)
+                if upper <= lower:
+                    return np.empty(0, dtype=_DATE_DTYPE), {}
+                chunk = {
+                    column: np.array(self._read_column(path, column, len(stored_dates))[lower:upper])
+                    for column in (columns if columns is not None else self._columns(path))
+                }
+                # A rewrite swaps in a new directory, values read across it may not line up
+                if os.stat(path).st_ino == inode:
+                    return np.array(stored_dates[lower:upper]), chunk
+            except FileNotFoundError:
+                if attempt == _READ_ATTEMPTS:
+                    raise
+            logger.debug(f"Feature partition {path} was rewritten while reading it, reading it again")
+        raise RuntimeError(f"Feature partition {partition} of {pair} kept changing while reading it")
@@ -0,0 +1,333 @@
+"""
+Incremental version of the ta_features indicators.
+
+Every pair gets an IncrementalFeatures engine that keeps the rolling state of each
+indicator (ring buffers with running sums, Wilder averages for RSI and the last few
+candles for the candlestick patterns), so a new candle costs the same no matter how
+long the history is. The values match talib run over the whole series the engine has
+seen; zsVol uses the last `volume_window` candles, which is what the batch path gives
+for the latest row of a window of that size.
+
+The newest candle is usually still open and arrives again with updated values. A
+candle with the same timestamp as the last one replaces it instead of being appended,
+and update_frame returns the rows of every candle it revised or appended, so the final
+values of a candle that closed go out with the next frame. Engines of aggregated
+timeframes also get older candles revised; with `rewind` they keep their state from
+before each of the last few candles and apply the candles from a revised one again.
+"""
+from collections import deque
+import copy
+import logging
+import math
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pandas import DataFrame
+import talib
+
+from feature_matrix import FeatureMatrix
+from ta_features import CANDLE_PATTERNS, OSCILLATORS, TIMELY_FEATURES, registry
+
+logger = logging.getLogger(__name__)
+
+FEATURE_COLUMNS = OSCILLATORS + CANDLE_PATTERNS
+
+# Same threshold talib uses in TA_IS_ZERO
+_TA_EPSILON = 0.00000001
+# Candles needed to evaluate every pattern on the latest one (largest talib lookback is 14)
+_PATTERN_CANDLES = 15
+_PATTERN_FUNCTIONS = tuple(getattr(talib, pattern) for pattern in CANDLE_PATTERNS)
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    # The batch path turns the inf/nan of a zero denominator into nan before dropping the row
+    if denominator == 0 or math.isnan(denominator):
+        return math.nan
+    return numerator / denominator
+
+
+class RollingWindow:
+    """
+    Ring buffer over the last `size` values keeping their running sum and sum of squares.
+    Sums are recomputed from the buffer every time it wraps around so rounding errors
+    don't pile up over long streams.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self._values = np.zeros(size)
+        self._head = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.size
+
+    def push(self, value: float) -> None:
+        if self.full:
+            old = self._values[self._head]
+            self.sum -= old
+            self.sum_sq -= old * old
+        else:
+            self.count += 1
+        self._values[self._head] = value
+        self.sum += value
+        self.sum_sq += value * value
+        self._head = (self._head + 1) % self.size
+        if self._head == 0:
+            self.sum = float(self._values.sum())
+            self.sum_sq = float(np.dot(self._values, self._values))
+
+    def update(self, value: float, revise: bool = False) -> None:
+        if revise:
+            self.revise(value)
+        else:
+            self.push(value)
+
+    def revise(self, value: float) -> None:
+        last = (self._head - 1) % self.size
+        old = self._values[last]
+        self._values[last] = value
+        self.sum += value - old
+        self.sum_sq += value * value - old * old
+
+    def mean(self) -> float:
+        return self.sum / self.count
+
+    def variance(self, ddof: int = 0) -> float:
+        if self.count - ddof <= 0:
+            return math.nan
+        return max(self.sum_sq - self.sum * self.sum / self.count, 0.0) / (self.count - ddof)
+
+
+class WilderRSI:
+    """
+    talib's RSI: the first `period` price changes are averaged, later ones go through
+    Wilder's smoothing. The state before the last change is kept so it can be revised.
+    """
+
+    def __init__(self, period: int = 14) -> None:
+        self._period = period
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+        self._previous: Tuple[int, float, float] = (0, 0.0, 0.0)
+
+    def update(self, change: float, revise: bool = False) -> float:
+        if revise:
+            self._count, self._gain, self._loss = self._previous
+        else:
+            self._previous = (self._count, self._gain, self._loss)
+
+        period = self._period
+        self._count += 1
+        if self._count <= period:
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            if self._count < period:
+                return math.nan
+            self._loss /= period
+            self._gain /= period
+        else:
+            self._loss *= period - 1
+            self._gain *= period - 1
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            self._loss /= period
+            self._gain /= period
+
+        total = self._gain + self._loss
+        if -_TA_EPSILON < total < _TA_EPSILON:
+            return 0.0
+        return 100.0 * (self._gain / total)
+
+
+class IncrementalFeatures:
+    """
+    Per-pair feature engine producing the same columns as processor.get_features.
+    Keeps the feature rows of the last `history` candles for to_frame, and the state from
+    before each of the last `rewind` candles for rewind.
+    """
+
+    def __init__(self, volume_window: int = 100, history: int = 1, rewind: int = 0) -> None:
+        self._volume_window = volume_window
+        self._history = history
+        self._rewind = rewind
+        self.reset()
+
+    def reset(self) -> None:
+        self.last_date: Optional[np.datetime64] = None
+        self._close: Optional[float] = None
+        self._prev_close: Optional[float] = None
+        self._returns = RollingWindow(20)
+        self._rsi = WilderRSI(14)
+        self._bbands = RollingWindow(20)
+        self._sma_21 = RollingWindow(21)
+        self._sma_50 = RollingWindow(50)
+        self._sma_100 = RollingWindow(100)
+        self._buying_pressure = [RollingWindow(7), RollingWindow(14), RollingWindow(28)]
+        self._true_range = [RollingWindow(7), RollingWindow(14), RollingWindow(28)]
+        self._volume = RollingWindow(self._volume_window)
+        self._candles: Deque[List[float]] = deque(maxlen=_PATTERN_CANDLES)
+        self._rows: Deque[Tuple[np.datetime64, np.ndarray]] = deque(maxlen=self._history)
+        self._snapshots: Deque[Tuple[np.datetime64, Dict[str, Any]]] = deque(maxlen=self._rewind)
+
+    def _state(self) -> Dict[str, Any]:
+        return copy.deepcopy({name: value for name, value in self.__dict__.items() if name != "_snapshots"})
+
+    def rewind(self, date: np.datetime64) -> bool:
+        """
+        Puts the state back to what it was before the candle at `date`, so that candle and
+        the ones after it can be applied again. False when it is older than the last
+        `rewind` candles, the state is left as it was then.
+        """
+        for position, (snapshot_date, state) in enumerate(self._snapshots):
+            if snapshot_date == date:
+                self.__dict__.update(state)
+                for _ in range(len(self._snapshots) - position):
+                    self._snapshots.pop()
+                return True
+        return False
+
+    def update(self, date: np.datetime64, open_: float, high: float, low: float, close: float, volume: float) -> Optional[np.ndarray]:
+        """
+        Applies one candle and returns its feature row, or None when the candle is older
+        than the last one seen.
+        """
+        if self.last_date is not None and date < self.last_date:
+            return None
+        revise = date == self.last_date
+        if not revise and self._rewind:
+            self._snapshots.append((date, self._state()))
+        if not revise:
+            self._prev_close = self._close
+        self._close = close
+        self.last_date = date
+
+        for window, value in ((self._bbands, close), (self._sma_21, close), (self._sma_50, close),
+                              (self._sma_100, close), (self._volume, volume)):
+            window.update(value, revise)
+        if revise:
+            self._candles[-1] = [open_, high, low, close]
+        else:
+            self._candles.append([open_, high, low, close])
+
+        row = np.empty(len(FEATURE_COLUMNS))
+        row[:len(OSCILLATORS)] = self._oscillators(high, low, close, volume, revise)
+        row[len(OSCILLATORS):] = self._patterns()
+
+        if revise:
+            self._rows[-1] = (date, row)
+        else:
+            self._rows.append((date, row))
+        return row
+
+    def _oscillators(self, high: float, low: float, close: float, volume: float, revise: bool) -> List[float]:
+        z_score = rsi = ultosc = pct_change = math.nan
+        prev_close = self._prev_close
+        if prev_close is not None:
+            log_return = math.log(close) - math.log(prev_close)
+            self._returns.update(log_return, revise)
+            if self._returns.full:
+                z_score = _ratio(log_return - self._returns.mean(), math.sqrt(self._returns.variance(ddof=1)))
+
+            rsi = self._rsi.update(close - prev_close, revise) / 100
+            pct_change = close / prev_close - 1
+            ultosc = self._ultosc(high, low, close, prev_close, revise)
+
+        boll = math.nan
+        if self._bbands.full:
+            middle = self._bbands.mean()
+            # talib computes the deviation from running sums and treats anything this small as zero
+            variance = self._bbands.sum_sq / self._bbands.size - middle * middle
+            deviation = math.sqrt(variance) * 2 if variance >= _TA_EPSILON else 0.0
+            lower = middle - deviation
+            boll = _ratio(close - lower, (middle + deviation) - lower)
+
+        z_volume = _ratio(volume - self._volume.mean(), math.sqrt(self._volume.variance(ddof=1)))
+
+        sma_21 = self._sma_21.mean() if self._sma_21.full else math.nan
+        sma_50 = self._sma_50.mean() if self._sma_50.full else math.nan
+        sma_100 = self._sma_100.mean() if self._sma_100.full else math.nan
+
+        return [
+            z_score, rsi, boll, ultosc, pct_change, z_volume,
+            _ratio(close - sma_21, sma_21), _ratio(sma_21 - sma_50, sma_50),
+            _ratio(sma_50 - sma_100, sma_100), _ratio(close - sma_50, sma_50)
+        ]
+
+    def _ultosc(self, high: float, low: float, close: float, prev_close: float, revise: bool) -> float:
+        true_low = min(low, prev_close)
+        buying_pressure = close - true_low
+        true_range = max(high, prev_close) - true_low
+        for window in self._buying_pressure:
+            window.update(buying_pressure, revise)
+        for window in self._true_range:
+            window.update(true_range, revise)
+        if not self._true_range[-1].full:
+            return math.nan
+
+        output = 0.0
+        for weight, pressure, ranges in zip((4.0, 2.0, 1.0), self._buying_pressure, self._true_range):
+            if not -_TA_EPSILON < ranges.sum < _TA_EPSILON:
+                output += weight * (pressure.sum / ranges.sum)
+        return 100.0 * (output / 7.0) / 100
+
+    def _patterns(self) -> List[float]:
+        # Patterns only look at a fixed number of past candles, so talib over that tail gives the latest value
+        candles = np.array(self._candles)
+        open_, high, low, close = candles[:, 0], candles[:, 1], candles[:, 2], candles[:, 3]
+        return [function(open_, high, low, close)[-1] / 100 for function in _PATTERN_FUNCTIONS]
+
+    def update_frame(self, ohlc_data: DataFrame) -> DataFrame:
+        """
+        Applies the candles of a raw window or delta frame that the engine hasn't seen yet,
+        revising the last known candle. A frame that starts after the last candle means
+        messages were missed, so the state is rebuilt from this frame.
+        Returns the feature rows of the candles it revised or appended, without the ones
+        still warming up.
+        """
+        if ohlc_data.empty:
+            return self._frame([])
+        dates = ohlc_data["Date"].to_numpy(dtype="datetime64[ns]")
+        values = ohlc_data[["Open", "High", "Low", "Close", "Volume"]].to_numpy(dtype=np.float64)
+
+        start = 0
+        if self.last_date is not None:
+            if dates[0] > self.last_date:
+                logger.warning(f"Frame starting at {dates[0]} doesn't overlap the last candle {self.last_date}. Rebuilding state")
+                self.reset()
+            else:
+                start = int(np.searchsorted(dates, self.last_date))
+
+        rows = []
+        for i in range(start, len(dates)):
+            row = self.update(dates[i], *values[i])
+            if row is None:
+                continue
+            # Repeated dates within a frame revise the row just appended
+            if rows and rows[-1][0] == dates[i]:
+                rows[-1] = (dates[i], row)
+            else:
+                rows.append((dates[i], row))
+        return self._frame(rows)
+
+    def to_frame(self) -> DataFrame:
+        """
+        Feature rows of the last `history` candles, shaped like processor.get_features.
+        """
+        return self._frame(self._rows)
+
+    def _frame(self, rows: Sequence[Tuple[np.datetime64, np.ndarray]]) -> DataFrame:
+        dates = np.array([date for date, _ in rows], dtype="datetime64[ns]")
+        matrix = FeatureMatrix(dates, FEATURE_COLUMNS + TIMELY_FEATURES)
+        for position, (_, row) in enumerate(rows):
+            matrix.values[position, :len(FEATURE_COLUMNS)] = row
+        registry.fill(matrix, {"Date": dates}, TIMELY_FEATURES)
+        return matrix.to_frame()
@@ -0,0 +1,164 @@
+"""
+Offline label generation for training sets.
+
+Streams historical OHLC CSV files (the output of the fetcher backfill) in chunks and
+labels every candle for each combination of the swept parameters in a single pass over
+the data. The exponential moving averages carry their state from one chunk to the next
+and rows wait for the next chunk until their future close is known, so the result is the
+same as ta_features.assign_labels over the whole file. Files are spread over processes.
+
+    python src/labeling.py data/BTC-USD_15m.csv data/ETH-USD_15m.csv --output-dir labels \\
+        --backward-window 10,20 --forward-window 1,4 --alpha 0.001,0.002 --beta 0.01 --workers 2
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import logging
+import os
+import sys
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from ta_features import label_array
+
+logger = logging.getLogger(__name__)
+
+
+class LabelParams(NamedTuple):
+    backward_window: int
+    forward_window: int
+    alpha: float
+    beta: float
+
+    @property
+    def column(self) -> str:
+        return f"label_bw{self.backward_window}_fw{self.forward_window}_a{self.alpha:g}_b{self.beta:g}"
+
+
+def parameter_sweep(backward_windows: Sequence[int], forward_windows: Sequence[int], alphas: Sequence[float], betas: Sequence[float]) -> List[LabelParams]:
+    return [LabelParams(*params) for params in product(backward_windows, forward_windows, alphas, betas)]
+
+
+class EwmCarry:
+    """
+    pandas' ewm(span=...).mean() (adjust=True) over consecutive chunks. Each chunk goes
+    through pandas and is then combined with the weighted sums carried from the previous one.
+    """
+
+    def __init__(self, span: int) -> None:
+        self._alpha = 2 / (span + 1)
+        self._numerator = 0.0
+        self._denominator = 0.0
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        if len(values) == 0:
+            return np.empty(0)
+        decay = 1 - self._alpha
+        chunk_mean = pd.Series(values).ewm(alpha=self._alpha).mean().to_numpy()
+        carried = decay ** np.arange(1, len(values) + 1)
+        # Sum of the weights inside the chunk, 1 + decay + ... + decay^t
+        chunk_weights = (1 - carried) / self._alpha if decay > 0 else np.ones(len(values))
+        numerator = chunk_mean * chunk_weights + carried * self._numerator
+        denominator = chunk_weights + carried * self._denominator
+        self._numerator, self._denominator = numerator[-1], denominator[-1]
+        return numerator / denominator
+
+
+class ChunkLabeler:
+    """
+    Labels a close price series fed in chunks. The last max(forward_window) rows are held
+    back until the chunk that contains their future close arrives.
+    """
+
+    def __init__(self, sweep: Sequence[LabelParams]) -> None:
+        self._sweep = list(sweep)
+        self._averages = {window: EwmCarry(window) for window in {params.backward_window for params in self._sweep}}
+        self._lookahead = max(params.forward_window for params in self._sweep)
+        self._dates = np.empty(0, dtype="datetime64[ns]")
+        self._close = np.empty(0)
+        self._ma: Dict[int, np.ndarray] = {window: np.empty(0) for window in self._averages}
+
+    def add(self, dates: np.ndarray, close: np.ndarray) -> DataFrame:
+        self._dates = np.concatenate((self._dates, dates))
+        self._close = np.concatenate((self._close, close))
+        for window, average in self._averages.items():
+            self._ma[window] = np.concatenate((self._ma[window], average.update(close)))
+        return self._emit(max(len(self._close) - self._lookahead, 0))
+
+    def finish(self) -> DataFrame:
+        return self._emit(len(self._close))
+
+    def _emit(self, ready: int) -> DataFrame:
+        result = DataFrame({"Date": self._dates[:ready]})
+        for params in self._sweep:
+            future = np.full(ready, np.nan)
+            available = min(ready, max(len(self._close) - params.forward_window, 0))
+            future[:available] = self._close[params.forward_window:params.forward_window + available]
+            labels = label_array(self._ma[params.backward_window][:ready], future, params.forward_window, params.alpha, params.beta)
+            result[params.column] = labels.astype(np.int8)
+
+        self._dates, self._close = self._dates[ready:], self._close[ready:]
+        self._ma = {window: ma[ready:] for window, ma in self._ma.items()}
+        return result
+
+
+def label_file(path: str, output_dir: str, sweep: Sequence[LabelParams], chunk_size: int) -> str:
+    output = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_labels.csv")
+    tmp_output = f"{output}.tmp"
+    labeler = ChunkLabeler(sweep)
+    rows = 0
+    with open(tmp_output, "w") as f:
+        header = True
+        for chunk in pd.read_csv(path, usecols=["Date", "Close"], chunksize=chunk_size):
+            dates = pd.to_datetime(chunk["Date"]).to_numpy(dtype="datetime64[ns]")
+            labels = labeler.add(dates, chunk["Close"].to_numpy(dtype=np.float64))
+            labels.to_csv(f, header=header, index=False)
+            header = False
+            rows += len(labels)
+        labels = labeler.finish()
+        labels.to_csv(f, header=header, index=False)
+        rows += len(labels)
+    os.replace(tmp_output, output)
+    logger.info(f"Labeled {rows} rows of {path} with {len(sweep)} parameter sets into {output}")
+    return output
+
+
+def _parse_list(value: str, cast) -> List:
+    return [cast(item) for item in value.split(",") if item]
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Label historical OHLC files for training")
+    parser.add_argument("inputs", nargs="+", help="OHLC CSV files with at least Date and Close columns")
+    parser.add_argument("--output-dir", default="labels")
+    parser.add_argument("--backward-window", default="10", help="Comma separated EWM spans")
+    parser.add_argument("--forward-window", default="1", help="Comma separated candles to look ahead")
+    parser.add_argument("--alpha", default="0.001", help="Comma separated lower bounds of the price move")
+    parser.add_argument("--beta", default="0.01", help="Comma separated upper bounds of the price move")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Rows read per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="Files labeled in parallel")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> List[str]:
+    args = _parse_args(argv)
+    sweep = parameter_sweep(
+        _parse_list(args.backward_window, int), _parse_list(args.forward_window, int),
+        _parse_list(args.alpha, float), _parse_list(args.beta, float)
+    )
+    os.makedirs(args.output_dir, exist_ok=True)
+    logger.info(f"Labeling {len(args.inputs)} files with {len(sweep)} parameter sets")
+
+    if args.workers <= 1 or len(args.inputs) == 1:
+        return [label_file(path, args.output_dir, sweep, args.chunk_size) for path in args.inputs]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(label_file, path, args.output_dir, sweep, args.chunk_size) for path in args.inputs]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    main(sys.argv[1:])
@@ -1,20 +1,137 @@
 import logging
+import pickle
+from typing import Dict, List, Optional, Sequence, Tuple
 import numpy as np
 from pandas import DataFrame
 
-from ta_features import add_timely_data, compute_oscillators, find_patterns
+from config import Config
+from feature_store import FeatureStore
+from incremental_features import IncrementalFeatures
+from ta_features import registry
+from timeframes import OPEN_BUCKETS, CandleAggregator
+from wire_format import decode_message, encode_message
 
 logger = logging.getLogger(__name__)
 
-def get_features(ohlc_data: DataFrame) -> str:
-    result = compute_oscillators(ohlc_data)
-    result = find_patterns(result)
-    result = add_timely_data(result)
-    result.set_index("Date", inplace=True)
-    result.replace([np.inf, -np.inf], np.nan, inplace=True)
-    result.dropna(inplace=True)
-    
-    result = result.drop(columns=["Open", "High", "Low", "Close", "Volume"])
-    processed_data = str(result.to_json(orient="records"))
-    
-    return processed_data
+TIMEFRAME_HEADER = "Auguris-Timeframe"
+# Bumped whenever the engines or aggregators change shape, older checkpoints are then ignored
+STATE_VERSION = 2
+
+# Feature engines of the pairs handled by this process. With the process executor every
+# pair is always sent to the same worker, so its engine lives there.
+_engines: Dict[str, IncrementalFeatures] = {}
+_aggregators: Dict[str, CandleAggregator] = {}
+_store: Optional[FeatureStore] = None
+
+def get_features(ohlc_data: DataFrame, features: Optional[Sequence[str]] = None) -> DataFrame:
+    """
+    Computes `features` (every registered feature by default) indexed by Date, without
+    the rows that are still warming up.
+    """
+    return registry.build(ohlc_data, features).to_frame()
+
+def timeframe_key(coin_pair: str, timeframe: str, config: Config) -> str:
+    """
+    Engine and feature store key of a pair on a timeframe, the plain pair for the base one.
+    """
+    return coin_pair if timeframe == config.base_timeframe else f"{coin_pair}@{timeframe}"
+
+def get_pair_features(coin_pair: str, ohlc_data: DataFrame, config: Config, revised_from: Optional[np.datetime64] = None) -> DataFrame:
+    """
+    Feature rows of the candles of `ohlc_data` that are new or changed. `revised_from` is
+    the oldest candle of `ohlc_data` that changed, when it is older than the last candle
+    the engine applied the engine is rewound to it, or rebuilt from the whole frame if it
+    can't go back that far.
+    """
+    if config.feature_engine == "batch":
+        return get_features(ohlc_data, config.features)
+
+    engine = _engines.get(coin_pair)
+    if engine is None:
+        # Aggregators revise the candles of their open buckets
+        engine = IncrementalFeatures(volume_window=config.volume_window, rewind=OPEN_BUCKETS if revised_from is not None else 0)
+        _engines[coin_pair] = engine
+    elif revised_from is not None and engine.last_date is not None and revised_from < engine.last_date:
+        last_date = engine.last_date
+        if engine.rewind(revised_from):
+            logger.info(f"Candle {revised_from} of {coin_pair} changed after {last_date}. Applying the candles from it again")
+        else:
+            logger.warning(f"Candle {revised_from} of {coin_pair} changed after {last_date}. Rebuilding its feature engine")
+            engine.reset()
+    features = engine.update_frame(ohlc_data)
+    logger.info(f"Updated {len(features)} feature rows of {coin_pair}")
+    return features if config.features is None else features[config.features]
+
+def get_timeframe_candles(coin_pair: str, timeframe: str, ohlc_data: DataFrame, config: Config) -> Optional[CandleAggregator]:
+    """
+    Merges a raw frame into the candles of a higher timeframe. None when no bucket changed.
+    """
+    key = timeframe_key(coin_pair, timeframe, config)
+    aggregator = _aggregators.get(key)
+    if aggregator is None:
+        aggregator = CandleAggregator(timeframe, config.base_timeframe, config.aggregate_history)
+        _aggregators[key] = aggregator
+    changed = aggregator.update(ohlc_data)
+    logger.info(f"Aggregated {changed} {timeframe} candles of {coin_pair}")
+    return aggregator if changed else None
+
+def process_payload(coin_pair: str, data: bytes, headers: Optional[Dict[str, str]], config: Config) -> List[Tuple[str, bytes, Dict[str, str]]]:
+    """
+    Raw message in, encoded features of every timeframe out as (timeframe, data, headers).
+    Decoding and encoding happen here as well so only bytes cross the process boundary.
+    """
+    global _store
+    ohlc_data = decode_message(data, headers)
+    results = []
+    for timeframe in config.timeframes:
+        revised_from = None
+        candles = ohlc_data
+        if timeframe != config.base_timeframe:
+            aggregator = get_timeframe_candles(coin_pair, timeframe, ohlc_data, config)
+            if aggregator is None:
+                continue
+            candles, revised_from = aggregator.to_frame(), aggregator.changed_from
+
+        key = timeframe_key(coin_pair, timeframe, config)
+        features = get_pair_features(key, candles, config, revised_from)
+        if features.empty and timeframe != config.base_timeframe:
+            # Higher timeframes take a while to warm up, nothing is published until then
+            logger.info(f"Not enough {timeframe} candles of {coin_pair} for features yet")
+            continue
+        if config.feature_store_path:
+            if _store is None:
+                _store = FeatureStore(config.feature_store_path)
+            # Only the worker of a pair writes its rows, so the store has a single writer per pair
+            added = _store.write(key, features)
+            logger.info(f"Stored {added} new feature rows for {key}")
+        # JSON records drop the index, the candle dates go in a Date column instead
+        payload, payload_headers = encode_message(features.reset_index() if config.wire_format == "json" else features, config.wire_format)
+        payload_headers[TIMEFRAME_HEADER] = timeframe
+        results.append((timeframe, payload, payload_headers))
+    return results
+
+def export_state(coin_pair: str, config: Config) -> bytes:
+    """
+    Engines and aggregators of every timeframe of a pair, pickled. Runs where the pair's
+    engines live, so on its worker with the process executor.
+    """
+    keys = [timeframe_key(coin_pair, timeframe, config) for timeframe in config.timeframes]
+    return pickle.dumps({
+        "version": STATE_VERSION,
+        "engines": {key: _engines[key] for key in keys if key in _engines},
+        "aggregators": {key: _aggregators[key] for key in keys if key in _aggregators}
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+def restore_state(coin_pair: str, data: bytes) -> bool:
+    """
+    Puts back the state exported by export_state. The checkpoint bucket is only written
+    by this service, so its values are trusted to unpickle.
+    """
+    state = pickle.loads(data)
+    if state.get("version") != STATE_VERSION:
+        logger.warning(f"Ignoring the {coin_pair} checkpoint of state version {state.get('version')}, expected {STATE_VERSION}")
+        return False
+    _engines.update(state["engines"])
+    _aggregators.update(state["aggregators"])
+    logger.info(f"Restored {len(state['engines'])} feature engines and {len(state['aggregators'])} aggregators of {coin_pair}")
+    return True
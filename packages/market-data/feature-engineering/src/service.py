@@ -1,13 +1,15 @@
 import asyncio
-import json
 import logging
+import time
+from typing import Dict, Optional, Set, Tuple
 from nats.aio.client import Client
+from nats.aio.msg import Msg
 from nats.js import JetStreamContext
 from nats.js.api import AckPolicy, ConsumerConfig, DeliverPolicy
-from pandas import DataFrame
-import pandas as pd
-from processor import get_features
+from batch_consumer import AckBatcher, tune_consumer
 from config import Config
+from feature_executor import FeatureExecutor
+from state_checkpoint import StateCheckpointer
 
 logger = logging.getLogger(__name__)
 
@@ -17,20 +19,61 @@ class FeatureEngineeringService:
         self._js: JetStreamContext
         self._config = Config()
         self._running = False
+        self._executor = FeatureExecutor(self._config, self._worker_lost)
+        self._pair_locks: Dict[str, asyncio.Lock] = {}
+        self._acks = AckBatcher(self._config.ack_batch, self._config.ack_interval)
+        self._ack_wait = 0.0
+        self._slowest = 0.0
+        self._tuning = False
+        self._checkpoints: Optional[StateCheckpointer] = None
+        # Stream sequence of the last raw message applied to the state of each pair
+        self._sequences: Dict[str, int] = {}
+        self._start_sequence: Optional[int] = None
     
-    async def ensure_consumer(self):
+    def _consumer_config(self) -> ConsumerConfig:
+        ack_wait, max_ack_pending = tune_consumer(self._config, self._slowest)
+        deliver_policy = DeliverPolicy.NEW if self._start_sequence is None else DeliverPolicy.BY_START_SEQUENCE
+        return ConsumerConfig(
+                name=self._config.consumer_name, durable_name=self._config.consumer_name, deliver_policy=deliver_policy,
+                opt_start_seq=self._start_sequence, filter_subject=self._config.raw_subject, ack_policy=AckPolicy.EXPLICIT,
+                ack_wait=ack_wait, max_ack_pending=max_ack_pending
+                )
+
+    async def ensure_consumer(self, start_sequence: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Creates the consumer, from `start_sequence` when given instead of new messages only.
+        Returns the stream sequences the consumer has acked up to and delivered up to.
+        """
         try:
             logger.info(f"Checking consumer {self._config.consumer_name} exists...")
-            await self._js.consumer_info(self._config.stream_name, self._config.consumer_name)
+            info = await self._js.consumer_info(self._config.stream_name, self._config.consumer_name)
             logger.info(f"Consumer {self._config.consumer_name} already exists")
         except:
             logger.warning(f"Consumer did not exist. Configuring it now.")
-            config = ConsumerConfig(
-                    name=self._config.consumer_name, durable_name=self._config.consumer_name, deliver_policy=DeliverPolicy.NEW,
-                    filter_subject=self._config.raw_subject, ack_policy=AckPolicy.EXPLICIT
-                    )
+            self._start_sequence = start_sequence
+            config = self._consumer_config()
             await self._js.add_consumer(self._config.stream_name, config)
+            self._ack_wait = config.ack_wait or 0
             logger.warning(f"Consumer {self._config.consumer_name} created.")
+            return 0, 0
+
+        # The deliver policy of a consumer can't be updated, tuning keeps the one it was created with
+        self._start_sequence = info.config.opt_start_seq if info.config.deliver_policy == DeliverPolicy.BY_START_SEQUENCE else None
+        config = self._consumer_config()
+        self._ack_wait = info.config.ack_wait or 0
+        if info.config.ack_wait != config.ack_wait or info.config.max_ack_pending != config.max_ack_pending:
+            await self._update_consumer(config)
+        ack_floor = info.ack_floor.stream_seq if info.ack_floor else 0
+        delivered = info.delivered.stream_seq if info.delivered else 0
+        return ack_floor, max(ack_floor, delivered)
+
+    async def _update_consumer(self, config: ConsumerConfig):
+        try:
+            await self._js.add_consumer(self._config.stream_name, config)
+            self._ack_wait = config.ack_wait or 0
+            logger.info(f"Consumer {self._config.consumer_name} tuned [ack_wait={config.ack_wait}s, max_ack_pending={config.max_ack_pending}]")
+        except Exception as e:
+            logger.warning(f"Failed to tune consumer {self._config.consumer_name}: {e}")
 
     async def connect_nats(self):
         logger.info("Connecting to NATS...")
@@ -38,50 +81,193 @@ class FeatureEngineeringService:
         self._js = self._nc.jetstream()
         logger.info("Connected")
 
-    async def process_message(self, subject: str, data):
+    def _pair_lock(self, coin_pair: str) -> asyncio.Lock:
+        lock = self._pair_locks.get(coin_pair)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._pair_locks[coin_pair] = lock
+        return lock
+
+    async def process_message(self, subject: str, data: bytes, headers: Optional[Dict[str, str]] = None,
+                              sequence: Optional[int] = None, publish: bool = True):
         coin_pair = subject.split(".")[-1]
-        subject = f"{self._config.processed_subject}.{coin_pair}"
         logger.info(f"Raw data received for {coin_pair}...")
-        try:
+        # Messages of the same pair are computed and published one after the other, other pairs run in parallel
+        async with self._pair_lock(coin_pair):
+            if sequence is not None and sequence <= self._sequences.get(coin_pair, 0):
+                logger.info(f"Message {sequence} of {coin_pair} is already part of its state. Skipping")
+                return
+            try:
+                results = await self._executor.run(coin_pair, data, headers)
+            except Exception as e:
+                logger.error(f"Failed to generate features for {coin_pair}: {e}")
+                return
+            if sequence is not None:
+                self._sequences[coin_pair] = sequence
+            if not publish:
+                return
+            logger.info(f"Features generated for {len(results)} timeframes... Publishing.")
+
+            for timeframe, processed_data, processed_headers in results:
+                subject = f"{self._config.processed_subject}.{timeframe}.{coin_pair}"
+                try:
+                    ack = await self._js.publish(
+                            subject,
+                            processed_data,
+                            headers=processed_headers
+                            )
+                    logger.info(f"Data published [{ack}]")
+                except Exception as e:
+                    logger.error(f"Failed to publish data to {subject}: {e}")
 
-            ohlc_data: DataFrame = pd.DataFrame(json.loads(data))
-            processed_data: str = get_features(ohlc_data)
-            logger.info(f"Features generated... Publishing.")
+    def _worker_lost(self, slot: int):
+        """
+        Forgets what the state of the pairs on a dead feature worker had applied. Their
+        messages aren't skipped anymore and no checkpoint is written for them until they
+        applied a message again, so the last checkpoint before the crash stays the one a
+        restart resumes from.
+        """
+        lost = [coin_pair for coin_pair in self._sequences if self._executor.slot(coin_pair) == slot]
+        for coin_pair in lost:
+            del self._sequences[coin_pair]
+            if self._checkpoints:
+                self._checkpoints.saved.pop(coin_pair, None)
+        logger.warning(f"Lost the feature state of {len(lost)} pairs on worker {slot}")
 
-            ack = await self._js.publish(
-                    subject,
-                    processed_data.encode("utf-8")
+    async def restore_state(self) -> Dict[str, int]:
+        self._checkpoints = StateCheckpointer(self._js, self._executor, self._config)
+        await self._checkpoints.open()
+        restored = await self._checkpoints.restore()
+        self._sequences.update(restored)
+        return restored
+
+    async def replay(self, start_sequence: int, end_sequence: int, publish: bool = False):
+        """
+        Applies the raw messages from `start_sequence` to `end_sequence` to the restored
+        state, without publishing unless `publish` is set.
+        """
+        if end_sequence < start_sequence:
+            return
+        logger.info(f"Replaying raw messages {start_sequence} to {end_sequence} [publish={publish}]...")
+        sub = await self._js.pull_subscribe(
+                self._config.raw_subject, stream=self._config.stream_name,
+                config=ConsumerConfig(
+                    deliver_policy=DeliverPolicy.BY_START_SEQUENCE, opt_start_seq=start_sequence,
+                    filter_subject=self._config.raw_subject, ack_policy=AckPolicy.NONE
                     )
-            logger.info(f"Data published [{ack}]")
-        except Exception as e:
-            logger.error(f"Failed to publish data to {subject}: {e}")
+                )
+        replayed = 0
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    msgs = await sub.fetch(self._config.fetch_batch, timeout=self._config.fetch_timeout)
+                except asyncio.TimeoutError:
+                    break
+                msgs = [msg for msg in msgs if msg.metadata.sequence.stream <= end_sequence]
+                await asyncio.gather(*(
+                    self.process_message(msg.subject, msg.data, msg.headers, msg.metadata.sequence.stream, publish=publish)
+                    for msg in msgs
+                    ))
+                replayed += len(msgs)
+                if not msgs or msgs[-1].metadata.sequence.stream >= end_sequence:
+                    break
+        finally:
+            await sub.unsubscribe()
+        logger.info(f"Replayed {replayed} raw messages in {time.monotonic() - started:.1f}s")
+
+    async def checkpoint(self):
+        """
+        Checkpoints the pairs that applied messages since their last checkpoint.
+        """
+        for coin_pair, sequence in list(self._sequences.items()):
+            if sequence <= self._checkpoints.saved.get(coin_pair, 0):
+                continue
+            async with self._pair_lock(coin_pair):
+                try:
+                    await self._checkpoints.save(coin_pair, self._sequences[coin_pair])
+                except Exception as e:
+                    logger.error(f"Failed to checkpoint the feature state of {coin_pair}: {e}")
+
+    async def run_checkpoints(self):
+        try:
+            while True:
+                await asyncio.sleep(self._config.checkpoint_interval)
+                await self.checkpoint()
+        finally:
+            await self.checkpoint()
 
     async def start(self):
         await self.connect_nats()
-        await self.ensure_consumer()
+        restored = await self.restore_state() if self._config.checkpoint_bucket else {}
+        # Without a consumer the backlog since the oldest checkpoint is delivered, otherwise
+        # the messages the consumer delivered after it are replayed into the state. Above the
+        # ack floor some were acked out of order and won't come again, the others will but
+        # their copies are skipped as already applied, so those are published by the replay
+        start_sequence = min(restored.values()) + 1 if restored else None
+        ack_floor, delivered = await self.ensure_consumer(start_sequence)
+        if start_sequence is not None:
+            await self.replay(start_sequence, ack_floor)
+            await self.replay(max(start_sequence, ack_floor + 1), delivered, publish=True)
+
         self._running = True
+        checkpoints = asyncio.create_task(self.run_checkpoints()) if self._checkpoints else None
+        sub = await self._js.pull_subscribe(self._config.raw_subject, self._config.consumer_name)
         try:
-            while self._running:
-                await self.consume_messages()
+            await self.consume_messages(sub)
         except asyncio.CancelledError:
             logger.info("FeatureService cancelled. Exiting task loop")
         finally:
+            if checkpoints:
+                checkpoints.cancel()
+                await asyncio.gather(checkpoints, return_exceptions=True)
+            self._executor.shutdown()
             logger.info("FeatureEngineeringService finished")
 
     async def stop(self):
         self._running = False
         await self._nc.close()
 
-    async def consume_messages(self):
+    async def _handle(self, msg: Msg):
+        started = time.monotonic()
+        await self.process_message(msg.subject, msg.data, msg.headers, msg.metadata.sequence.stream)
+        await self._acks.add(msg)
 
-        sub = await self._js.pull_subscribe(self._config.raw_subject, self._config.consumer_name)
-        
-        while self._running:
-            try:
-                msgs = await sub.fetch(1, timeout=5)
-                for msg in msgs:
-                    await self.process_message(msg.subject, msg.data.decode())
-                    await msg.ack()
-            except asyncio.TimeoutError:
-                continue
+        latency = time.monotonic() - started
+        if latency > self._slowest:
+            self._slowest = latency
+            ack_wait, _ = tune_consumer(self._config, latency)
+            if ack_wait > self._ack_wait and not self._tuning:
+                logger.warning(f"Message took {latency:.1f}s, raising AckWait to {ack_wait:.0f}s")
+                self._tuning = True
+                try:
+                    await self._update_consumer(self._consumer_config())
+                finally:
+                    self._tuning = False
+
+    async def consume_messages(self, sub: JetStreamContext.PullSubscription):
+        in_flight: Set[asyncio.Task] = set()
+        ack_flusher = asyncio.create_task(self._acks.run())
+        try:
+            while self._running:
+                available = self._config.max_in_flight - len(in_flight)
+                if available <= 0:
+                    # Backpressure, nothing new is fetched until a message finishes
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                try:
+                    msgs = await sub.fetch(min(self._config.fetch_batch, available), timeout=self._config.fetch_timeout)
+                except asyncio.TimeoutError:
+                    continue
 
+                # Tasks start in delivery order, so the pair locks hand messages of a pair over in that order too
+                for msg in msgs:
+                    task = asyncio.create_task(self._handle(msg))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+        finally:
+            if in_flight:
+                await asyncio.wait(in_flight)
+            self._acks.stop()
+            await ack_flusher
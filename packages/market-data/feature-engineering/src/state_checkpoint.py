@@ -0,0 +1,86 @@
+"""
+Checkpoints of the per-pair feature state in a JetStream key-value bucket.
+
+Every pair gets one key holding the stream sequence of the last raw message applied to
+its state, followed by the pickled engines and aggregators of all its timeframes:
+
+    <8 bytes big-endian stream sequence><processor.export_state payload>
+
+On startup the state is restored and only the messages after each pair's sequence need
+to be applied again.
+"""
+import logging
+import struct
+from typing import Dict, Optional, Tuple
+
+from nats.js import JetStreamContext
+from nats.js.api import KeyValueConfig
+from nats.js.errors import BucketNotFoundError, NoKeysError
+from nats.js.kv import KeyValue
+
+from config import Config
+from feature_executor import FeatureExecutor
+from processor import export_state, restore_state
+
+logger = logging.getLogger(__name__)
+
+_SEQUENCE = struct.Struct(">Q")
+
+
+def encode_checkpoint(sequence: int, state: bytes) -> bytes:
+    return _SEQUENCE.pack(sequence) + state
+
+
+def decode_checkpoint(data: bytes) -> Tuple[int, bytes]:
+    return _SEQUENCE.unpack_from(data)[0], data[_SEQUENCE.size:]
+
+
+class StateCheckpointer:
+    def __init__(self, js: JetStreamContext, executor: FeatureExecutor, config: Config) -> None:
+        self._js = js
+        self._executor = executor
+        self._config = config
+        self._kv: Optional[KeyValue] = None
+        # Sequence of the last checkpoint written for every pair
+        self.saved: Dict[str, int] = {}
+
+    async def open(self) -> None:
+        try:
+            self._kv = await self._js.key_value(self._config.checkpoint_bucket)
+        except BucketNotFoundError:
+            logger.warning(f"Checkpoint bucket {self._config.checkpoint_bucket} did not exist. Creating it now.")
+            self._kv = await self._js.create_key_value(KeyValueConfig(bucket=self._config.checkpoint_bucket, history=1))
+
+    async def restore(self) -> Dict[str, int]:
+        """
+        Restores every checkpointed pair. Returns the stream sequence each pair was restored at.
+        """
+        try:
+            pairs = await self._kv.keys()
+        except NoKeysError:
+            logger.info("No feature state checkpoints to restore")
+            return {}
+
+        restored = {}
+        for coin_pair in pairs:
+            try:
+                entry = await self._kv.get(coin_pair)
+                sequence, state = decode_checkpoint(entry.value)
+                if await self._executor.call(coin_pair, restore_state, coin_pair, state):
+                    restored[coin_pair] = sequence
+            except Exception as e:
+                # A pair that can't be restored warms up again from the stream
+                logger.error(f"Failed to restore the feature state of {coin_pair}: {e}")
+        self.saved.update(restored)
+        logger.info(f"Restored the feature state of {len(restored)} pairs")
+        return restored
+
+    async def save(self, coin_pair: str, sequence: int) -> None:
+        """
+        Writes the state of a pair after the message at `sequence`. The caller makes sure no
+        message of the pair is being processed meanwhile.
+        """
+        state = await self._executor.call(coin_pair, export_state, coin_pair, self._config)
+        await self._kv.put(coin_pair, encode_checkpoint(sequence, state))
+        self.saved[coin_pair] = sequence
+        logger.debug(f"Checkpointed {len(state)} bytes of {coin_pair} state at sequence {sequence}")
@@ -1,80 +1,155 @@
+from functools import partial
 from pandas import DataFrame
 import pandas as pd
 import numpy as np
 import talib
 
+from feature_registry import FeatureRegistry
+
+CANDLE_PATTERNS = (
+    "CDL2CROWS",
+    "CDL3BLACKCROWS",
+    "CDL3WHITESOLDIERS",
+    "CDLABANDONEDBABY",
+    "CDLBELTHOLD",
+    "CDLCOUNTERATTACK",
+    "CDLDARKCLOUDCOVER",
+    "CDLDRAGONFLYDOJI",
+    "CDLENGULFING",
+    "CDLEVENINGDOJISTAR",
+    "CDLEVENINGSTAR",
+    "CDLGRAVESTONEDOJI",
+    "CDLHANGINGMAN",
+    "CDLHARAMICROSS",
+    "CDLINVERTEDHAMMER",
+    "CDLMARUBOZU",
+    "CDLMORNINGDOJISTAR",
+    "CDLMORNINGSTAR",
+    "CDLPIERCING",
+    "CDLRISEFALL3METHODS",
+    "CDLSHOOTINGSTAR",
+    "CDLSPINNINGTOP",
+    "CDLUPSIDEGAP2CROWS",
+)
+
 BUY = -1
 HOLD = 0
 SELL = 1
 
-def compute_oscillators(data) -> DataFrame:
-    log_return = np.log(data['Close']) - np.log(data['Close'].shift(1))
-    data['Z_score'] = (((log_return - log_return.rolling(20).mean()) / log_return.rolling(20).std()))
-    data['RSI'] = ((talib.RSI(data['Close'])) / 100)
-    upper_band, _, lower_band = talib.BBANDS(data['Close'], nbdevup=2, nbdevdn=2, matype=talib._ta_lib.MA_Type.SMA)
-    data['boll'] = ((data['Close'] - lower_band) / (upper_band - lower_band))
-    data['ULTOSC'] = ((talib.ULTOSC(data['High'], data['Low'], data['Close'])) / 100)
-    data['pct_change'] = (data['Close'].pct_change())
-    data['zsVol'] = (data['Volume'] - data['Volume'].mean()) / data['Volume'].std()
-    data['PR_MA_Ratio_short'] = ((data['Close'] - talib.SMA(data['Close'], 21)) / talib.SMA(data['Close'], 21))
-    data['MA_Ratio_short'] = ((talib.SMA(data['Close'], 21) - talib.SMA(data['Close'], 50)) / talib.SMA(data['Close'], 50))
-    data['MA_Ratio'] = (
-                (talib.SMA(data['Close'], 50) - talib.SMA(data['Close'], 100)) / talib.SMA(data['Close'], 100))
-    data['PR_MA_Ratio'] = ((data['Close'] - talib.SMA(data['Close'], 50)) / talib.SMA(data['Close'], 50))
+OSCILLATORS = (
+    "Z_score", "RSI", "boll", "ULTOSC", "pct_change", "zsVol",
+    "PR_MA_Ratio_short", "MA_Ratio_short", "MA_Ratio", "PR_MA_Ratio"
+)
+TIMELY_FEATURES = ("DayOfWeek", "Month", "Hourly")
 
-    return data
+registry = FeatureRegistry()
+
+@registry.intermediate("previous_close", "Close")
+def _previous_close(close):
+    return np.concatenate(([np.nan], close[:-1]))
+
+@registry.intermediate("log_return", "Close", "previous_close")
+def _log_return(close, previous_close):
+    return np.log(close) - np.log(previous_close)
+
+@registry.intermediate("log_return_mean_20", "log_return")
+def _log_return_mean(log_return):
+    return pd.Series(log_return).rolling(20).mean().to_numpy()
+
+@registry.intermediate("log_return_std_20", "log_return")
+def _log_return_std(log_return):
+    return pd.Series(log_return).rolling(20).std().to_numpy()
+
+for period in (21, 50, 100):
+    registry.intermediate(f"SMA_{period}", "Close")(partial(talib.SMA, timeperiod=period))
+
+@registry.feature("Z_score", "log_return", "log_return_mean_20", "log_return_std_20")
+def _z_score(log_return, mean, std):
+    return (log_return - mean) / std
+
+@registry.feature("RSI", "Close")
+def _rsi(close):
+    return talib.RSI(close) / 100
+
+@registry.feature("boll", "Close")
+def _boll(close):
+    upper_band, _, lower_band = talib.BBANDS(close, nbdevup=2, nbdevdn=2, matype=talib._ta_lib.MA_Type.SMA)
+    return (close - lower_band) / (upper_band - lower_band)
+
+@registry.feature("ULTOSC", "High", "Low", "Close")
+def _ultosc(high, low, close):
+    return talib.ULTOSC(high, low, close) / 100
+
+@registry.feature("pct_change", "Close", "previous_close")
+def _pct_change(close, previous_close):
+    return close / previous_close - 1
 
-def add_timely_data(data) -> DataFrame:
-    data['DayOfWeek'] = pd.to_datetime(data['Date']).dt.dayofweek
-    data['Month'] = pd.to_datetime(data['Date']).dt.month
-    data['Hourly'] = pd.to_datetime(data['Date']).dt.hour / 4
+@registry.feature("zsVol", "Volume")
+def _zs_volume(volume):
+    series = pd.Series(volume)
+    return ((series - series.mean()) / series.std()).to_numpy()
+
+@registry.feature("PR_MA_Ratio_short", "Close", "SMA_21")
+def _pr_ma_ratio_short(close, sma_21):
+    return (close - sma_21) / sma_21
+
+@registry.feature("MA_Ratio_short", "SMA_21", "SMA_50")
+def _ma_ratio_short(sma_21, sma_50):
+    return (sma_21 - sma_50) / sma_50
+
+@registry.feature("MA_Ratio", "SMA_50", "SMA_100")
+def _ma_ratio(sma_50, sma_100):
+    return (sma_50 - sma_100) / sma_100
+
+@registry.feature("PR_MA_Ratio", "Close", "SMA_50")
+def _pr_ma_ratio(close, sma_50):
+    return (close - sma_50) / sma_50
+
+def _pattern(function):
+    return lambda open_, high, low, close: function(open_, high, low, close) / 100
+
+for pattern in CANDLE_PATTERNS:
+    registry.feature(pattern, "Open", "High", "Low", "Close")(_pattern(getattr(talib, pattern)))
+
+@registry.intermediate("datetime", "Date")
+def _datetime(date):
+    return pd.DatetimeIndex(date)
+
+@registry.feature("DayOfWeek", "datetime")
+def _day_of_week(datetime):
+    return datetime.dayofweek.to_numpy()
+
+@registry.feature("Month", "datetime")
+def _month(datetime):
+    return datetime.month.to_numpy()
+
+@registry.feature("Hourly", "datetime")
+def _hourly(datetime):
+    return datetime.hour.to_numpy() / 4
+
+def compute_oscillators(data) -> DataFrame:
+    for name, values in registry.compute(data, OSCILLATORS).items():
+        data[name] = values
     return data
 
+def label_array(close_ma: np.ndarray, future_close: np.ndarray, forward_window: int, alpha: float, beta: float) -> np.ndarray:
+    """
+    Labels of whole arrays: a future close that moved away from the moving average by
+    more than alpha and less than the widened beta. Rows without a future close are HOLD.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_diff_ratio = np.abs((future_close - close_ma) / close_ma)
+    within_alpha_beta = (alpha < price_diff_ratio) & (price_diff_ratio < beta * (1 + (forward_window * 0.1)))
+    direction = np.where(future_close > close_ma, SELL, np.where(future_close < close_ma, BUY, HOLD))
+    return np.where(within_alpha_beta, direction, HOLD).astype(np.int64)
+
 def assign_labels(data, backward_window, forward_window, alpha, beta):
-    data_copy = data.copy()
-    data_copy['Close_MA'] = data_copy['Close'].ewm(span=backward_window).mean()
-    data_copy['s-1'] = data_copy['Close'].shift(-forward_window)
-    data_copy['alpha'] = alpha
-    data_copy['beta'] = beta * (1 + (forward_window * 0.1))
-    data_copy['label'] = data_copy.apply(check_label, axis=1)
-    return data_copy['label']
-
-def check_label(row):
-    price_diff_ratio = abs((row['s-1'] - row['Close_MA']) / row['Close_MA'])
-    within_alpha_beta = row['alpha'] < price_diff_ratio < row['beta']
-    
-    if not within_alpha_beta:
-        return HOLD
-
-    if row['s-1'] > row['Close_MA']:
-        return SELL
-    elif row['s-1'] < row['Close_MA']:
-        return BUY
-    else:
-        return HOLD
+    close_ma = data['Close'].ewm(span=backward_window).mean().to_numpy()
+    future_close = data['Close'].shift(-forward_window).to_numpy()
+    labels = label_array(close_ma, future_close, forward_window, alpha, beta)
+    return pd.Series(labels, index=data.index, name='label')
 
 def find_patterns(x) -> DataFrame:
-    x['CDL2CROWS'] = talib.CDL2CROWS(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDL3BLACKCROWS'] = talib.CDL3BLACKCROWS(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDL3WHITESOLDIERS'] = talib.CDL3WHITESOLDIERS(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLABANDONEDBABY'] = talib.CDLABANDONEDBABY(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLBELTHOLD'] = talib.CDLBELTHOLD(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLCOUNTERATTACK'] = talib.CDLCOUNTERATTACK(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLDARKCLOUDCOVER'] = talib.CDLDARKCLOUDCOVER(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLDRAGONFLYDOJI'] = talib.CDLDRAGONFLYDOJI(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLENGULFING'] = talib.CDLENGULFING(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLEVENINGDOJISTAR'] = talib.CDLEVENINGDOJISTAR(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLEVENINGSTAR'] = talib.CDLEVENINGSTAR(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLGRAVESTONEDOJI'] = talib.CDLGRAVESTONEDOJI(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLHANGINGMAN'] = talib.CDLHANGINGMAN(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLHARAMICROSS'] = talib.CDLHARAMICROSS(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLINVERTEDHAMMER'] = talib.CDLINVERTEDHAMMER(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLMARUBOZU'] = talib.CDLMARUBOZU(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLMORNINGDOJISTAR'] = talib.CDLMORNINGDOJISTAR(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLMORNINGSTAR'] = talib.CDLMORNINGSTAR(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLPIERCING'] = talib.CDLPIERCING(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLRISEFALL3METHODS'] = talib.CDLRISEFALL3METHODS(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLSHOOTINGSTAR'] = talib.CDLSHOOTINGSTAR(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLSPINNINGTOP'] = talib.CDLSPINNINGTOP(x['Open'], x['High'], x['Low'], x['Close']) / 100
-    x['CDLUPSIDEGAP2CROWS'] = talib.CDLUPSIDEGAP2CROWS(x['Open'], x['High'], x['Low'], x['Close']) / 100
+    for name, values in registry.compute(x, CANDLE_PATTERNS).items():
+        x[name] = values
     return x
@@ -0,0 +1,128 @@
+"""
+Higher timeframe candles built from the raw 15m stream.
+
+A CandleAggregator per pair and timeframe keeps the base candles of its latest buckets
+and the aggregated candles of the last `history` buckets. Every raw frame is merged into
+the base candles and only the buckets with new or changed base candles are aggregated
+again: open of the first candle, highest high, lowest low, close of the last candle and
+the summed volume. Buckets are aligned to the epoch, so 4h candles start at 00:00, 04:00,
+... UTC and daily candles at midnight UTC, the same boundaries the exchange uses.
+
+The first bucket of a frame is only kept when the frame starts on its boundary,
+otherwise its open, high and low would come from part of the bucket.
+"""
+import logging
+import re
+from typing import Optional
+
+import numpy as np
+from pandas import DataFrame
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+TIMEFRAME_UNITS = {"m": "m", "h": "h", "d": "D"}
+# Buckets whose base candles are kept, the previous one still gets the final values of its last candle
+OPEN_BUCKETS = 2
+
+
+def parse_timeframe(timeframe: str) -> np.timedelta64:
+    """
+    "15m", "4h", "1d"... as a timedelta.
+    """
+    match = re.fullmatch(r"(\d+)([mhd])", timeframe)
+    if match is None or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid timeframe {timeframe}. Expected a number followed by one of m, h or d")
+    return np.timedelta64(int(match.group(1)), TIMEFRAME_UNITS[match.group(2)])
+
+
+def _keep_last(dates: np.ndarray, values: np.ndarray):
+    """
+    Sorted unique dates, the last occurrence of a date wins.
+    """
+    _, first = np.unique(dates[::-1], return_index=True)
+    positions = len(dates) - 1 - first
+    return dates[positions], values[positions]
+
+
+class CandleAggregator:
+    def __init__(self, timeframe: str, base_timeframe: str = "15m", history: int = 720) -> None:
+        self.timeframe = timeframe
+        self._bucket = int(parse_timeframe(timeframe) / np.timedelta64(1, "ns"))
+        self._base = int(parse_timeframe(base_timeframe) / np.timedelta64(1, "ns"))
+        if self._bucket <= self._base or self._bucket % self._base:
+            raise ValueError(f"Timeframe {timeframe} is not a multiple of the base timeframe {base_timeframe}")
+        self._history = history
+        self._base_dates = np.empty(0, dtype=np.int64)
+        self._base_values = np.empty((0, len(OHLCV_COLUMNS)))
+        self._dates = np.empty(0, dtype=np.int64)
+        self._values = np.empty((0, len(OHLCV_COLUMNS)))
+        # Start of the oldest bucket changed by the last update
+        self.changed_from: Optional[np.datetime64] = None
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    def update(self, ohlc_data: DataFrame) -> int:
+        """
+        Merges a raw window or delta frame. Returns how many buckets were aggregated again.
+        """
+        self.changed_from = None
+        if ohlc_data.empty:
+            return 0
+        dates = ohlc_data["Date"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        values = ohlc_data[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+
+        if len(self._base_dates) and dates[0] > self._base_dates[-1] + self._base:
+            logger.warning(f"{self.timeframe} frame starting at {dates[0].astype('datetime64[ns]')} doesn't overlap the last candle. Starting a new bucket")
+            self._base_dates, self._base_values = self._base_dates[:0], self._base_values[:0]
+
+        if len(self._base_dates):
+            # Buckets before the kept base candles are final
+            keep = dates >= self._base_dates[0] - self._base_dates[0] % self._bucket
+        else:
+            first_bucket = dates[0] - dates[0] % self._bucket
+            keep = dates >= (first_bucket if dates[0] == first_bucket else first_bucket + self._bucket)
+        dates, values = dates[keep], values[keep]
+        if len(dates) == 0:
+            return 0
+
+        # Rows that are new or differ from the stored base candle
+        positions = np.minimum(np.searchsorted(self._base_dates, dates), max(len(self._base_dates) - 1, 0))
+        known = np.zeros(len(dates), dtype=bool)
+        if len(self._base_dates):
+            known = (self._base_dates[positions] == dates) & (self._base_values[positions] == values).all(axis=1)
+        changed = np.unique(dates[~known] - dates[~known] % self._bucket)
+        if len(changed) == 0:
+            return 0
+
+        base_dates, base_values = _keep_last(np.concatenate((self._base_dates, dates)), np.concatenate((self._base_values, values)))
+        in_changed = np.isin(base_dates - base_dates % self._bucket, changed)
+        self._aggregate(changed, base_dates[in_changed], base_values[in_changed])
+
+        last_open = base_dates[-1] - base_dates[-1] % self._bucket - (OPEN_BUCKETS - 1) * self._bucket
+        open_rows = base_dates >= last_open
+        self._base_dates, self._base_values = base_dates[open_rows], base_values[open_rows]
+        self.changed_from = changed[0].astype("datetime64[ns]")
+        return len(changed)
+
+    def _aggregate(self, buckets: np.ndarray, dates: np.ndarray, values: np.ndarray) -> None:
+        starts = np.searchsorted(dates, buckets)
+        ends = np.append(starts[1:], len(dates))
+        aggregated = np.column_stack((
+            values[starts, 0],
+            np.maximum.reduceat(values[:, 1], starts),
+            np.minimum.reduceat(values[:, 2], starts),
+            values[ends - 1, 3],
+            np.add.reduceat(values[:, 4], starts)
+        ))
+        self._dates, self._values = _keep_last(np.concatenate((self._dates, buckets)), np.concatenate((self._values, aggregated)))
+        self._dates, self._values = self._dates[-self._history:], self._values[-self._history:]
+
+    def to_frame(self) -> DataFrame:
+        """
+        The aggregated candles, shaped like a raw frame.
+        """
+        frame = DataFrame(self._values, columns=OHLCV_COLUMNS)
+        frame.insert(0, "Date", self._dates.astype("datetime64[ns]"))
+        return frame
@@ -1,14 +1,55 @@
-from fastapi import FastAPI
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException, Response
+import numpy as np
 import uvicorn
 from config import Config
+from feature_store import FeatureStore
+from processor import timeframe_key
+from wire_format import encode_message
 
 config = Config()
 app = FastAPI()
+store = FeatureStore(config.feature_store_path) if config.feature_store_path else None
 
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
 
+def _parse_time(value: Optional[str], name: str) -> Optional[np.datetime64]:
+    if value is None:
+        return None
+    try:
+        # Accepts ISO dates as well as epoch seconds
+        return np.datetime64(int(value), "s") if value.isdigit() else np.datetime64(value.rstrip("Z"), "ns")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+
+@app.get("/features/{pair}")
+def get_features_range(
+        pair: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        columns: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        format: Literal["json", "columnar"] = "json"
+        ):
+    """
+    Stored feature rows of a pair with start <= Date < end, on the base timeframe unless
+    `timeframe` is given. Plain def so the disk reads run in the threadpool instead of on
+    the event loop.
+    """
+    if store is None:
+        raise HTTPException(status_code=404, detail="Feature store is disabled")
+    key = timeframe_key(pair, timeframe or config.base_timeframe, config)
+    if key not in store.pairs():
+        raise HTTPException(status_code=404, detail=f"No {timeframe or config.base_timeframe} features stored for {pair}")
+
+    features = store.read(key, _parse_time(start, "start"), _parse_time(end, "end"), columns.split(",") if columns else None)
+    if format == "json":
+        features = features.reset_index()
+    data, headers = encode_message(features, format)
+    return Response(content=data, media_type=headers["Content-Type"])
+
 def get_webserver():
     return uvicorn.Server(
             uvicorn.Config(
@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from src.batch_consumer import AckBatcher, MIN_ACK_WAIT_SECONDS, tune_consumer
+from src.config import Config
+from src.service import FeatureEngineeringService
+
+mock_environ = {
+        "FEATURE_EXECUTOR": "inline",
+        "FETCH_BATCH": "4",
+        "MAX_IN_FLIGHT": "4",
+        "ACK_BATCH": "3",
+        "ACK_INTERVAL_SECONDS": "0.05",
+        "FETCH_TIMEOUT_SECONDS": "0.05"
+    }
+
+def get_msg(pair: str, sequence: int) -> Mock:
+    msg = Mock()
+    msg.subject = f"market-data.raw.{pair}"
+    msg.data = f"{pair}:{sequence}".encode()
+    msg.headers = None
+    msg.metadata.sequence.stream = sequence + 1
+    msg.ack = AsyncMock()
+    return msg
+
+class TestBatchConsumer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.patcher_os_environ = patch.dict("os.environ", mock_environ)
+        self.patcher_os_environ.start()
+
+    async def asyncTearDown(self):
+        self.patcher_os_environ.stop()
+
+    def test_tune_consumer_covers_in_flight_messages_and_slow_ones(self):
+        config = Config()
+
+        assert tune_consumer(config, 0.1) == (MIN_ACK_WAIT_SECONDS, 7)
+        assert tune_consumer(config, 40)[0] == 2 * (40 + 0.05)
+
+    async def test_ack_batcher_acks_full_batches(self):
+        batcher = AckBatcher(batch_size=3, interval=10)
+        msgs = [get_msg("FOO-USD", i) for i in range(4)]
+
+        for msg in msgs:
+            await batcher.add(msg)
+
+        assert [msg.ack.await_count for msg in msgs] == [1, 1, 1, 0]
+        await batcher.flush()
+        assert batcher.acked == 4
+
+    async def test_ack_batcher_flushes_on_interval(self):
+        batcher = AckBatcher(batch_size=100, interval=0.01)
+        msg = get_msg("FOO-USD", 0)
+        flusher = asyncio.create_task(batcher.run())
+
+        await batcher.add(msg)
+        await asyncio.sleep(0.05)
+        batcher.stop()
+        await flusher
+
+        msg.ack.assert_awaited_once()
+
+    async def test_ack_batcher_stop_waits_for_the_flush_in_progress(self):
+        batcher = AckBatcher(batch_size=100, interval=0.01)
+        msgs = [get_msg("FOO-USD", i) for i in range(3)]
+
+        async def slow_ack():
+            await asyncio.sleep(0.05)
+        for msg in msgs:
+            msg.ack.side_effect = slow_ack
+        flusher = asyncio.create_task(batcher.run())
+
+        for msg in msgs[:2]:
+            await batcher.add(msg)
+        await asyncio.sleep(0.02)
+        await batcher.add(msgs[2])
+        batcher.stop()
+        await flusher
+
+        assert batcher.acked == 3
+
+    async def test_consume_messages_keeps_pairs_in_order_and_runs_pairs_concurrently(self):
+        service = FeatureEngineeringService()
+        service._js = AsyncMock()
+        service._running = True
+
+        batches = [
+            [get_msg("FOO-USD", 0), get_msg("BAR-USD", 0), get_msg("FOO-USD", 1)],
+            [get_msg("BAR-USD", 1), get_msg("FOO-USD", 2)]
+        ]
+        sub = Mock()
+
+        async def fetch(batch, timeout):
+            assert batch <= 4
+            if batches:
+                return batches.pop(0)
+            service._running = False
+            raise asyncio.TimeoutError()
+
+        sub.fetch = AsyncMock(side_effect=fetch)
+
+        processed = []
+        running = set()
+        concurrent_pairs = []
+
+        async def run(coin_pair, data, headers):
+            running.add(coin_pair)
+            concurrent_pairs.append(len(running))
+            await asyncio.sleep(0.01)
+            running.discard(coin_pair)
+            processed.append(data.decode())
+            return [("15m", data, {})]
+
+        service._executor.run = run
+        await service.consume_messages(sub)
+
+        assert [item for item in processed if item.startswith("FOO")] == ["FOO-USD:0", "FOO-USD:1", "FOO-USD:2"]
+        assert [item for item in processed if item.startswith("BAR")] == ["BAR-USD:0", "BAR-USD:1"]
+        assert max(concurrent_pairs) == 2
+        assert service._acks.acked == 5
+        assert service._js.publish.await_count == 5
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+def get_candles(rows: int, start: str = "2025-01-01", seed: int = 7, skip: int = 0) -> DataFrame:
+    """
+    Random walk of 15m OHLC candles. `skip` drops the first candles of the same walk, so
+    windows of one series can be built from different calls.
+    """
+    rng = np.random.default_rng(seed)
+    total = skip + rows
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, total)))
+    open_ = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.001, total))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, total))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, total))
+    # A few flat candles so the doji and marubozu patterns fire too
+    flat = rng.choice(total, total // 20, replace=False)
+    open_[flat] = close[flat]
+    return DataFrame({
+        "Date": pd.date_range(start, periods=total, freq="15min").to_numpy(dtype="datetime64[ns]"),
+        "Open": open_, "High": high, "Low": low, "Close": close,
+        "Volume": rng.uniform(1, 50, total)
+    }).iloc[skip:].reset_index(drop=True)
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+import os
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import pandas as pd
+
+from src.config import Config
+from src.wire_format import decode_message, encode_message
+from tests.candles import get_candles
+
+
+def get_raw_message(rows: int = 150, start: int = 0):
+    return encode_message(get_candles(rows, "2025-02-01", seed=5, skip=start), "columnar")
+
+
+def crash_worker():
+    os._exit(1)
+
+
+class TestFeatureExecutor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        import processor
+        # Forked workers start with the engines of this process, start them from a clean slate
+        processor._engines.clear()
+        processor._aggregators.clear()
+
+    def get_executor(self, mode: str, workers: int = 2, queue_size: int = 4, on_worker_lost=None):
+        with patch.dict("os.environ", {"FEATURE_EXECUTOR": mode, "FEATURE_WORKERS": str(workers), "FEATURE_QUEUE_SIZE": str(queue_size)}):
+            from feature_executor import FeatureExecutor
+            executor = FeatureExecutor(Config(), on_worker_lost)
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    async def test_modes_produce_the_same_features(self):
+        data, headers = get_raw_message()
+        results = {}
+        for mode in ("inline", "thread", "process"):
+            timeframe, payload, result_headers = (await self.get_executor(mode).run(f"{mode}-USD", data, headers))[0]
+            assert timeframe == "15m"
+            results[mode] = decode_message(payload, result_headers)
+
+        # Every candle of the first window once the SMA 100 has warmed up
+        assert len(results["inline"]) == 51
+        pd.testing.assert_frame_equal(results["thread"], results["inline"])
+        pd.testing.assert_frame_equal(results["process"], results["inline"])
+
+    async def test_process_workers_keep_the_engine_of_a_pair(self):
+        executor = self.get_executor("process")
+        first, headers = get_raw_message(rows=150)
+        second, _ = get_raw_message(rows=50, start=120)
+
+        await executor.run("FOO-USD", first, headers)
+        _, payload, result_headers = (await executor.run("FOO-USD", second, headers))[0]
+
+        # Only the worker that saw the first window has enough history for the SMA 100, it
+        # gives the revised last candle of the first window and the 20 new ones
+        assert len(decode_message(payload, result_headers)) == 21
+        assert executor.slot("FOO-USD") == executor.slot("FOO-USD")
+
+    async def test_waits_for_a_free_slot_when_saturated(self):
+        executor = self.get_executor("thread", workers=4, queue_size=2)
+        running = 0
+        max_running = 0
+
+        def slow_payload(*args):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            time.sleep(0.05)
+            running -= 1
+            return []
+
+        with patch("feature_executor.process_payload", slow_payload):
+            await asyncio.gather(*(executor.run(f"PAIR{i}", b"", None) for i in range(6)))
+
+        assert max_running == 2
+
+    async def test_replaces_a_dead_worker_once_and_reports_its_slot(self):
+        on_worker_lost = Mock()
+        executor = self.get_executor("process", on_worker_lost=on_worker_lost)
+        data, headers = get_raw_message()
+
+        results = await asyncio.gather(*(executor.call("FOO-USD", crash_worker) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, BrokenProcessPool) for result in results)
+        on_worker_lost.assert_called_once_with(executor.slot("FOO-USD"))
+        assert len(await executor.run("FOO-USD", data, headers)) == 1
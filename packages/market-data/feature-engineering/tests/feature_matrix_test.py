@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from src.feature_matrix import FeatureMatrix
+
+
+def get_matrix() -> FeatureMatrix:
+    matrix = FeatureMatrix(pd.date_range("2025-01-01", periods=4, freq="15min").to_numpy(), ["a", "b"])
+    matrix["a"] = np.arange(4.0)
+    matrix["b"] = [np.nan, 1.0, np.inf, 3.0]
+    return matrix
+
+
+def test_columns_are_contiguous_views():
+    matrix = get_matrix()
+
+    assert matrix.column("a").flags["C_CONTIGUOUS"]
+    matrix.column("a")[0] = 10
+    assert matrix.values[0, 0] == 10
+
+
+def test_to_frame_drops_incomplete_rows():
+    frame = get_matrix().to_frame()
+
+    assert list(frame.columns) == ["a", "b"]
+    assert frame.index.name == "Date"
+    np.testing.assert_array_equal(frame["a"].to_numpy(), [1.0, 3.0])
+
+
+def test_to_frame_shares_the_matrix_when_nothing_is_dropped():
+    matrix = get_matrix()
+    matrix["b"] = 1.0
+
+    frame = matrix.to_frame()
+
+    assert np.shares_memory(frame.to_numpy(), matrix.values)
+    assert len(get_matrix().to_frame(dropna=False)) == 4
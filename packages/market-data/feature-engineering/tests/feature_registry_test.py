@@ -0,0 +1,65 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+import talib
+
+from src.feature_registry import FeatureRegistry
+from src.processor import get_features
+from src.ta_features import registry
+from tests.candles import get_candles
+
+
+def test_shared_intermediates_are_planned_once():
+    names = [node.name for node in registry.plan(["PR_MA_Ratio_short", "MA_Ratio_short", "MA_Ratio", "PR_MA_Ratio", "Z_score"])]
+
+    assert len(names) == len(set(names))
+    assert names.index("SMA_50") < names.index("MA_Ratio_short")
+    assert names.index("log_return") < names.index("log_return_std_20") < names.index("Z_score")
+    assert "RSI" not in names
+
+
+def test_shared_intermediates_are_computed_once():
+    sma = Mock(side_effect=lambda close: close * 2)
+    features = FeatureRegistry()
+    features.intermediate("SMA", "Close")(sma)
+    features.feature("ratio", "Close", "SMA")(lambda close, ma: close / ma)
+    features.feature("spread", "Close", "SMA")(lambda close, ma: ma - close)
+
+    result = features.compute(get_candles(10))
+
+    assert sma.call_count == 1
+    assert list(result) == ["ratio", "spread"]
+    np.testing.assert_allclose(result["ratio"], 0.5)
+
+
+def test_registering_unknown_dependencies_or_duplicates_fails():
+    features = FeatureRegistry()
+    features.feature("ratio", "Close")(lambda close: close)
+
+    with pytest.raises(ValueError):
+        features.feature("ratio", "Close")
+    with pytest.raises(ValueError):
+        features.feature("other", "SMA_7")
+    with pytest.raises(ValueError):
+        features.plan(["missing"])
+
+
+def test_get_features_selects_a_subset():
+    candles = get_candles(200)
+
+    result = get_features(candles, ["MA_Ratio", "RSI", "DayOfWeek"])
+
+    sma_50, sma_100 = talib.SMA(candles["Close"], 50), talib.SMA(candles["Close"], 100)
+    expected = ((sma_50 - sma_100) / sma_100).dropna()
+    assert list(result.columns) == ["MA_Ratio", "RSI", "DayOfWeek"]
+    assert result.index.name == "Date"
+    np.testing.assert_array_equal(result["MA_Ratio"].to_numpy(), expected.to_numpy())
+
+
+def test_get_features_matches_the_column_layout():
+    result = get_features(get_candles(200))
+
+    assert list(result.columns) == registry.features
+    assert len(result) == 101
+    assert not result.isna().any().any()
@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_store import FeatureStore
+from tests.candles import get_candles
+
+
+def get_features(start: str, rows: int, columns=("RSI", "boll"), offset: float = 0.0) -> pd.DataFrame:
+    index = pd.Index(pd.date_range(start, periods=rows, freq="15min").to_numpy(dtype="datetime64[ns]"), name="Date")
+    values = np.arange(rows * len(columns), dtype=np.float64).reshape(rows, len(columns)) + offset
+    return pd.DataFrame(values, index=index, columns=list(columns))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeatureStore(str(tmp_path))
+
+
+def test_round_trips_rows_across_monthly_partitions(store, tmp_path):
+    features = get_features("2025-01-31 12:00", 200)
+
+    assert store.write("BTC-USD", features) == 200
+
+    assert sorted(p.name for p in (tmp_path / "BTC-USD").iterdir()) == ["2025-01", "2025-02"]
+    pd.testing.assert_frame_equal(store.read("BTC-USD"), features)
+
+
+def test_reads_a_time_range_and_a_subset_of_columns(store):
+    features = get_features("2025-01-31 12:00", 200)
+    store.write("BTC-USD", features)
+
+    result = store.read("BTC-USD", np.datetime64("2025-02-01T00:00"), np.datetime64("2025-02-01T06:00"), ["boll"])
+
+    expected = features.loc["2025-02-01 00:00":"2025-02-01 05:45", ["boll"]]
+    pd.testing.assert_frame_equal(result, expected)
+    assert store.read("ETH-USD").empty
+
+
+def test_overwrites_rows_that_are_already_stored(store):
+    store.write("BTC-USD", get_features("2025-01-01", 10))
+    revised = get_features("2025-01-01 02:15", 3, offset=100)
+
+    added = store.write("BTC-USD", revised)
+
+    result = store.read("BTC-USD")
+    assert added == 2
+    assert len(result) == 12
+    pd.testing.assert_frame_equal(result.iloc[-3:], revised)
+
+
+def test_rewrites_the_partition_for_older_rows_and_new_columns(store):
+    store.write("BTC-USD", get_features("2025-01-01 05:00", 4))
+    store.write("BTC-USD", get_features("2025-01-01 00:00", 2, columns=("RSI", "zsVol"), offset=50))
+
+    result = store.read("BTC-USD")
+
+    assert list(result.columns) == ["RSI", "boll", "zsVol"]
+    assert len(result) == 6
+    assert result.index.is_monotonic_increasing
+    assert result["zsVol"].isna().sum() == 4
+    assert result["RSI"].iloc[0] == 50
+
+
+def test_reads_while_a_partition_is_rewritten(store, tmp_path, monkeypatch):
+    features = get_features("2025-01-01 05:00", 4)
+    store.write("BTC-USD", features)
+    reader = FeatureStore(str(tmp_path))
+    replace = os.replace
+    reads = []
+
+    def replace_and_read(source, destination):
+        replace(source, destination)
+        if not str(destination).endswith("schema.json"):
+            reads.append(reader.read("BTC-USD"))
+    monkeypatch.setattr("src.feature_store.os.replace", replace_and_read)
+
+    store.write("BTC-USD", get_features("2025-01-01 00:00", 2, offset=50))
+
+    assert len(reads) == 2
+    # Halfway through the swap only the old partition is there, once it's done only the new one
+    pd.testing.assert_frame_equal(reads[0], features)
+    assert len(reads[1]) == 6 and reads[1].index.is_unique
+
+
+def test_restores_a_partition_left_missing_by_a_crash(store, tmp_path, monkeypatch):
+    features = get_features("2025-01-01 05:00", 4)
+    store.write("BTC-USD", features)
+    replace = os.replace
+
+    def crash(source, destination):
+        if str(source).endswith(".2025-01.tmp"):
+            raise OSError("crashed")
+        replace(source, destination)
+    monkeypatch.setattr("src.feature_store.os.replace", crash)
+    with pytest.raises(OSError):
+        store.write("BTC-USD", get_features("2025-01-01 00:00", 2, offset=50))
+    monkeypatch.setattr("src.feature_store.os.replace", replace)
+
+    pd.testing.assert_frame_equal(FeatureStore(str(tmp_path)).read("BTC-USD"), features)
+
+    reopened = FeatureStore(str(tmp_path))
+    reopened.write("BTC-USD", get_features("2025-01-01 06:00", 1, offset=90))
+
+    assert sorted(p.name for p in (tmp_path / "BTC-USD").iterdir()) == ["2025-01"]
+    result = reopened.read("BTC-USD")
+    assert len(result) == 7 and result.index.is_unique
+    assert result.loc["2025-01-01 00:00", "RSI"] == 50
+
+
+def test_processor_stores_the_final_values_of_every_candle(tmp_path, monkeypatch):
+    import processor
+    from config import Config
+    from wire_format import encode_message
+    monkeypatch.setenv("FEATURE_STORE_PATH", str(tmp_path))
+    monkeypatch.setenv("TIMEFRAMES", "15m")
+    monkeypatch.setattr(processor, "_store", None)
+    config = Config()
+    candles = get_candles(300, seed=17)
+
+    for end in range(100, 301):
+        window = candles.iloc[end - 100:end].copy()
+        # The newest candle of every window is still open, the next window has its final values
+        window.iloc[-1, window.columns.get_loc("Close")] = window["Open"].iloc[-1] * 1.002
+        window.iloc[-1, window.columns.get_loc("Volume")] /= 3
+        processor.process_payload("STORE-USD", *encode_message(window, "columnar"), config)
+    processor.process_payload("STORE-USD", *encode_message(candles.iloc[200:], "columnar"), config)
+
+    stored = FeatureStore(str(tmp_path)).read("STORE-USD")
+    expected = processor.get_features(candles.copy())
+    # zsVol of the batch path uses the whole frame, every other column only looks back
+    columns = [column for column in expected.columns if column != "zsVol"]
+    assert list(stored.index) == list(expected.index)
+    np.testing.assert_allclose(stored[columns].to_numpy(), expected[columns].to_numpy(), rtol=1e-7, atol=1e-9)
@@ -0,0 +1,167 @@
+import numpy as np
+from pandas import DataFrame
+import pytest
+
+from src.incremental_features import FEATURE_COLUMNS, IncrementalFeatures, RollingWindow, WilderRSI
+from src.processor import get_features
+import talib
+
+from tests.candles import get_candles
+
+RTOL = 1e-7
+ATOL = 1e-9
+
+
+def stream(candles: DataFrame, engine: IncrementalFeatures) -> IncrementalFeatures:
+    for row in candles.itertuples(index=False):
+        engine.update(np.datetime64(row.Date, "ns"), row.Open, row.High, row.Low, row.Close, row.Volume)
+    return engine
+
+
+def assert_features_equal(result: DataFrame, expected: DataFrame, columns=None):
+    columns = list(columns if columns is not None else expected.columns)
+    assert list(result.index) == list(expected.index)
+    np.testing.assert_allclose(result[columns].to_numpy(), expected[columns].to_numpy(), rtol=RTOL, atol=ATOL)
+
+
+def test_matches_talib_over_the_full_series():
+    candles = get_candles(600)
+    engine = stream(candles, IncrementalFeatures(volume_window=600, history=600))
+
+    result = engine.to_frame()
+    expected = get_features(candles.copy())
+
+    assert list(result.columns) == list(expected.columns)
+    # zsVol of the batch path uses the whole frame, every other column only looks back
+    assert_features_equal(result, expected, [column for column in expected.columns if column != "zsVol"])
+    assert result[list(FEATURE_COLUMNS[10:])].abs().to_numpy().sum() > 0
+
+
+def test_latest_row_matches_batch_window():
+    candles = get_candles(400)
+    engine = IncrementalFeatures(volume_window=100)
+
+    stream(candles.iloc[:100], engine)
+    for end in range(100, 400, 37):
+        engine.update_frame(candles.iloc[end - 100:end])
+        expected = get_features(candles.iloc[end - 100:end].copy())
+        # RSI seeds its averages at the start of the series, a 100 candle window seeds them later
+        columns = [column for column in expected.columns if column != "RSI"]
+        assert_features_equal(engine.to_frame(), expected, columns)
+
+
+def test_revising_the_open_candle_matches_the_final_candle():
+    candles = get_candles(300)
+    revised = IncrementalFeatures(history=300)
+    for row in candles.itertuples(index=False):
+        date = np.datetime64(row.Date, "ns")
+        # The candle first shows up while still open, with a different close and volume
+        revised.update(date, row.Open, row.High * 1.01, row.Low * 0.99, row.Open * 1.002, row.Volume / 3)
+        revised.update(date, row.Open, row.High, row.Low, row.Close, row.Volume)
+
+    expected = stream(candles, IncrementalFeatures(history=300)).to_frame()
+    assert_features_equal(revised.to_frame(), expected)
+
+
+def test_update_frame_applies_overlapping_windows():
+    candles = get_candles(300)
+    engine = IncrementalFeatures(history=200)
+    for end in range(100, 301, 5):
+        window = candles.iloc[end - 100:end].copy()
+        # The newest candle of every window is still open
+        window.iloc[-1, window.columns.get_loc("Close")] *= 1.003
+        engine.update_frame(window)
+    engine.update_frame(candles.iloc[200:300])
+
+    expected = stream(candles, IncrementalFeatures(history=200)).to_frame()
+    assert_features_equal(engine.to_frame(), expected)
+
+
+def test_update_frame_rebuilds_state_after_a_gap():
+    candles = get_candles(400)
+    engine = IncrementalFeatures()
+    engine.update_frame(candles.iloc[:150])
+
+    applied = engine.update_frame(candles.iloc[250:400])
+
+    assert applied.index[-1] == candles["Date"].iloc[-1]
+    expected = stream(candles.iloc[250:400], IncrementalFeatures())
+    assert_features_equal(engine.to_frame(), expected.to_frame())
+
+
+def test_update_frame_ignores_older_candles():
+    candles = get_candles(200)
+    engine = IncrementalFeatures()
+    engine.update_frame(candles)
+    before = engine.to_frame()
+
+    assert engine.update_frame(candles.iloc[:120]).empty
+    assert_features_equal(engine.to_frame(), before)
+
+
+def test_update_frame_returns_the_revised_and_appended_rows():
+    candles = get_candles(300)
+    engine = IncrementalFeatures()
+    engine.update_frame(candles.iloc[:200])
+    window = candles.iloc[101:201].copy()
+    # The previous window saw candle 199 while open, this one has its final values and opens 200
+    window.iloc[-1, window.columns.get_loc("Close")] *= 1.003
+
+    changed = engine.update_frame(window)
+
+    expected = stream(candles.iloc[:200], IncrementalFeatures(history=2))
+    expected.update(np.datetime64(window["Date"].iloc[-1], "ns"), *window[["Open", "High", "Low", "Close", "Volume"]].iloc[-1])
+    assert_features_equal(changed, expected.to_frame())
+
+
+def test_rewind_applies_the_candles_from_a_revised_one_again():
+    candles = get_candles(300)
+    engine = IncrementalFeatures(history=300, rewind=2)
+    engine.update_frame(candles.iloc[:200])
+    revised = candles.iloc[:201].copy()
+    # The previous candle of an aggregated timeframe gets its final values after the next one opened
+    revised.iloc[198, revised.columns.get_loc("Close")] *= 1.01
+
+    assert not engine.rewind(np.datetime64(revised["Date"].iloc[197], "ns"))
+    assert engine.rewind(np.datetime64(revised["Date"].iloc[198], "ns"))
+    changed = engine.update_frame(revised)
+
+    assert list(changed.index) == list(revised["Date"].iloc[197:201])
+    assert_features_equal(engine.to_frame(), stream(revised, IncrementalFeatures(history=300)).to_frame())
+
+
+def test_processor_rewinds_the_engine_of_an_aggregated_timeframe(monkeypatch):
+    from src import processor
+    from src.config import Config
+    monkeypatch.setattr(processor, "_engines", {})
+    candles = get_candles(300)
+    revised = candles.copy()
+    revised.iloc[297, revised.columns.get_loc("Close")] *= 1.01
+    processor.get_pair_features("BTC-USD@1h", candles.iloc[:299], Config(), candles["Date"].iloc[0])
+    monkeypatch.setattr(processor.IncrementalFeatures, "reset", lambda engine: pytest.fail("engine rebuilt"))
+
+    changed = processor.get_pair_features("BTC-USD@1h", revised, Config(), np.datetime64(revised["Date"].iloc[297], "ns"))
+
+    expected = get_features(revised.copy())
+    assert_features_equal(changed, expected.iloc[-4:], [column for column in expected.columns if column != "zsVol"])
+
+
+@pytest.mark.parametrize("period", [5, 14])
+def test_wilder_rsi_matches_talib(period):
+    close = get_candles(200)["Close"].to_numpy()
+    rsi = WilderRSI(period)
+    values = [np.nan] + [rsi.update(change) for change in np.diff(close)]
+
+    np.testing.assert_allclose(values, talib.RSI(close, period), rtol=RTOL, atol=ATOL)
+
+
+def test_rolling_window_keeps_sums_of_the_last_values():
+    values = np.random.default_rng(3).normal(100, 5, 250)
+    window = RollingWindow(20)
+    for value in values:
+        window.push(value)
+    window.revise(values[-1] + 1)
+
+    expected = np.concatenate((values[-20:-1], [values[-1] + 1]))
+    assert window.mean() == pytest.approx(expected.mean())
+    assert window.variance(ddof=1) == pytest.approx(expected.var(ddof=1))
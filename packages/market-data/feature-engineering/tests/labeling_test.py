@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.labeling import ChunkLabeler, EwmCarry, main, parameter_sweep
+from src.ta_features import BUY, HOLD, SELL, assign_labels
+
+
+def get_ohlc(rows: int = 3000) -> pd.DataFrame:
+    rng = np.random.default_rng(21)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, rows)))
+    return pd.DataFrame({"Date": pd.date_range("2024-06-01", periods=rows, freq="15min"), "Close": close})
+
+
+def check_label(row):
+    # The row by row labeling assign_labels replaced
+    price_diff_ratio = abs((row['s-1'] - row['Close_MA']) / row['Close_MA'])
+    if not row['alpha'] < price_diff_ratio < row['beta']:
+        return HOLD
+    if row['s-1'] > row['Close_MA']:
+        return SELL
+    if row['s-1'] < row['Close_MA']:
+        return BUY
+    return HOLD
+
+
+def assign_labels_by_row(data, backward_window, forward_window, alpha, beta):
+    data_copy = data.copy()
+    data_copy['Close_MA'] = data_copy['Close'].ewm(span=backward_window).mean()
+    data_copy['s-1'] = data_copy['Close'].shift(-forward_window)
+    data_copy['alpha'] = alpha
+    data_copy['beta'] = beta * (1 + (forward_window * 0.1))
+    return data_copy.apply(check_label, axis=1)
+
+
+@pytest.mark.parametrize("backward_window,forward_window,alpha,beta", [(10, 1, 0.001, 0.01), (30, 5, 0.0005, 0.004)])
+def test_assign_labels_matches_the_row_by_row_version(backward_window, forward_window, alpha, beta):
+    data = get_ohlc(800)
+
+    result = assign_labels(data, backward_window, forward_window, alpha, beta)
+
+    expected = assign_labels_by_row(data, backward_window, forward_window, alpha, beta)
+    assert result.name == "label"
+    assert set(result.unique()) == {-1, 0, 1}
+    np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+
+
+def test_ewm_carry_matches_pandas_over_chunks():
+    close = get_ohlc()["Close"].to_numpy()
+    average = EwmCarry(span=20)
+
+    result = np.concatenate([average.update(chunk) for chunk in np.array_split(close, 7)])
+
+    np.testing.assert_allclose(result, pd.Series(close).ewm(span=20).mean().to_numpy(), rtol=1e-12)
+
+
+def test_chunk_labeler_matches_assign_labels_for_every_parameter_set():
+    data = get_ohlc()
+    sweep = parameter_sweep([10, 25], [1, 4], [0.001], [0.005, 0.01])
+    labeler = ChunkLabeler(sweep)
+
+    chunks = []
+    for start in range(0, len(data), 350):
+        chunk = data.iloc[start:start + 350]
+        chunks.append(labeler.add(chunk["Date"].to_numpy(dtype="datetime64[ns]"), chunk["Close"].to_numpy()))
+    result = pd.concat(chunks + [labeler.finish()], ignore_index=True)
+
+    assert len(result) == len(data)
+    assert (result["Date"].to_numpy() == data["Date"].to_numpy(dtype="datetime64[ns]")).all()
+    for params in sweep:
+        expected = assign_labels(data, *params)
+        np.testing.assert_array_equal(result[params.column].to_numpy(), expected.to_numpy())
+
+
+def test_cli_labels_files_in_parallel(tmp_path):
+    for pair in ("BTC-USD", "ETH-USD"):
+        get_ohlc(500).to_csv(tmp_path / f"{pair}_15m.csv", index=False)
+
+    outputs = main([
+        str(tmp_path / "BTC-USD_15m.csv"), str(tmp_path / "ETH-USD_15m.csv"), "--output-dir", str(tmp_path / "labels"),
+        "--backward-window", "10,20", "--forward-window", "2", "--alpha", "0.001", "--beta", "0.01",
+        "--chunk-size", "64", "--workers", "2"
+    ])
+
+    labels = pd.read_csv(outputs[0])
+    assert [output.split("/")[-1] for output in outputs] == ["BTC-USD_15m_labels.csv", "ETH-USD_15m_labels.csv"]
+    assert list(labels.columns) == ["Date", "label_bw10_fw2_a0.001_b0.01", "label_bw20_fw2_a0.001_b0.01"]
+    np.testing.assert_array_equal(labels["label_bw20_fw2_a0.001_b0.01"].to_numpy(), assign_labels(get_ohlc(500), 20, 2, 0.001, 0.01).to_numpy())
@@ -0,0 +1,145 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, call, patch
+
+import pandas as pd
+from nats.js.errors import NoKeysError
+
+from src.config import Config
+from src.state_checkpoint import StateCheckpointer, decode_checkpoint, encode_checkpoint
+from src.wire_format import decode_message, encode_message
+from tests.candles import get_candles
+
+mock_environ = {
+        "FEATURE_EXECUTOR": "inline",
+        "TIMEFRAMES": "15m,1h",
+        "FEATURE_STORE_PATH": ""
+    }
+
+def get_raw_message(start: int, rows: int = 500):
+    return encode_message(get_candles(rows, "2025-04-01", seed=11, skip=start), "columnar")
+
+class FakeKeyValue:
+    def __init__(self):
+        self.values = {}
+
+    async def put(self, key, value):
+        self.values[key] = value
+        return len(self.values)
+
+    async def get(self, key):
+        return Mock(value=self.values[key])
+
+    async def keys(self):
+        if not self.values:
+            raise NoKeysError()
+        return list(self.values)
+
+class TestStateCheckpoint(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.patcher_os_environ = patch.dict("os.environ", mock_environ)
+        self.patcher_os_environ.start()
+        import processor
+        # Process pools forked by later tests would inherit the engines these tests leave behind
+        self.addCleanup(processor._engines.clear)
+        self.addCleanup(processor._aggregators.clear)
+
+    async def asyncTearDown(self):
+        self.patcher_os_environ.stop()
+
+    def test_checkpoint_encoding(self):
+        assert decode_checkpoint(encode_checkpoint(123456, b"state")) == (123456, b"state")
+
+    async def test_restored_state_continues_like_the_uninterrupted_one(self):
+        import processor
+        from feature_executor import FeatureExecutor
+        config = Config()
+        checkpointer = StateCheckpointer(Mock(), FeatureExecutor(config), config)
+        checkpointer._kv = FakeKeyValue()
+
+        for start in range(0, 40, 4):
+            processor.process_payload("FOO-USD", *get_raw_message(start), config)
+            processor.process_payload("BAR-USD", *get_raw_message(start), config)
+        await checkpointer.save("FOO-USD", 10)
+
+        # A restart loses the engines and aggregators of the pair, BAR-USD keeps running as the reference
+        for key in ("FOO-USD", "FOO-USD@1h"):
+            processor._engines.pop(key)
+            processor._aggregators.pop(key, None)
+        assert await checkpointer.restore() == {"FOO-USD": 10}
+
+        restored = processor.process_payload("FOO-USD", *get_raw_message(535, rows=2), config)
+        expected = processor.process_payload("BAR-USD", *get_raw_message(535, rows=2), config)
+        assert [timeframe for timeframe, _, _ in restored] == ["15m", "1h"]
+        for (_, data, headers), (_, expected_data, expected_headers) in zip(restored, expected):
+            pd.testing.assert_frame_equal(decode_message(data, headers), decode_message(expected_data, expected_headers))
+
+    async def test_restore_without_checkpoints(self):
+        from feature_executor import FeatureExecutor
+        config = Config()
+        checkpointer = StateCheckpointer(Mock(), FeatureExecutor(config), config)
+        checkpointer._kv = FakeKeyValue()
+
+        assert await checkpointer.restore() == {}
+
+    async def test_replay_applies_only_messages_after_the_checkpoint(self):
+        from service import FeatureEngineeringService
+        service = FeatureEngineeringService()
+        service._sequences = {"FOO-USD": 4}
+        service._js = AsyncMock()
+
+        def get_msg(sequence):
+            msg = Mock(subject="market-data.raw.FOO-USD", data=str(sequence).encode(), headers=None)
+            msg.metadata.sequence.stream = sequence
+            return msg
+
+        sub = AsyncMock()
+        sub.fetch.side_effect = [[get_msg(3), get_msg(4), get_msg(5)], [get_msg(6), get_msg(7)], asyncio.TimeoutError()]
+        service._js.pull_subscribe.return_value = sub
+        applied = []
+
+        async def run(coin_pair, data, headers):
+            applied.append(int(data))
+            return [("15m", data, {})]
+
+        service._executor.run = run
+        await service.replay(3, 6)
+
+        assert applied == [5, 6]
+        assert service._sequences["FOO-USD"] == 6
+        service._js.publish.assert_not_awaited()
+        sub.unsubscribe.assert_awaited_once()
+
+    async def test_start_replays_every_message_the_consumer_delivered(self):
+        from service import FeatureEngineeringService
+        service = FeatureEngineeringService()
+        service._js = AsyncMock()
+        service._js.consumer_info.return_value = Mock(
+            ack_floor=Mock(stream_seq=6), delivered=Mock(stream_seq=9), config=service._consumer_config()
+        )
+        service.connect_nats = AsyncMock()
+        service.restore_state = AsyncMock(return_value={"FOO-USD": 4, "BAR-USD": 7})
+        service.replay = AsyncMock()
+        service.consume_messages = AsyncMock()
+
+        await service.start()
+
+        # Up to the ack floor everything was published, above it only some messages were acked
+        assert service.replay.await_args_list == [call(5, 6), call(7, 9, publish=True)]
+
+    async def test_a_dead_worker_resets_the_sequences_of_its_pairs(self):
+        from service import FeatureEngineeringService
+        with patch.dict("os.environ", {"FEATURE_EXECUTOR": "process", "FEATURE_WORKERS": "2"}):
+            service = FeatureEngineeringService()
+        self.addCleanup(service._executor.shutdown)
+        service._checkpoints = StateCheckpointer(Mock(), service._executor, service._config)
+        pairs = ["BTC-USD", "ETH-USD", "SOL-USD", "XRP-USD", "ADA-USD", "DOT-USD"]
+        service._sequences = {coin_pair: 10 for coin_pair in pairs}
+        service._checkpoints.saved = {coin_pair: 10 for coin_pair in pairs}
+        lost = [coin_pair for coin_pair in pairs if service._executor.slot(coin_pair) == 0]
+        assert 0 < len(lost) < len(pairs)
+
+        service._worker_lost(0)
+
+        assert set(service._sequences) == set(pairs) - set(lost)
+        assert set(service._checkpoints.saved) == set(pairs) - set(lost)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.timeframes import CandleAggregator, parse_timeframe
+from tests.candles import get_candles
+
+
+def resample(candles: pd.DataFrame, rule: str) -> pd.DataFrame:
+    return candles.set_index("Date").resample(rule).agg(
+        {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    ).reset_index()
+
+
+def test_parse_timeframe():
+    assert parse_timeframe("15m") == np.timedelta64(15, "m")
+    assert parse_timeframe("4h") == np.timedelta64(4, "h")
+    assert parse_timeframe("1d") == np.timedelta64(1, "D")
+    with pytest.raises(ValueError):
+        parse_timeframe("1w")
+    with pytest.raises(ValueError):
+        CandleAggregator("20m")
+
+
+@pytest.mark.parametrize("timeframe,rule", [("1h", "1h"), ("4h", "4h"), ("1d", "1D")])
+def test_full_window_matches_pandas_resample(timeframe, rule):
+    candles = get_candles(720, start="2025-03-01")
+    aggregator = CandleAggregator(timeframe)
+
+    changed = aggregator.update(candles)
+
+    expected = resample(candles, rule)
+    assert changed == len(expected) == len(aggregator)
+    pd.testing.assert_frame_equal(aggregator.to_frame(), expected, check_freq=False)
+
+
+def test_drops_the_partial_first_bucket():
+    candles = get_candles(10, start="2025-03-01 00:30")
+    aggregator = CandleAggregator("1h")
+
+    aggregator.update(candles)
+
+    assert aggregator.to_frame()["Date"].iloc[0] == pd.Timestamp("2025-03-01 01:00")
+
+
+def test_only_changed_buckets_are_aggregated_again():
+    candles = get_candles(200, start="2025-03-01")
+    aggregator = CandleAggregator("1h", history=30)
+    aggregator.update(candles.iloc[:120])
+
+    # Sliding windows resend the known candles, only the revised last one and the new one change
+    assert aggregator.update(candles.iloc[:120]) == 0
+    revised = candles.iloc[1:120].copy()
+    revised.loc[119, "Close"] *= 1.01
+    assert aggregator.update(revised) == 1
+    assert aggregator.changed_from == np.datetime64("2025-03-02T05:00", "ns")
+
+    # Delta frames resend the previous candle with its final values
+    for end in range(121, 201):
+        aggregator.update(candles.iloc[end - 2:end])
+
+    expected = resample(candles, "1h").tail(30).reset_index(drop=True)
+    assert len(aggregator) == 30
+    pd.testing.assert_frame_equal(aggregator.to_frame(), expected, check_freq=False)
@@ -19,3 +19,29 @@ def test_healthz_endpoint():
     response = client.get("/healthz")
     assert response.status_code == 200
     assert '{"status": "ok"}' in json.dumps(response.json())
+
+def test_features_endpoint_reads_a_range_from_the_store(tmp_path):
+    import numpy as np
+    import pandas as pd
+    from unittest.mock import patch
+    from src.feature_store import FeatureStore
+    from src.wire_format import decode_message
+
+    store = FeatureStore(str(tmp_path))
+    index = pd.Index(pd.date_range("2025-01-01", periods=8, freq="15min").to_numpy(dtype="datetime64[ns]"), name="Date")
+    store.write("BTC-USD", pd.DataFrame({"RSI": np.arange(8.0), "boll": np.ones(8)}, index=index))
+    store.write("BTC-USD@1h", pd.DataFrame({"RSI": np.arange(2.0), "boll": np.ones(2)}, index=index[::4]))
+
+    with patch("src.webserver.store", store):
+        response = client.get("/features/BTC-USD", params={"start": "2025-01-01T00:30", "end": "2025-01-01T01:30", "columns": "RSI"})
+        columnar = client.get("/features/BTC-USD", params={"format": "columnar"})
+        hourly = client.get("/features/BTC-USD", params={"timeframe": "1h"})
+        missing = client.get("/features/ETH-USD")
+        unknown_format = client.get("/features/BTC-USD", params={"format": "xml"})
+
+    assert response.status_code == 200
+    assert [row["RSI"] for row in response.json()] == [2.0, 3.0, 4.0, 5.0]
+    assert len(decode_message(columnar.content, {"Content-Type": columnar.headers["content-type"]})) == 8
+    assert [row["RSI"] for row in hourly.json()] == [0.0, 1.0]
+    assert missing.status_code == 404
+    assert unknown_format.status_code == 422
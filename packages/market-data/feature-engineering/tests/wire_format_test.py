@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from src.wire_format import (
+    COLUMNAR_CONTENT_TYPE, CONTENT_TYPE_HEADER, JSON_CONTENT_TYPE,
+    decode_frame, decode_message, encode_frame, encode_message
+)
+
+
+def get_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Date": pd.to_datetime([1700000000, 1700000900], unit="s"),
+        "Open": [50000.5, 50100.25],
+        "Volume": [1.5, 2.0]
+    })
+
+
+def test_columnar_round_trip_keeps_dtypes():
+    df = get_frame()
+
+    decoded = decode_frame(encode_frame(df))
+
+    pd.testing.assert_frame_equal(decoded, df)
+
+
+def test_columnar_round_trip_keeps_named_index():
+    df = get_frame().set_index("Date")
+
+    decoded = decode_frame(encode_frame(df))
+
+    pd.testing.assert_frame_equal(decoded, df)
+    decoded["Open"] *= 2
+
+
+def test_columnar_handles_empty_frames():
+    df = get_frame().iloc[:0]
+
+    decoded = decode_frame(encode_frame(df))
+
+    assert decoded.empty
+    assert list(decoded.columns) == ["Date", "Open", "Volume"]
+
+
+def test_encode_message_declares_format_in_headers():
+    _, columnar_headers = encode_message(get_frame(), "columnar")
+    _, json_headers = encode_message(get_frame(), "json")
+
+    assert columnar_headers == {CONTENT_TYPE_HEADER: COLUMNAR_CONTENT_TYPE}
+    assert json_headers == {CONTENT_TYPE_HEADER: JSON_CONTENT_TYPE}
+
+
+def test_decode_message_accepts_legacy_json():
+    payload = b'[{"Date":1700000000000,"Open":50000.5,"Volume":1.5}]'
+
+    decoded = decode_message(payload, None)
+
+    assert decoded["Date"].iloc[0] == pd.Timestamp(1700000000, unit="s")
+    assert decoded["Open"].dtype == np.float64
+
+
+def test_json_round_trip_writes_dates_as_epoch_milliseconds():
+    df = get_frame()
+    df.loc[1, "Date"] = pd.NaT
+
+    payload, headers = encode_message(df, "json")
+
+    assert b'"Date":1700000000000' in payload
+    assert b'"Date":null' in payload
+    decoded = decode_message(payload, headers)
+    assert decoded["Date"].iloc[0] == df["Date"].iloc[0]
+    assert pd.isna(decoded["Date"].iloc[1])
+    pd.testing.assert_frame_equal(decoded[["Open", "Volume"]], df[["Open", "Volume"]])
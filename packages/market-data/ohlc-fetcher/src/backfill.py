@@ -0,0 +1,316 @@
+"""
+Historical backfill for the ohlc-fetcher.
+
+Pages through Kraken's public Trades endpoint (or OHLC for the last 720 candles) for a
+date range, turns each page into candles and streams them into JetStream or CSV files.
+Only one page plus a chunk of candles is held in memory, and progress is checkpointed
+per pair so an interrupted run resumes where it stopped.
+
+    python src/backfill.py --pairs BTC/USD,ETH/USD --start 2025-01-01 --end 2025-04-01
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Protocol
+
+import nats
+from nats.aio.client import Client
+from nats.js import JetStreamContext
+import numpy as np
+import pandas as pd
+
+import fetcher
+from processor import process_crypto_pair
+from wire_format import encode_message
+
+logger = logging.getLogger(__name__)
+
+NANOSECONDS = 1_000_000_000
+# Kraken only serves the latest 720 candles through the OHLC endpoint
+OHLC_MAX_CANDLES = 720
+
+
+class CandleAggregator:
+    """
+    Builds Kraken-shaped OHLC rows [time, open, high, low, close, vwap, volume, count]
+    out of time-ordered trade pages. The candle of the latest trade is kept open until
+    a trade from a later interval shows up.
+    """
+
+    def __init__(self, interval_seconds: int) -> None:
+        self.interval_seconds = interval_seconds
+        self._open: Optional[np.ndarray] = None
+
+    @property
+    def open_candle_start(self) -> Optional[int]:
+        return int(self._open[0]) if self._open is not None else None
+
+    def add_trades(self, prices: np.ndarray, volumes: np.ndarray, times: np.ndarray) -> np.ndarray:
+        if len(prices) == 0:
+            return np.empty((0, 8))
+
+        buckets = (times // self.interval_seconds).astype(np.int64) * self.interval_seconds
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(prices)]))
+        volume = np.add.reduceat(volumes, starts)
+        candles = np.column_stack((
+            buckets[starts],
+            prices[starts],
+            np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts),
+            prices[ends - 1],
+            np.add.reduceat(prices * volumes, starts),
+            volume,
+            ends - starts
+        ))
+
+        if self._open is not None:
+            if candles[0, 0] == self._open[0]:
+                candles[0] = self._merge(self._open, candles[0])
+            else:
+                candles = np.vstack((self._open, candles))
+
+        self._open = candles[-1]
+        return self._finalize(candles[:-1])
+
+    def flush(self) -> np.ndarray:
+        if self._open is None:
+            return np.empty((0, 8))
+        candles = self._finalize(self._open[np.newaxis, :])
+        self._open = None
+        return candles
+
+    def _merge(self, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        return np.array([
+            first[0], first[1], max(first[2], second[2]), min(first[3], second[3]), second[4],
+            first[5] + second[5], first[6] + second[6], first[7] + second[7]
+        ])
+
+    def _finalize(self, candles: np.ndarray) -> np.ndarray:
+        # Column 5 carries sum(price * volume) while aggregating, it becomes the VWAP on the way out
+        candles = candles.copy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            candles[:, 5] = np.where(candles[:, 6] > 0, candles[:, 5] / candles[:, 6], candles[:, 4])
+        return candles
+
+
+class Checkpoint:
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._state: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self._state = json.load(f)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self._state.get(key)
+
+    def save(self, key: str, value: Dict) -> None:
+        self._state[key] = value
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self._path)
+
+
+class Sink(Protocol):
+    async def write(self, pair: str, df: pd.DataFrame) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class FileSink:
+    def __init__(self, directory: str, interval: int) -> None:
+        self._directory = directory
+        self._interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, pair: str) -> str:
+        return os.path.join(self._directory, f"{pair.replace('/', '-')}_{self._interval}m.csv")
+
+    async def write(self, pair: str, df: pd.DataFrame) -> None:
+        path = self.path(pair)
+        df.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+    async def close(self) -> None:
+        pass
+
+
+class JetStreamSink:
+    def __init__(self, nats_url: str, subject: str, wire_format: str) -> None:
+        self._nats_url = nats_url
+        self._subject = subject
+        self._wire_format = wire_format
+        self._nc: Client
+        self._js: JetStreamContext
+
+    async def connect(self) -> None:
+        self._nc = await nats.connect(servers=[self._nats_url])
+        self._js = self._nc.jetstream()
+
+    async def write(self, pair: str, df: pd.DataFrame) -> None:
+        subject = f"{self._subject}.{pair.replace('/', '-')}"
+        data, headers = encode_message(df, self._wire_format)
+        # The message id makes re-sending a chunk after a resume a no-op for JetStream
+        first, last = df["Date"].iloc[0].value, df["Date"].iloc[-1].value
+        headers["Nats-Msg-Id"] = f"backfill:{pair}:{first}:{last}"
+        ack = await self._js.publish(subject, data, headers=headers)
+        logger.info(f"Published {len(df)} candles to {subject} [{ack}]")
+
+    async def close(self) -> None:
+        await self._nc.drain()
+
+
+class Backfill:
+    def __init__(self, sink: Sink, checkpoint: Checkpoint, interval: int, source: str, chunk_size: int) -> None:
+        self._sink = sink
+        self._checkpoint = checkpoint
+        self._interval = interval
+        self._source = source
+        self._chunk_size = chunk_size
+
+    def _key(self, pair: str) -> str:
+        return f"{self._source}:{pair}:{self._interval}"
+
+    async def _write(self, pair: str, chunks: List[np.ndarray]) -> int:
+        candles = np.vstack(chunks) if chunks else np.empty((0, 8))
+        if len(candles) == 0:
+            return 0
+        await self._sink.write(pair, process_crypto_pair(candles))
+        return len(candles)
+
+    async def run_pair(self, pair: str, start: int, end: int) -> int:
+        if self._source == "trades":
+            written = await self._run_trades(pair, start, end)
+        else:
+            written = await self._run_ohlc(pair, start, end)
+        logger.info(f"Backfill for {pair} finished, {written} candles written")
+        return written
+
+    async def _run_trades(self, pair: str, start: int, end: int) -> int:
+        key = self._key(pair)
+        saved = self._checkpoint.get(key)
+        if saved and saved.get("done"):
+            logger.info(f"Backfill for {pair} already completed, skipping")
+            return 0
+
+        cursor = saved["since"] if saved else start * NANOSECONDS
+        aggregator = CandleAggregator(self._interval * 60)
+        pending: List[np.ndarray] = []
+        pending_rows = 0
+        written = 0
+        finished = False
+
+        while not finished:
+            trades, last = await fetcher.get_trades(pair, cursor)
+            if len(trades) > 0:
+                table = np.asarray(trades)[:, :3].astype(np.float64)
+                in_range = table[:, 2] < end
+                finished = not in_range.all()
+                table = table[in_range]
+                candles = aggregator.add_trades(table[:, 0], table[:, 1], table[:, 2])
+                pending.append(candles)
+                pending_rows += len(candles)
+
+            if last is None or last <= cursor or len(trades) == 0:
+                finished = True
+            else:
+                cursor = last
+
+            if finished:
+                open_start = aggregator.open_candle_start
+                if open_start is not None and open_start + self._interval * 60 <= end:
+                    pending.append(aggregator.flush())
+
+            if pending_rows >= self._chunk_size or finished:
+                written += await self._write(pair, pending)
+                pending, pending_rows = [], 0
+                open_start = aggregator.open_candle_start
+                # Resume from the start of the open candle so its trades are fetched again
+                since = open_start * NANOSECONDS if open_start is not None else cursor
+                self._checkpoint.save(key, {"since": since, "done": finished})
+
+        return written
+
+    async def _run_ohlc(self, pair: str, start: int, end: int) -> int:
+        key = self._key(pair)
+        saved = self._checkpoint.get(key)
+        if saved and saved.get("done"):
+            logger.info(f"Backfill for {pair} already completed, skipping")
+            return 0
+
+        if start < time.time() - OHLC_MAX_CANDLES * self._interval * 60:
+            logger.warning(f"Kraken only serves the latest {OHLC_MAX_CANDLES} OHLC candles, use --source trades for older history")
+
+        emitted = saved["since"] if saved else start - 1
+        written = 0
+        while True:
+            rows, _ = await fetcher.get_ohlc_page(pair, self._interval, emitted)
+            table = np.asarray(rows)
+            if table.size == 0:
+                break
+            times = table[:, 0].astype(np.int64)
+            # The newest candle is still open, it's left for the live fetcher
+            committed = (times > emitted) & (times >= start) & (times < end) & (times + self._interval * 60 <= time.time())
+            if not committed.any():
+                break
+            written += await self._write(pair, [table[committed]])
+            emitted = int(times[committed][-1])
+            self._checkpoint.save(key, {"since": emitted, "done": False})
+
+        self._checkpoint.save(key, {"since": emitted, "done": True})
+        return written
+
+
+def _parse_date(value: str) -> int:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill historical OHLC candles from Kraken")
+    parser.add_argument("--pairs", default=os.getenv("PAIRS", "BTC/USD"), help="Comma separated list of pairs")
+    parser.add_argument("--start", required=True, help="Start of the range, ISO date (UTC)")
+    parser.add_argument("--end", default=None, help="End of the range, ISO date (UTC). Defaults to now")
+    parser.add_argument("--interval", type=int, default=int(os.getenv("OHLC_INTERVAL", 15)), help="Candle interval in minutes")
+    parser.add_argument("--source", choices=["trades", "ohlc"], default="trades")
+    parser.add_argument("--output", choices=["jetstream", "file"], default="jetstream")
+    parser.add_argument("--directory", default="backfill", help="Output directory for --output file")
+    parser.add_argument("--subject", default=os.getenv("BACKFILL_SUBJECT", "market-data.backfill"))
+    parser.add_argument("--checkpoint", default="backfill-checkpoint.json")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Candles per published chunk")
+    return parser.parse_args(argv)
+
+
+async def main(argv: List[str]):
+    args = _parse_args(argv)
+    start = _parse_date(args.start)
+    end = _parse_date(args.end) if args.end else int(time.time())
+
+    sink: Sink
+    if args.output == "file":
+        sink = FileSink(args.directory, args.interval)
+    else:
+        jetstream_sink = JetStreamSink(os.getenv("NATS_URL", "nats://localhost:4222"), args.subject, os.getenv("WIRE_FORMAT", "columnar"))
+        await jetstream_sink.connect()
+        sink = jetstream_sink
+
+    backfill = Backfill(sink, Checkpoint(args.checkpoint), args.interval, args.source, args.chunk_size)
+    try:
+        for pair in args.pairs.split(","):
+            await backfill.run_pair(pair, start, end)
+    finally:
+        await sink.close()
+        await fetcher.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    asyncio.run(main(sys.argv[1:]))
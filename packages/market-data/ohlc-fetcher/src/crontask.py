@@ -1,12 +1,15 @@
 import asyncio
 import logging
 import os
-from typing import Any, Awaitable, Callable, List
-import schedule
+import random
+import time
+from typing import Any, Awaitable, Callable, List, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+OVERLAP_POLICIES = ("skip", "coalesce")
+
 class SingletonMeta(type):
     _instances = {}
 
@@ -21,8 +24,18 @@ class Crontask(metaclass=SingletonMeta):
     def __init__(self) -> None:
         self._running = False
         self._interval = int(os.getenv("CRON_SECONDS", 900))
-        logger.info(f"Interval configured to {self._interval} seconds")
+        self._settle_delay = float(os.getenv("CRON_SETTLE_SECONDS", 2))
+        self._jitter = float(os.getenv("CRON_JITTER_SECONDS", 0))
+        self._overlap_policy = os.getenv("CRON_OVERLAP_POLICY", "skip")
+        if self._overlap_policy not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown CRON_OVERLAP_POLICY {self._overlap_policy}. Expected one of {OVERLAP_POLICIES}")
+        logger.info(f"Interval configured to {self._interval} seconds [settle={self._settle_delay}s, jitter={self._jitter}s, overlap={self._overlap_policy}]")
         self._subscribers: List[Callable[[], Awaitable[Any]]] = []
+        self._stop_event: Optional[asyncio.Event] = None
+        self._current_run: Optional[asyncio.Task] = None
+        self._rerun_pending = False
+        self.missed_ticks = 0
+        self.skipped_ticks = 0
 
     def subscribe(self, listener: Callable[[], Awaitable[Any]]):
         logger.info(f"Subscribed new task: {listener.__name__}")
@@ -30,39 +43,78 @@ class Crontask(metaclass=SingletonMeta):
 
     def clear_subscribers(self) -> None:
         self._subscribers.clear()
-    
+
     def set_interval(self, interval: int) -> None:
         self._interval = interval
 
+    def _next_boundary(self, now: float) -> float:
+        # Ticks are aligned to multiples of the interval since the epoch, which is when Kraken closes candles
+        return (now // self._interval + 1) * self._interval
+
     def _dispatch_tasks(self):
         if not self._subscribers:
             logger.debug("No subscribers to dispatch.")
             return
-        
+
+        if self._current_run is not None and not self._current_run.done():
+            if self._overlap_policy == "coalesce":
+                logger.warning("Previous crontask run still in flight. Coalescing this tick into a single rerun.")
+                self._rerun_pending = True
+            else:
+                self.skipped_ticks += 1
+                logger.warning(f"Previous crontask run still in flight. Skipping this tick [skipped={self.skipped_ticks}]")
+            return
+
         logger.info(f"Dispatching {len(self._subscribers)} crontask subscribers at {datetime.now()}")
-        asyncio.create_task(self._run_subscribers())
-    
+        self._current_run = asyncio.create_task(self._run_subscribers())
+
     async def _run_subscribers(self):
-        await asyncio.gather(*(subscriber() for subscriber in self._subscribers), return_exceptions=True)
+        while True:
+            self._rerun_pending = False
+            await asyncio.gather(*(subscriber() for subscriber in self._subscribers), return_exceptions=True)
+            if not self._rerun_pending:
+                return
+            logger.info("Running coalesced crontask tick")
+
+    async def _wait(self, delay: float, stop_event: asyncio.Event) -> None:
+        # The event loop clock is monotonic, so wall clock adjustments don't stretch or shrink the wait
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=max(delay, 0))
+        except asyncio.TimeoutError:
+            pass
 
     async def start(self):
         if self._running:
             logger.warning("Crontask already started. Can't start it again.")
             return
 
-        schedule.every(self._interval).seconds.do(self._dispatch_tasks)
         self._running = True
+        stop_event = asyncio.Event()
+        self._stop_event = stop_event
 
         try:
-            while self._running:
-                schedule.run_pending()
-                await asyncio.sleep(1)
+            boundary = self._next_boundary(time.time())
+            while not stop_event.is_set():
+                jitter = random.uniform(0, self._jitter) if self._jitter > 0 else 0
+                await self._wait(boundary + self._settle_delay + jitter - time.time(), stop_event)
+                if stop_event.is_set():
+                    break
+
+                missed = int((time.time() - self._settle_delay - boundary) // self._interval)
+                if missed > 0:
+                    self.missed_ticks += missed
+                    logger.warning(f"Crontask woke up late, {missed} ticks missed [total={self.missed_ticks}]")
+
+                self._dispatch_tasks()
+                boundary += self._interval * (missed + 1)
         except asyncio.CancelledError:
             logger.info("Crontask cancelled. Exiting task loop.")
-            self.stop()
+            if self._stop_event is stop_event:
+                self.stop()
         finally:
             logger.info("Crontask finished cleanup")
 
     def stop(self):
-        schedule.clear()
         self._running = False
+        if self._stop_event is not None:
+            self._stop_event.set()
@@ -1,22 +1,156 @@
+import asyncio
 from datetime import datetime, timedelta
 import logging
 import os
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 import httpx
 
+from ohlc_window import PairWindow
+from rate_limiter import TokenBucket
+
 logger = logging.getLogger(__name__)
 
-async def get_ohlc(pair: str) -> List:
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_ERRORS = ("EGeneral:Too many requests", "EAPI:Rate limit exceeded")
+
+_client: Optional[httpx.AsyncClient] = None
+_limiter: Optional[TokenBucket] = None
+_windows: Dict[str, PairWindow] = {}
+
+def _http2_enabled() -> bool:
+    if os.getenv("KRAKEN_HTTP2", "False").lower() not in ('true', '1', 't'):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("KRAKEN_HTTP2 is enabled but the h2 package is not installed. Falling back to HTTP/1.1")
+        return False
+    return True
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+            max_connections=int(os.getenv("KRAKEN_MAX_CONNECTIONS", 20)),
+            max_keepalive_connections=int(os.getenv("KRAKEN_MAX_KEEPALIVE", 10)),
+            keepalive_expiry=float(os.getenv("KRAKEN_KEEPALIVE_EXPIRY", 60))
+            )
+    timeout = httpx.Timeout(
+            float(os.getenv("KRAKEN_TIMEOUT_SECONDS", 10)),
+            connect=float(os.getenv("KRAKEN_CONNECT_TIMEOUT_SECONDS", 5))
+            )
+    http2 = _http2_enabled()
+    logger.info(f"Creating Kraken HTTP client [http2={http2}, limits={limits}, timeout={timeout}]")
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+def get_limiter() -> TokenBucket:
+    # Kraken's public endpoints allow roughly one call per second with short bursts
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucket(
+                rate=float(os.getenv("KRAKEN_RATE_LIMIT", 1)),
+                capacity=float(os.getenv("KRAKEN_RATE_BURST", 15))
+                )
+    return _limiter
+
+async def close():
+    global _client, _limiter
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Kraken HTTP client closed")
+    _client = None
+    _limiter = None
+
+def _is_rate_limited(body: Dict[str, Any]) -> bool:
+    errors = body.get("error") or []
+    return any(error.startswith(RATE_LIMIT_ERRORS) for error in errors)
+
+async def _get(url: str) -> Dict[str, Any]:
+    retries = int(os.getenv("KRAKEN_RETRIES", 3))
+    backoff = float(os.getenv("KRAKEN_BACKOFF_SECONDS", 0.5))
+    client = get_client()
+    limiter = get_limiter()
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        try:
+            response = await client.get(url)
+            logger.info(f"Got response: {response}")
+            if response.status_code in RETRY_STATUS_CODES:
+                if response.status_code == 429:
+                    limiter.drain()
+                if attempt >= retries:
+                    response.raise_for_status()
+                logger.warning(f"Got status {response.status_code} from {url}")
+            else:
+                body = response.json()
+                if not _is_rate_limited(body) or attempt >= retries:
+                    return body
+                logger.warning(f"Rate limited by Kraken on {url}: {body['error']}")
+                limiter.drain()
+        except httpx.TransportError as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Request to {url} failed: {e}")
+
+        delay = backoff * (2 ** attempt)
+        attempt += 1
+        logger.info(f"Retrying request to {url} in {delay:.2f} seconds [{attempt}/{retries}]")
+        await asyncio.sleep(delay)
+
+def _get_window(pair: str) -> PairWindow:
+    if pair not in _windows:
+        _windows[pair] = PairWindow(
+                size=int(os.getenv("OHLC_WINDOW", 100)),
+                interval_seconds=int(os.getenv("OHLC_INTERVAL", 15)) * 60
+                )
+    return _windows[pair]
+
+async def _request_public(api_path: str, api_data: str) -> Dict[str, Any]:
     base_url =  os.getenv("KRAKEN_URL", "https://api.kraken.com")
-    interval = 15
-    since = int((datetime.today() - timedelta(minutes=interval * 100)).timestamp())
-    api_path = "0/public/OHLC"
-    api_data = f"pair={pair}&interval={interval}&since={since}"
     url = f"{base_url}/{api_path}?{api_data}"
-    async with httpx.AsyncClient() as client:
-        logger.info(f"Requesting data to {url} ...")
-        response = await client.get(url)
-        logger.info(f"Got response: {response}")
-        raw_data = response.json()
-        result = raw_data['result'][pair]
-        return result
+    logger.info(f"Requesting data to {url} ...")
+    raw_data = await _get(url)
+    return raw_data['result']
+
+async def _request_ohlc(pair: str, interval: int, since: int) -> Dict[str, Any]:
+    return await _request_public("0/public/OHLC", f"pair={pair}&interval={interval}&since={since}")
+
+async def get_ohlc_page(pair: str, interval: int, since: int) -> Tuple[List, Optional[int]]:
+    result = await _request_ohlc(pair, interval, since)
+    return result[pair], result.get("last")
+
+async def get_trades(pair: str, since: int) -> Tuple[List, Optional[int]]:
+    result = await _request_public("0/public/Trades", f"pair={pair}&since={since}")
+    last = result.get("last")
+    return result[pair], int(last) if last is not None else None
+
+async def get_ohlc(pair: str) -> List:
+    window = _get_window(pair)
+    interval = window.interval_seconds // 60
+    now = datetime.today()
+
+    if window.is_warm() and not window.is_stale(now.timestamp()):
+        result = await _request_ohlc(pair, interval, window.cursor) # type: ignore
+        if window.merge(result[pair], result.get("last")):
+            logger.info(f"Merged {len(result[pair])} new candles for {pair}")
+            return list(window.rows)
+        logger.warning(f"Gap detected in {pair} candles. Running a full refresh")
+
+    since = int((now - timedelta(minutes=interval * window.size)).timestamp())
+    result = await _request_ohlc(pair, interval, since)
+    window.replace(result[pair], result.get("last"))
+    return list(window.rows)
+
+async def add_closed_candle(pair: str, row: list) -> List:
+    window = _get_window(pair)
+    if window.is_warm() and window.merge([row], None):
+        return list(window.rows)
+
+    logger.info(f"Window for {pair} is not connected to the new candle. Running a full refresh")
+    window.reset()
+    return await get_ohlc(pair)
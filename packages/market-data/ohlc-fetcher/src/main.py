@@ -1,12 +1,15 @@
 import asyncio
+import os
 import sys
 from asyncio.tasks import Task
 import logging
 from typing import List
 
 from crontask import Crontask
+import fetcher
 from webserver import get_webserver
 from publisher import Publisher
+from streamer import KrakenStreamer
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,17 +24,24 @@ async def main():
     webserver = get_webserver()
     crontask = Crontask()
     
+    ingestion_mode = os.getenv("INGESTION_MODE", "poll")
+    logger.info(f"Ingestion mode: {ingestion_mode}")
+
     nats_publisher = Publisher(crontask)
-    await nats_publisher.start()
+    await nats_publisher.start(schedule=ingestion_mode != "stream")
 
     try:
         async with asyncio.TaskGroup() as tg:
             all_tasks.append(tg.create_task(webserver.serve()))
-            all_tasks.append(tg.create_task(crontask.start()))
+            if ingestion_mode == "stream":
+                all_tasks.append(tg.create_task(KrakenStreamer(nats_publisher).start()))
+            else:
+                all_tasks.append(tg.create_task(crontask.start()))
     except asyncio.CancelledError:
         logger.info("Main received cancellation.")
         await shutdown()
     finally:
+        await fetcher.close()
         logger.info("Main exiting")
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+import bisect
+from typing import List, Optional
+
+
+class PairWindow:
+    """
+    Rolling buffer of the latest `size` raw Kraken OHLC rows for a single pair,
+    together with the `last` cursor Kraken returned for it.
+    """
+
+    def __init__(self, size: int, interval_seconds: int) -> None:
+        self.size = size
+        self.interval_seconds = interval_seconds
+        self.rows: List[list] = []
+        self._times: List[int] = []
+        self.cursor: Optional[int] = None
+
+    def is_warm(self) -> bool:
+        return self.cursor is not None and len(self.rows) > 0
+
+    def reset(self) -> None:
+        self.rows = []
+        self._times = []
+        self.cursor = None
+
+    def replace(self, rows: List[list], cursor: Optional[int]) -> None:
+        self.rows = rows[-self.size:]
+        self._times = [int(row[0]) for row in self.rows]
+        self.cursor = cursor
+
+    def merge(self, rows: List[list], cursor: Optional[int]) -> bool:
+        """
+        Merges newer rows into the buffer, replacing the candle with the same timestamp as
+        the last buffered one (Kraken keeps updating the candle that is still open). Rows
+        older than that candle are ignored. Returns False when the new rows don't connect
+        with the buffered ones, in which case nothing is merged.
+        """
+        if rows and self._times:
+            rows = [row for row in rows if int(row[0]) >= self._times[-1]]
+        if rows:
+            first_time = int(rows[0][0])
+            if self._times and first_time > self._times[-1] + self.interval_seconds:
+                return False
+
+            start = bisect.bisect_left(self._times, first_time)
+            self.rows = (self.rows[:start] + rows)[-self.size:]
+            self._times = (self._times[:start] + [int(row[0]) for row in rows])[-self.size:]
+
+        if cursor is not None:
+            self.cursor = cursor
+        return True
+
+    def is_stale(self, now: float) -> bool:
+        return self.cursor is None or now - self.cursor > self.size * self.interval_seconds
@@ -1,19 +1,21 @@
-from datetime import datetime
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
+DATA_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+# Positions of DATA_COLUMNS in a Kraken OHLC row: [time, open, high, low, close, vwap, volume, count]
+_DATA_INDICES = [1, 2, 3, 4, 6]
+
 
 def process_crypto_pair(raw_data) -> DataFrame:
-    for ohlc in raw_data:
-        ohlc[0] = datetime.fromtimestamp(ohlc[0])
-    
-    data_columns = ["Date", "Open", "High", "Low", "Close", "VWAP", "Volume", "Count"]
-    ohlc_df = pd.DataFrame(raw_data, columns=pd.Index(data_columns))
-    ohlc_df.drop(columns=["VWAP", "Count"], inplace=True)
-    ohlc_df["Open"] = pd.to_numeric(ohlc_df["Open"], errors="coerce")
-    ohlc_df["High"] = pd.to_numeric(ohlc_df["High"], errors="coerce")
-    ohlc_df["Low"] = pd.to_numeric(ohlc_df["Low"], errors="coerce")
-    ohlc_df["Close"] = pd.to_numeric(ohlc_df["Close"], errors="coerce")
-    ohlc_df["Volume"] = pd.to_numeric(ohlc_df["Volume"], errors="coerce")
+    table = np.asarray(raw_data)
+    if table.size == 0:
+        table = np.empty((0, 8), dtype=np.float64)
+
+    dates = table[:, 0].astype(np.int64).astype("datetime64[s]").astype("datetime64[ns]")
+    values = table[:, _DATA_INDICES].astype(np.float64)
+
+    ohlc_df = pd.DataFrame(values, columns=pd.Index(DATA_COLUMNS))
+    ohlc_df.insert(0, "Date", dates)
 
     return ohlc_df
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from nats.js import JetStreamContext
+from nats.js.api import PubAck
+
+logger = logging.getLogger(__name__)
+
+class BatchResult:
+    def __init__(self, published: int, failed: int, retried: int, duration: float) -> None:
+        self.published = published
+        self.failed = failed
+        self.retried = retried
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return f"BatchResult(published={self.published}, failed={self.failed}, retried={self.retried}, duration={self.duration:.3f}s)"
+
+class PublishPipeline:
+    """
+    Keeps up to `window` JetStream publishes in flight instead of waiting for each ack in turn.
+    Failed publishes are retried on their own with exponential backoff, and `flush` waits for
+    everything submitted so far and reports how the batch went.
+    """
+
+    def __init__(self, js: JetStreamContext, window: int = 64, retries: int = 3, backoff: float = 0.5) -> None:
+        self._js = js
+        self._window = asyncio.Semaphore(window)
+        self._retries = retries
+        self._backoff = backoff
+        self._pending: List[asyncio.Task] = []
+        self._batch_started: Optional[float] = None
+
+    async def submit(self, subject: str, payload: bytes, headers: Dict[str, str], on_ack: Optional[Callable[[PubAck], None]] = None) -> "asyncio.Task[int]":
+        """
+        Starts the publish and returns its task, which `flush` waits for as well.
+        """
+        # Waiting for a free slot here is what pushes back on producers when the window is full
+        await self._window.acquire()
+        if self._batch_started is None:
+            self._batch_started = time.monotonic()
+        task = asyncio.create_task(self._send(subject, payload, headers, on_ack))
+        self._pending.append(task)
+        return task
+
+    async def _send(self, subject: str, payload: bytes, headers: Dict[str, str], on_ack: Optional[Callable[[PubAck], None]]) -> int:
+        """
+        Returns the number of attempts it took, or -1 when every attempt failed.
+        """
+        try:
+            attempt = 0
+            while True:
+                try:
+                    ack = await self._js.publish(subject, payload, headers=headers)
+                    logger.info(f"Published data for {subject} [{ack}]")
+                    if on_ack is not None:
+                        on_ack(ack)
+                    return attempt + 1
+                except Exception as e:
+                    if attempt >= self._retries:
+                        logger.error(f"Failed to publish data to {subject} after {attempt + 1} attempts: {e}")
+                        return -1
+                    delay = self._backoff * (2 ** attempt)
+                    attempt += 1
+                    logger.warning(f"Publish to {subject} failed: {e}. Retrying in {delay:.2f} seconds [{attempt}/{self._retries}]")
+                    await asyncio.sleep(delay)
+        finally:
+            self._window.release()
+
+    async def flush(self) -> BatchResult:
+        pending, self._pending = self._pending, []
+        started, self._batch_started = self._batch_started, None
+        attempts = await asyncio.gather(*pending)
+        result = BatchResult(
+                published=sum(1 for attempt in attempts if attempt > 0),
+                failed=sum(1 for attempt in attempts if attempt < 0),
+                retried=sum(1 for attempt in attempts if attempt > 1),
+                duration=time.monotonic() - started if started is not None else 0.0
+                )
+        if pending:
+            logger.info(f"Publish batch finished: {result}")
+        return result
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from typing import Dict, Optional
 import nats
 from nats.aio.client import Client
 from nats.js import JetStreamContext
@@ -8,21 +10,39 @@ import pandas as pd
 from crontask import Crontask
 import fetcher
 from processor import process_crypto_pair
+from publish_pipeline import BatchResult, PublishPipeline
+from wire_format import encode_message
 
 logger = logging.getLogger(__name__)
 
+PUBLISH_MODES = ("window", "delta")
+PUBLISH_MODE_HEADER = "Auguris-Publish-Mode"
+
 class Publisher:
     def __init__(self, cron: Crontask):
         self._nats_url = os.getenv("NATS_URL", "nats://localhost:4222")
         self._nats_subject = os.getenv("NATS_SUBJECT", "market-data.raw")
         self._pairs = os.getenv("PAIRS", "BTC/USD").split(",")
+        self._concurrency = int(os.getenv("FETCH_CONCURRENCY", 10))
+        self._wire_format = os.getenv("WIRE_FORMAT", "columnar")
+        self._publish_mode = os.getenv("PUBLISH_MODE", "window")
+        if self._publish_mode not in PUBLISH_MODES:
+            raise ValueError(f"Unknown PUBLISH_MODE {self._publish_mode}. Expected one of {PUBLISH_MODES}")
+        self._last_published: Dict[str, pd.Timestamp] = {}
         self._nc: Client
         self._js: JetStreamContext
+        self._pipeline: PublishPipeline
         self._cron = cron
 
     async def _connect_nats(self):
         self._nc = await nats.connect(servers=[self._nats_url])
         self._js = self._nc.jetstream()
+        self._pipeline = PublishPipeline(
+                self._js,
+                window=int(os.getenv("PUBLISH_WINDOW", 64)),
+                retries=int(os.getenv("PUBLISH_RETRIES", 3)),
+                backoff=float(os.getenv("PUBLISH_BACKOFF_SECONDS", 0.5))
+                )
         logger.info("Connected to NATS")
 
     async def _get_dataframe(self, pair: str) -> pd.DataFrame:
@@ -31,25 +51,65 @@ class Publisher:
         ohlc_df = process_crypto_pair(raw_data)
         return ohlc_df
     
-    async def _process_request(self):
-        for pair in self._pairs:
+    async def _process_pair(self, pair: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
             logger.info(f"Processing pair {pair}")
-            df = await self._get_dataframe(pair)
+            try:
+                df = await self._get_dataframe(pair)
+            except Exception as e:
+                logger.error(f"Failed to fetch data for {pair}: {e}")
+                return
             logger.info(f"Got the data for {pair}")
-            await self._publish(pair, df)
-            logger.info(f"Publishing pair {pair}")
+        await self._publish(pair, df)
+
+    async def _process_request(self) -> BatchResult:
+        semaphore = asyncio.Semaphore(self._concurrency)
+        await asyncio.gather(*(self._process_pair(pair, semaphore) for pair in self._pairs))
+        return await self._pipeline.flush()
 
-    async def _publish(self, pair: str, df: pd.DataFrame):
+    async def _publish(self, pair: str, df: pd.DataFrame) -> Optional["asyncio.Task[int]"]:
         subject = f"{self._nats_subject}.{pair.replace('/', '-')}"
+        if df.empty:
+            logger.warning(f"No candles to publish for {subject}")
+            return
+
+        last_candle = df["Date"].iloc[-1]
+        previous_candle = self._last_published.get(pair)
+        if previous_candle is not None and last_candle <= previous_candle:
+            logger.info(f"Window for {subject} has not advanced past {last_candle}. Skipping")
+            return
+
+        if self._publish_mode == "delta" and previous_candle is not None:
+            # The previous last candle was still open when it was sent, so it goes out again with its final values
+            df = df[df["Date"] >= previous_candle]
+
         logger.info(f"PUBLISHING: {subject}")
-        data = str(df.to_json(orient="records"))
         try:
-            logger.warning(f"jetstream: {self._js}")
-            ack = await self._js.publish(subject, data.encode("utf-8"))
-            logger.info(f"Published data for {subject} [{ack}]")
+            data, headers = encode_message(df, self._wire_format)
+        except Exception as e:
+            logger.error(f"Failed to encode data for {subject}: {e}")
+            return
+        # JetStream drops duplicates of the same pair and last candle within the stream's duplicate window
+        headers["Nats-Msg-Id"] = f"{subject}:{int(last_candle.timestamp())}"
+        headers[PUBLISH_MODE_HEADER] = self._publish_mode
+
+        def on_ack(_):
+            self._last_published[pair] = max(last_candle, self._last_published.get(pair, last_candle))
+
+        return await self._pipeline.submit(subject, data, headers, on_ack)
+
+    async def publish_closed_candle(self, pair: str, row: list):
+        try:
+            raw_data = await fetcher.add_closed_candle(pair, row)
         except Exception as e:
-            logger.error(f"Failed to publish data to {subject}: {e}")
+            logger.error(f"Failed to update the window for {pair}: {e}")
+            return
+        # Only this candle is waited for, the publishes of a cron run are left to its own flush
+        sent = await self._publish(pair, process_crypto_pair(raw_data))
+        if sent is not None:
+            await sent
 
-    async def start(self):
+    async def start(self, schedule: bool = True):
         await self._connect_nats()
-        self._cron.subscribe(self._process_request)
+        if schedule:
+            self._cron.subscribe(self._process_request)
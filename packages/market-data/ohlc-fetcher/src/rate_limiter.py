@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Async token bucket. Tokens refill continuously at `rate` per second up to `capacity`,
+    so bursts of `capacity` calls go through immediately and the sustained rate stays at `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"Invalid token bucket settings rate={rate} capacity={capacity}")
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self._rate
+                logger.debug(f"Rate limit reached, waiting {wait:.2f} seconds")
+                await asyncio.sleep(wait)
+
+    def drain(self) -> None:
+        """
+        Empties the bucket, used when the server signals we are being throttled.
+        """
+        self._refill()
+        self._tokens = 0
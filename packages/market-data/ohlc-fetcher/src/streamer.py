@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import websockets
+
+from publisher import Publisher
+
+logger = logging.getLogger(__name__)
+
+
+def _to_epoch(value: str) -> int:
+    return int(np.datetime64(value.rstrip("Z"), "s").astype(np.int64))
+
+
+class KrakenStreamer:
+    """
+    Streams live candles for every configured pair over a single Kraken WebSocket (v2 ohlc channel)
+    and publishes each pair's window as soon as one of its candles closes.
+    """
+
+    def __init__(self, publisher: Publisher) -> None:
+        self._publisher = publisher
+        self._ws_url = os.getenv("KRAKEN_WS_URL", "wss://ws.kraken.com/v2")
+        self._pairs = os.getenv("PAIRS", "BTC/USD").split(",")
+        self._interval = int(os.getenv("OHLC_INTERVAL", 15))
+        self._settle_delay = float(os.getenv("CRON_SETTLE_SECONDS", 2))
+        self._max_backoff = float(os.getenv("KRAKEN_WS_MAX_BACKOFF_SECONDS", 60))
+        self._open_candles: Dict[str, Tuple[int, list]] = {}
+        self._closed_until: Dict[str, int] = {}
+        self._pair_locks: Dict[str, asyncio.Lock] = {}
+        self._running = False
+        self._backoff = 1.0
+
+    def _subscription(self) -> Dict[str, Any]:
+        return {
+            "method": "subscribe",
+            "params": {"channel": "ohlc", "symbol": self._pairs, "interval": self._interval, "snapshot": True}
+        }
+
+    def handle_message(self, message: Dict[str, Any]) -> List[Tuple[str, list]]:
+        """
+        Tracks the open candle of every pair and returns the (pair, row) candles that closed,
+        meaning a candle with a later interval_begin showed up for the same pair.
+        """
+        if message.get("channel") != "ohlc" or message.get("type") not in ("snapshot", "update"):
+            return []
+
+        closed = []
+        candles = sorted(message.get("data", []), key=lambda candle: candle["interval_begin"])
+        for candle in candles:
+            pair = candle["symbol"]
+            begin = _to_epoch(candle["interval_begin"])
+            if begin <= self._closed_until.get(pair, -1):
+                continue
+
+            row = [
+                begin, candle["open"], candle["high"], candle["low"], candle["close"],
+                candle["vwap"], candle["volume"], candle["trades"]
+            ]
+            current = self._open_candles.get(pair)
+            if current is not None and begin > current[0]:
+                closed.append((pair, current[1]))
+                self._closed_until[pair] = current[0]
+            self._open_candles[pair] = (begin, row)
+        return closed
+
+    def expire_candles(self, now: float) -> List[Tuple[str, list]]:
+        """
+        Closes candles whose interval is over even though no newer candle arrived, which
+        happens on pairs without trades right after the boundary.
+        """
+        closed = []
+        for pair, (begin, row) in list(self._open_candles.items()):
+            if begin + self._interval * 60 + self._settle_delay <= now:
+                closed.append((pair, row))
+                self._closed_until[pair] = begin
+                del self._open_candles[pair]
+        return closed
+
+    async def _publish(self, closed: List[Tuple[str, list]]):
+        rows_by_pair: Dict[str, List[list]] = {}
+        for pair, row in closed:
+            rows_by_pair.setdefault(pair, []).append(row)
+        await asyncio.gather(*(self._publish_pair(pair, rows) for pair, rows in rows_by_pair.items()))
+
+    async def _publish_pair(self, pair: str, rows: List[list]):
+        # Candles of a pair share its window, so they go one at a time and oldest first, also
+        # across the stream and the expiry loop. A cold window is then refreshed only once.
+        lock = self._pair_locks.setdefault(pair, asyncio.Lock())
+        async with lock:
+            for row in sorted(rows, key=lambda row: row[0]):
+                logger.info(f"Candle {row[0]} closed for {pair}")
+                await self._publisher.publish_closed_candle(pair, row)
+
+    async def _expire_loop(self):
+        interval_seconds = self._interval * 60
+        while self._running:
+            now = time.time()
+            next_boundary = (now // interval_seconds + 1) * interval_seconds
+            await asyncio.sleep(next_boundary + self._settle_delay - now)
+            await self._publish(self.expire_candles(time.time()))
+
+    async def _stream(self):
+        async with websockets.connect(self._ws_url, ping_interval=20) as ws:
+            await ws.send(json.dumps(self._subscription()))
+            logger.info(f"Subscribed to {self._ws_url} ohlc-{self._interval} for {len(self._pairs)} pairs")
+            self._backoff = 1.0
+            async for raw in ws:
+                message = json.loads(raw)
+                if message.get("method") == "subscribe" and not message.get("success", True):
+                    logger.error(f"Subscription rejected: {message.get('error')}")
+                closed = self.handle_message(message)
+                if closed:
+                    await self._publish(closed)
+
+    async def start(self):
+        self._running = True
+        expire_task = asyncio.create_task(self._expire_loop())
+        try:
+            while self._running:
+                try:
+                    await self._stream()
+                    logger.warning("WebSocket closed by the server. Reconnecting")
+                except (websockets.ConnectionClosed, OSError, asyncio.TimeoutError) as e:
+                    logger.warning(f"WebSocket connection lost: {e}. Reconnecting in {self._backoff:.0f} seconds")
+                    await asyncio.sleep(self._backoff)
+                    self._backoff = min(self._backoff * 2, self._max_backoff)
+        except asyncio.CancelledError:
+            logger.info("Streamer cancelled. Exiting stream loop.")
+        finally:
+            self._running = False
+            expire_task.cancel()
+            logger.info("Streamer finished cleanup")
+
+    def stop(self):
+        self._running = False
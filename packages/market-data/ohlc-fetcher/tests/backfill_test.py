@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from src.backfill import Backfill, CandleAggregator, Checkpoint, FileSink
+
+NANOSECONDS = 1_000_000_000
+START = 1700000100
+
+trade_pages = [
+    ([["100.0", "1.0", START + 10.5, "b", "l", "", 1],
+      ["110.0", "1.0", START + 300.0, "s", "l", "", 2],
+      ["90.0", "2.0", START + 899.0, "b", "m", "", 3]], (START + 899) * NANOSECONDS),
+    ([["95.0", "1.0", START + 900.0, "b", "l", "", 4],
+      ["97.0", "3.0", START + 1500.0, "b", "l", "", 5],
+      ["99.0", "1.0", START + 1800.0, "s", "l", "", 6]], (START + 1800) * NANOSECONDS),
+    ([["98.0", "1.0", START + 2700.0, "b", "l", "", 7]], (START + 2700) * NANOSECONDS),
+]
+
+
+class TestCandleAggregator(unittest.TestCase):
+    def test_candles_span_pages(self):
+        aggregator = CandleAggregator(900)
+
+        first = aggregator.add_trades(np.array([100.0, 110.0]), np.array([1.0, 1.0]), np.array([START + 10.0, START + 300.0]))
+        second = aggregator.add_trades(np.array([90.0, 95.0]), np.array([2.0, 1.0]), np.array([START + 899.0, START + 900.0]))
+
+        assert len(first) == 0
+        assert second.tolist() == [[START, 100.0, 110.0, 90.0, 90.0, 97.5, 4.0, 3.0]]
+        assert aggregator.open_candle_start == START + 900
+        assert aggregator.flush().tolist() == [[START + 900, 95.0, 95.0, 95.0, 95.0, 95.0, 1.0, 1.0]]
+
+
+class TestBackfill(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.tmp_dir.name, "checkpoint.json")
+        self.sink = FileSink(self.tmp_dir.name, 15)
+
+    async def asyncTearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def _run(self, pages, end):
+        backfill = Backfill(self.sink, Checkpoint(self.checkpoint_path), 15, "trades", chunk_size=1)
+        with patch("src.backfill.fetcher.get_trades", side_effect=pages) as mock_get_trades:
+            await backfill.run_pair("FOO/USD", START, end)
+        return mock_get_trades
+
+    async def test_trades_backfill_writes_candles_within_range(self):
+        await self._run(trade_pages + [([], None)], START + 2700)
+
+        df = pd.read_csv(self.sink.path("FOO/USD"), parse_dates=["Date"])
+        assert df["Date"].tolist() == [pd.Timestamp(START, unit="s"), pd.Timestamp(START + 900, unit="s"), pd.Timestamp(START + 1800, unit="s")]
+        assert df["Close"].tolist() == [90.0, 97.0, 99.0]
+        assert df["Volume"].tolist() == [4.0, 4.0, 1.0]
+        assert Checkpoint(self.checkpoint_path).get("trades:FOO/USD:15")["done"]
+
+    async def test_trades_backfill_resumes_from_checkpoint(self):
+        with self.assertRaises(RuntimeError):
+            await self._run([trade_pages[0], trade_pages[1], RuntimeError("connection lost")], START + 2700)
+
+        saved = Checkpoint(self.checkpoint_path).get("trades:FOO/USD:15")
+        assert saved == {"since": (START + 1800) * NANOSECONDS, "done": False}
+
+        resumed_page = ([["99.0", "1.0", START + 1800.0, "s", "l", "", 6]], (START + 1800) * NANOSECONDS + 1)
+        mock_get_trades = await self._run([resumed_page, trade_pages[2], ([], None)], START + 2700)
+
+        mock_get_trades.assert_any_call("FOO/USD", (START + 1800) * NANOSECONDS)
+        df = pd.read_csv(self.sink.path("FOO/USD"))
+        assert len(df) == 3
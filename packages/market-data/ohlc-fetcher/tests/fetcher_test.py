@@ -1,10 +1,16 @@
 import asyncio
+import json
 from datetime import datetime, timedelta
 import unittest
-from unittest.mock import AsyncMock, Mock, patch
+from unittest.mock import ANY, AsyncMock, Mock, patch
 
+import pandas as pd
+
+from src import fetcher
 from src.crontask import Crontask
-from src.publisher import Publisher
+from src.processor import process_crypto_pair
+from src.publisher import PUBLISH_MODE_HEADER, Publisher
+from src.wire_format import COLUMNAR_CONTENT_TYPE, CONTENT_TYPE_HEADER, decode_frame, encode_message
 
 
 mock_environ = {
@@ -13,6 +19,7 @@ mock_environ = {
     "PAIRS": "FOO/USD",
     "NATS_URL": "nats://nats:4222",
     "CRON_SECONDS": "2",
+    "CRON_SETTLE_SECONDS": "0",
     "NATS_SUBJECT": "market-data.raw"
 }
 
@@ -63,6 +70,7 @@ class TestFetcher(unittest.IsolatedAsyncioTestCase):
         Sets the response for any expected HTTP response
         """
         mock_response = AsyncMock()
+        mock_response.status_code = 200
         mock_response.json = Mock(return_value=api_body_response)
         self.mock_httpx_get.return_value = mock_response
 
@@ -90,8 +98,170 @@ class TestFetcher(unittest.IsolatedAsyncioTestCase):
         )
         self.mock_nats_connect.assert_called_once_with(servers=[mock_environ["NATS_URL"]])
         expected_subject = f"{mock_environ['NATS_SUBJECT']}.FOO-USD"
-        expected_pub_data = b'[{"Date":1699978400000,"Open":50000,"High":505000,"Low":49500,"Close":50200,"Volume":1000}]'
-        self.mock_js.publish.assert_called_with(expected_subject, expected_pub_data)
+        expected_records = [{"Date":1700000000000,"Open":50000.0,"High":505000.0,"Low":49500.0,"Close":50200.0,"Volume":1000.0}]
+        self.mock_js.publish.assert_called_with(expected_subject, ANY, headers={
+            CONTENT_TYPE_HEADER: COLUMNAR_CONTENT_TYPE,
+            "Nats-Msg-Id": f"{expected_subject}:1700000000",
+            PUBLISH_MODE_HEADER: "window"
+        })
+        published = self.mock_js.publish.call_args.args[1]
+        assert json.loads(encode_message(decode_frame(published), "json")[0]) == expected_records
+
+    async def test_get_ohlc_retries_on_server_error(self):
+        failed_response = AsyncMock()
+        failed_response.status_code = 503
+        ok_response = AsyncMock()
+        ok_response.status_code = 200
+        ok_response.json = Mock(return_value=mock_default_kraken_response)
+        self.mock_httpx_get.side_effect = [failed_response, ok_response]
+
+        with patch.dict("os.environ", {"KRAKEN_BACKOFF_SECONDS": "0"}):
+            result = await fetcher.get_ohlc("FOO/USD")
+
+        assert self.mock_httpx_get.call_count == 2
+        assert result == mock_default_kraken_response["result"]["FOO/USD"]
+        await fetcher.close()
+
+    async def test_failed_pair_does_not_stop_the_others(self):
+        cron = Crontask()
+        cron.clear_subscribers()
+        with patch.dict("os.environ", {"PAIRS": "BAD/USD,FOO/USD"}):
+            nats_publisher = Publisher(cron)
+        await nats_publisher.start()
+
+        async def get_ohlc(pair):
+            if pair == "BAD/USD":
+                raise KeyError(pair)
+            return [list(row) for row in mock_default_kraken_response["result"][pair]]
+
+        with patch("src.publisher.fetcher.get_ohlc", side_effect=get_ohlc):
+            await nats_publisher._process_request()
+
+        self.mock_js.publish.assert_called_once()
+        assert self.mock_js.publish.call_args.args[0] == f"{mock_environ['NATS_SUBJECT']}.FOO-USD"
+        cron.clear_subscribers()
+
+    async def test_get_ohlc_requests_only_new_candles_after_cursor(self):
+        now = int(self.fixed_datetime.timestamp())
+        first_candle = now - 1800
+        full_response = {
+            "result": {
+                "BAR/USD": [
+                    [first_candle, "1", "2", "0.5", "1.5", "1.2", "10", 5],
+                    [first_candle + 900, "1.5", "2", "1", "1.8", "1.6", "11", 6]
+                ],
+                "last": first_candle + 900
+            }
+        }
+        incremental_response = {
+            "result": {
+                "BAR/USD": [
+                    [first_candle + 900, "1.5", "2.5", "1", "2.2", "1.9", "12", 7],
+                    [first_candle + 1800, "2.2", "2.4", "2", "2.1", "2.2", "3", 2]
+                ],
+                "last": first_candle + 1800
+            }
+        }
+        self._set_httpx_get_response(full_response)
+        await fetcher.get_ohlc("BAR/USD")
+        self._set_httpx_get_response(incremental_response)
+        rows = await fetcher.get_ohlc("BAR/USD")
+
+        self.mock_httpx_get.assert_called_with(
+            f"https://api.kraken.com/0/public/OHLC?pair=BAR/USD&interval=15&since={first_candle + 900}"
+        )
+        assert [row[0] for row in rows] == [first_candle, first_candle + 900, first_candle + 1800]
+        assert rows[1][4] == "2.2"
+
+    async def test_older_candles_do_not_drop_newer_buffered_ones(self):
+        now = int(self.fixed_datetime.timestamp())
+        first_candle = now - 2700
+        self._set_httpx_get_response({
+            "result": {
+                "OLD/USD": [[first_candle + 900 * i, "1", "2", "0.5", str(1.5 + i), "1.2", "10", 5] for i in range(3)],
+                "last": first_candle + 1800
+            }
+        })
+        await fetcher.get_ohlc("OLD/USD")
+
+        rows = await fetcher.add_closed_candle("OLD/USD", [first_candle + 900, "1", "2", "0.5", "9.9", "1.2", "10", 5])
+
+        assert [row[0] for row in rows] == [first_candle, first_candle + 900, first_candle + 1800]
+        assert [row[4] for row in rows] == ["1.5", "2.5", "3.5"]
+        self.mock_httpx_get.assert_awaited_once()
+
+    async def test_get_ohlc_runs_full_refresh_after_gap(self):
+        now = int(self.fixed_datetime.timestamp())
+        self._set_httpx_get_response({
+            "result": {"GAP/USD": [[now - 900, "1", "1", "1", "1", "1", "1", 1]], "last": now - 900}
+        })
+        await fetcher.get_ohlc("GAP/USD")
+        self._set_httpx_get_response({
+            "result": {"GAP/USD": [[now + 1800, "1", "1", "1", "1", "1", "1", 1]], "last": now + 1800}
+        })
+        await fetcher.get_ohlc("GAP/USD")
+
+        since = int((self.fixed_datetime - timedelta(minutes=15 * 100)).timestamp())
+        self.mock_httpx_get.assert_called_with(
+            f"https://api.kraken.com/0/public/OHLC?pair=GAP/USD&interval=15&since={since}"
+        )
+
+    def _get_window_frame(self, first_candle: int, candles: int):
+        return process_crypto_pair([
+            [first_candle + 900 * i, "1", "2", "0.5", str(1.5 + i), "1.2", "10", 5] for i in range(candles)
+        ])
+
+    async def test_publish_skips_windows_that_did_not_advance(self):
+        nats_publisher = Publisher(Crontask())
+        await nats_publisher._connect_nats()
+
+        await nats_publisher._publish("FOO/USD", self._get_window_frame(1700000100, 3))
+        await nats_publisher._pipeline.flush()
+        await nats_publisher._publish("FOO/USD", self._get_window_frame(1700000100, 3))
+        await nats_publisher._publish("FOO/USD", self._get_window_frame(1700001000, 3))
+        await nats_publisher._pipeline.flush()
+
+        assert self.mock_js.publish.call_count == 2
+        msg_ids = [call.kwargs["headers"]["Nats-Msg-Id"] for call in self.mock_js.publish.call_args_list]
+        assert msg_ids == ["market-data.raw.FOO-USD:1700001900", "market-data.raw.FOO-USD:1700002800"]
+
+    async def test_delta_mode_publishes_only_new_candles(self):
+        with patch.dict("os.environ", {"PUBLISH_MODE": "delta"}):
+            nats_publisher = Publisher(Crontask())
+        await nats_publisher._connect_nats()
+
+        await nats_publisher._publish("FOO/USD", self._get_window_frame(1700000100, 3))
+        await nats_publisher._pipeline.flush()
+        await nats_publisher._publish("FOO/USD", self._get_window_frame(1700001000, 3))
+        await nats_publisher._pipeline.flush()
+
+        first, second = [decode_frame(call.args[1]) for call in self.mock_js.publish.call_args_list]
+        assert len(first) == 3
+        assert second["Date"].tolist() == [pd.Timestamp(1700001900, unit="s"), pd.Timestamp(1700002800, unit="s")]
+        assert self.mock_js.publish.call_args.kwargs["headers"][PUBLISH_MODE_HEADER] == "delta"
+
+    async def test_closed_candle_waits_only_for_its_own_publish(self):
+        nats_publisher = Publisher(Crontask())
+        await nats_publisher._connect_nats()
+        released = asyncio.Event()
+
+        async def publish(subject, payload, headers):
+            if subject.endswith("SLOW-USD"):
+                await released.wait()
+            return subject
+        self.mock_js.publish.side_effect = publish
+        await nats_publisher._publish("SLOW/USD", self._get_window_frame(1700000100, 3))
+
+        with patch("src.publisher.fetcher.add_closed_candle", AsyncMock(return_value=[
+            [1700000100 + 900 * i, "1", "2", "0.5", str(1.5 + i), "1.2", "10", 5] for i in range(3)
+        ])):
+            await asyncio.wait_for(nats_publisher.publish_closed_candle("FOO/USD", []), 1)
+
+        assert "FOO/USD" in nats_publisher._last_published
+        assert "SLOW/USD" not in nats_publisher._last_published
+        released.set()
+        result = await nats_publisher._pipeline.flush()
+        assert result.published == 2
 
     async def test_crontask_basic_functionality(self):
         cron1 = Crontask()
@@ -122,4 +292,37 @@ class TestFetcher(unittest.IsolatedAsyncioTestCase):
             pass
 
         mock_listener.assert_called()
+        cron1.stop()
+        cron1.clear_subscribers()
+
+    async def test_crontask_skips_overlapping_runs(self):
+        cron = Crontask()
+        cron.clear_subscribers()
+        release = asyncio.Event()
+        calls = []
+
+        async def slow_listener():
+            calls.append(1)
+            await release.wait()
+
+        cron.subscribe(slow_listener)
+        cron._dispatch_tasks()
+        await asyncio.sleep(0)
+        skipped = cron.skipped_ticks
+        cron._dispatch_tasks()
+        await asyncio.sleep(0)
+
+        assert len(calls) == 1
+        assert cron.skipped_ticks == skipped + 1
+        release.set()
+        await asyncio.sleep(0)
+        cron.clear_subscribers()
+
+    def test_crontask_ticks_are_aligned_to_interval(self):
+        cron = Crontask()
+        cron.set_interval(900)
+
+        assert cron._next_boundary(1700000000.5) == 1700000100
+        assert cron._next_boundary(1700000100) == 1700001000
+        cron.set_interval(2)
     
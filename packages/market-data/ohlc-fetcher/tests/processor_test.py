@@ -0,0 +1,28 @@
+import numpy as np
+
+from src.processor import process_crypto_pair
+
+
+def test_process_crypto_pair_builds_typed_frame():
+    raw_data = [
+        [1700000000, "50000.1", "50500.0", "49500.5", "50200.0", "50100.0", "1.5", 10],
+        [1700000900, "50200.0", "50300.0", "50100.0", "50250.0", "50200.0", "2.25", 12]
+    ]
+
+    df = process_crypto_pair(raw_data)
+
+    assert list(df.columns) == ["Date", "Open", "High", "Low", "Close", "Volume"]
+    assert df["Date"].dtype == np.dtype("datetime64[ns]")
+    assert all(df[column].dtype == np.float64 for column in ["Open", "High", "Low", "Close", "Volume"])
+    assert df["Date"].iloc[1] == np.datetime64(1700000900, "s")
+    assert df["Open"].iloc[0] == 50000.1
+    assert df["Volume"].tolist() == [1.5, 2.25]
+    # Raw rows are left untouched so they can stay in the fetcher's buffer
+    assert raw_data[0][0] == 1700000000
+
+
+def test_process_crypto_pair_handles_empty_response():
+    df = process_crypto_pair([])
+
+    assert df.empty
+    assert list(df.columns) == ["Date", "Open", "High", "Low", "Close", "Volume"]
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from src.publish_pipeline import PublishPipeline
+
+
+class TestPublishPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_keeps_publishes_in_flight_up_to_window(self):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def publish(subject, payload, headers):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return subject
+
+        js = Mock()
+        js.publish = AsyncMock(side_effect=publish)
+        pipeline = PublishPipeline(js, window=4)
+
+        for i in range(10):
+            await pipeline.submit(f"subject.{i}", b"data", {})
+        result = await pipeline.flush()
+
+        assert max_in_flight == 4
+        assert result.published == 10
+        assert result.failed == 0
+
+    async def test_retries_only_failed_publishes(self):
+        js = Mock()
+        js.publish = AsyncMock(side_effect=[Exception("timeout"), "ack-1", "ack-2"])
+        on_ack = Mock()
+        pipeline = PublishPipeline(js, window=1, retries=2, backoff=0)
+
+        await pipeline.submit("subject.a", b"a", {}, on_ack)
+        await pipeline.submit("subject.b", b"b", {}, on_ack)
+        result = await pipeline.flush()
+
+        assert js.publish.call_count == 3
+        assert on_ack.call_count == 2
+        assert (result.published, result.failed, result.retried) == (2, 0, 1)
+
+    async def test_reports_publishes_that_keep_failing(self):
+        js = Mock()
+        js.publish = AsyncMock(side_effect=Exception("no responders"))
+        pipeline = PublishPipeline(js, window=2, retries=1, backoff=0)
+
+        await pipeline.submit("subject.a", b"a", {})
+        result = await pipeline.flush()
+
+        assert js.publish.call_count == 2
+        # A publish that never went through isn't a retry that worked
+        assert (result.published, result.failed, result.retried) == (0, 1, 0)
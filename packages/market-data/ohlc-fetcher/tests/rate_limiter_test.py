@@ -0,0 +1,24 @@
+import time
+import unittest
+
+from src.rate_limiter import TokenBucket
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_is_served_immediately(self):
+        bucket = TokenBucket(rate=1, capacity=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        assert time.monotonic() - started < 0.1
+
+    async def test_waits_for_refill_once_empty(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        await bucket.acquire()
+        started = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - started >= 0.04
+
+    def test_rejects_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1)
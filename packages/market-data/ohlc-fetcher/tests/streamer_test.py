@@ -0,0 +1,95 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import websockets
+
+from src.streamer import KrakenStreamer
+
+
+def ohlc_message(begin: str, close: float, message_type: str = "update", symbol: str = "FOO/USD"):
+    return {
+        "channel": "ohlc",
+        "type": message_type,
+        "data": [{
+            "symbol": symbol, "open": 100.0, "high": 110.0, "low": 90.0, "close": close,
+            "vwap": 101.0, "trades": 12, "volume": 3.5, "interval_begin": begin, "interval": 15
+        }]
+    }
+
+
+class TestKrakenStreamer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.patcher_os_environ = patch.dict("os.environ", {"PAIRS": "FOO/USD", "CRON_SETTLE_SECONDS": "0"})
+        self.patcher_os_environ.start()
+        self.publisher = AsyncMock()
+        self.streamer = KrakenStreamer(self.publisher)
+
+    async def asyncTearDown(self):
+        self.patcher_os_environ.stop()
+
+    def test_candle_closes_when_next_interval_starts(self):
+        assert self.streamer.handle_message(ohlc_message("2023-11-14T22:00:00.000000000Z", 101.0, "snapshot")) == []
+        assert self.streamer.handle_message(ohlc_message("2023-11-14T22:00:00.000000000Z", 102.0)) == []
+
+        closed = self.streamer.handle_message(ohlc_message("2023-11-14T22:15:00.000000000Z", 103.0))
+
+        assert closed == [("FOO/USD", [1699999200, 100.0, 110.0, 90.0, 102.0, 101.0, 3.5, 12])]
+
+    def test_late_updates_for_closed_candles_are_ignored(self):
+        self.streamer.handle_message(ohlc_message("2023-11-14T22:00:00Z", 101.0))
+        self.streamer.handle_message(ohlc_message("2023-11-14T22:15:00Z", 102.0))
+
+        assert self.streamer.handle_message(ohlc_message("2023-11-14T22:00:00Z", 99.0)) == []
+
+    def test_idle_candles_expire_after_interval(self):
+        self.streamer.handle_message(ohlc_message("2023-11-14T22:00:00Z", 101.0))
+
+        assert self.streamer.expire_candles(1699999200 + 899) == []
+        closed = self.streamer.expire_candles(1699999200 + 900)
+
+        assert [pair for pair, _ in closed] == ["FOO/USD"]
+
+    async def test_candles_of_a_pair_are_published_one_at_a_time_in_order(self):
+        published = []
+        running = set()
+
+        async def publish_closed_candle(pair, row):
+            assert pair not in running
+            running.add(pair)
+            await asyncio.sleep(0.01)
+            published.append((pair, row[0]))
+            running.discard(pair)
+
+        self.publisher.publish_closed_candle.side_effect = publish_closed_candle
+        await asyncio.gather(
+            self.streamer._publish([("FOO/USD", [1800]), ("BAR/USD", [900]), ("FOO/USD", [900])]),
+            self.streamer._publish([("FOO/USD", [2700])])
+        )
+
+        assert [begin for pair, begin in published if pair == "FOO/USD"] == [900, 1800, 2700]
+        assert ("BAR/USD", 900) in published
+
+    async def test_streams_closed_candles_to_publisher(self):
+        subscriptions = []
+
+        async def kraken(ws):
+            subscriptions.append(json.loads(await ws.recv()))
+            await ws.send(json.dumps(ohlc_message("2023-11-14T22:00:00Z", 101.0, "snapshot")))
+            await ws.send(json.dumps(ohlc_message("2023-11-14T22:15:00Z", 102.0)))
+            await asyncio.sleep(1)
+
+        async with websockets.serve(kraken, "localhost", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            with patch.dict("os.environ", {"KRAKEN_WS_URL": f"ws://localhost:{port}"}):
+                streamer = KrakenStreamer(self.publisher)
+            task = asyncio.create_task(streamer.start())
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        assert subscriptions[0]["params"] == {"channel": "ohlc", "symbol": ["FOO/USD"], "interval": 15, "snapshot": True}
+        self.publisher.publish_closed_candle.assert_awaited_once_with(
+            "FOO/USD", [1699999200, 100.0, 110.0, 90.0, 101.0, 101.0, 3.5, 12]
+        )
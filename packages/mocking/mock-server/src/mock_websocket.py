@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+import os
+import random
+from typing import Any, Dict, List
+
+from fastapi import WebSocket
+
+
+class MockedWebSocketMessages:
+    def __init__(self, messages: List[Dict[str, Any]], delay: float = 0.0):
+        self.messages = messages
+        self.delay = delay
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+
+
+async def replay_messages(websocket: WebSocket, mocked: MockedWebSocketMessages):
+    for message in mocked.messages:
+        await websocket.send_json(message)
+        await asyncio.sleep(mocked.delay)
+
+
+async def stream_synthetic_candles(websocket: WebSocket, symbols: List[str], interval: int):
+    """
+    Emulates Kraken's v2 ohlc channel with a random walk per symbol. Candles advance every
+    MOCK_WS_CANDLE_SECONDS instead of every `interval` minutes so closes show up quickly.
+    """
+    candle_seconds = float(os.getenv("MOCK_WS_CANDLE_SECONDS", 5))
+    tick_seconds = float(os.getenv("MOCK_WS_TICK_SECONDS", 1))
+    interval_seconds = interval * 60
+    begin = (datetime.now(tz=timezone.utc).timestamp() // interval_seconds) * interval_seconds
+    prices = {symbol: 100.0 for symbol in symbols}
+    candles: Dict[str, Dict[str, Any]] = {}
+    started = asyncio.get_running_loop().time()
+    message_type = "snapshot"
+
+    while True:
+        elapsed_candles = int((asyncio.get_running_loop().time() - started) // candle_seconds)
+        interval_begin = _isoformat(begin + elapsed_candles * interval_seconds)
+        data = []
+        for symbol in symbols:
+            price = prices[symbol] = max(prices[symbol] * (1 + random.gauss(0, 0.002)), 0.01)
+            volume = random.uniform(0.01, 1)
+            candle = candles.get(symbol)
+            if candle is None or candle["interval_begin"] != interval_begin:
+                candle = {"symbol": symbol, "open": price, "high": price, "low": price, "close": price,
+                          "vwap": price, "trades": 0, "volume": 0.0, "interval_begin": interval_begin, "interval": interval}
+                candles[symbol] = candle
+            candle["high"] = max(candle["high"], price)
+            candle["low"] = min(candle["low"], price)
+            candle["close"] = price
+            candle["vwap"] = (candle["vwap"] * candle["volume"] + price * volume) / (candle["volume"] + volume)
+            candle["volume"] += volume
+            candle["trades"] += 1
+            data.append(dict(candle, timestamp=_isoformat(datetime.now(tz=timezone.utc).timestamp())))
+
+        await websocket.send_json({"channel": "ohlc", "type": message_type, "data": data})
+        message_type = "update"
+        await asyncio.sleep(tick_seconds)
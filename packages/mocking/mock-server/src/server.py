@@ -1,13 +1,17 @@
-from fastapi import FastAPI, Request, Response, status
+import asyncio
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect, status
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import json
 
 from mock_middleware import MockMiddleware, MockedResponse
+from mock_websocket import MockedWebSocketMessages, replay_messages, stream_synthetic_candles
 
 app = FastAPI()
 # Store mocks in a dict keyed by JSON-serialized filter objects
 mocked_responses: Dict[str, MockedResponse] = {}
+# Messages replayed to WebSocket subscribers, synthetic candles are streamed when empty
+mocked_ws: Dict[str, MockedWebSocketMessages] = {}
 
 class MockConfiguration(BaseModel):
     filters: Dict[str, Any]
@@ -68,6 +72,59 @@ async def clear_mocks():
         "mocks": []
     }, status.HTTP_200_OK
 
+class MockWebSocketConfiguration(BaseModel):
+    messages: List[Dict[str, Any]]
+    delay: float = 0.0
+
+@app.post("/mock/ws")
+async def configure_ws_mock(cfg: MockWebSocketConfiguration):
+    mocked_ws["messages"] = MockedWebSocketMessages(messages=cfg.messages, delay=cfg.delay)
+    return {
+        "message": "Mocked WebSocket messages configured successfully",
+        "messages": len(cfg.messages)
+    }
+
+@app.delete("/mock/ws")
+async def clear_ws_mock():
+    mocked_ws.clear()
+    return {
+        "message": "WebSocket mocks cleared successfully",
+        "messages": 0
+    }
+
+@app.websocket("/v2")
+async def kraken_websocket(websocket: WebSocket):
+    """
+    Local stand-in for Kraken's v2 WebSocket API, only the ohlc channel is supported.
+    """
+    await websocket.accept()
+    stream_task: Optional[asyncio.Task] = None
+    try:
+        while True:
+            request = await websocket.receive_json()
+            if request.get("method") != "subscribe":
+                continue
+
+            params = request.get("params", {})
+            await websocket.send_json({
+                "method": "subscribe",
+                "result": {"channel": params.get("channel"), "symbol": params.get("symbol")},
+                "success": True
+            })
+            if stream_task is not None:
+                stream_task.cancel()
+            if "messages" in mocked_ws:
+                stream_task = asyncio.create_task(replay_messages(websocket, mocked_ws["messages"]))
+            else:
+                stream_task = asyncio.create_task(
+                    stream_synthetic_candles(websocket, params.get("symbol", []), params.get("interval", 1))
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if stream_task is not None:
+            stream_task.cancel()
+
 # Mount the mock middleware
 app.add_middleware(MockMiddleware, mocked_responses=mocked_responses)
 
@@ -18,8 +18,11 @@ class NNModel:
         self.model = model
         self.epochs = epochs
 
+    def predict_proba(self, pred_data):
+        return self.model.predict(pred_data, verbose=0)
+
     def predict(self, pred_data):
-        return np.argmax(self.model.predict(pred_data, verbose=0), axis=1) # type: ignore
+        return np.argmax(self.predict_proba(pred_data), axis=1) # type: ignore
 
     def load(self, filename):
         self.model = keras.models.load_model(filename, custom_objects={'LeakyReLU': keras.layers.LeakyReLU()})
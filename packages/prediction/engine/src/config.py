@@ -1,5 +1,7 @@
 import os
 
+INFERENCE_MODES = ("latest", "window")
+
 class Config:
     def __init__(self) -> None:
         self.port = int(os.getenv("PORT", 5900))
@@ -7,6 +9,21 @@ class Config:
         self.stream_name = os.getenv("STREAM_NAME", "prediction")
         self.model_storage = os.getenv("MODEL_STORAGE", "prediction-models")
         self.consumer_name = os.getenv("CONSUMER_NAME", "prediction-engine")
-        self.raw_subject = os.getenv("RAW_SUBJECT", "market-data.processed.>")
+        self.raw_subject = os.getenv("RAW_SUBJECT", "market-data.processed.15m.>")
         self.prediction_subject = os.getenv("PREDICTION_SUBJECT", "prediction")
+        # numpy runs the ensemble without TensorFlow, keras goes through NNModel
+        self.inference_backend = os.getenv("INFERENCE_BACKEND", "numpy")
+        # latest scores the candles after the last one scored for the pair, window the first row of every frame
+        self.inference_mode = os.getenv("INFERENCE_MODE", "latest")
+        if self.inference_mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown INFERENCE_MODE {self.inference_mode}. Expected one of {INFERENCE_MODES}")
+        self.fetch_batch = int(os.getenv("FETCH_BATCH", 64))
+        # Rows of many pairs are scored together, a batch waits at most this long for more rows
+        self.batch_window = float(os.getenv("BATCH_WINDOW_SECONDS", 0.01))
+        self.batch_max_rows = int(os.getenv("BATCH_MAX_ROWS", 1024))
+        # hard takes the most voted class, soft averages the probabilities of the models
+        self.voting = os.getenv("VOTING", "hard")
+        self.chunk_rows = int(os.getenv("CHUNK_ROWS", 16384))
         self.run_model_watcher = os.getenv("RUN_MODEL_WATCHER", "False").lower() in ('true', '1', 't')
+        # The watcher publishes a model version once the object store stopped changing for this long
+        self.model_settle_seconds = float(os.getenv("MODEL_SETTLE_SECONDS", 10))
@@ -1,35 +1,119 @@
+import asyncio
 import logging
-import os
+from typing import List, NamedTuple, Optional, Sequence, Tuple
 
 import numpy as np
 from numpy.typing import NDArray
 from pandas import DataFrame
-from NNModel_lib import NNModel
+from model_registry import ModelRegistry, ModelVersion
+from numpy_backend import StackedEnsemble, load_dense_layers
+from voting import VOTING_MODES, hard_vote, soft_vote
 
-TMP_DIR = "/tmp/neural-trade/models"
+INFERENCE_BACKENDS = ("numpy", "keras")
 logger = logging.getLogger(__name__)
 
+class KerasEnsemble:
+    """
+    The NNModels of an ensemble behind the interface of StackedEnsemble.
+    """
+
+    def __init__(self, paths: Sequence[str]) -> None:
+        # Only this backend needs Keras and TensorFlow
+        from NNModel_lib import NNModel
+        self.models: List[NNModel] = []
+        for path in paths:
+            model = NNModel(0, 3)
+            model.load(path)
+            self.models.append(model)
+        self.features = self.models[0].model.input_shape[-1]
+        self.classes = self.models[0].model.output_shape[-1]
+
+    def predict_proba(self, rows: NDArray) -> NDArray:
+        return np.array([model.predict_proba(rows) for model in self.models])
+
+    def predict(self, rows: NDArray) -> NDArray:
+        return np.array([model.predict(rows) for model in self.models])
+
+class ActiveModels(NamedTuple):
+    version: int
+    ensemble: object
+
 class InferenceEngine:
-    def __init__(self) -> None:
-        self.models = []
-        logger.info("loading models")
-    
-    def __load_models(self):
-        models_already_loaded = len(self.models) > 0
-
-        if models_already_loaded:
-            return
-
-        for file in os.listdir(TMP_DIR):
-            if file.endswith(".h5"):
-                modelPath = os.path.join(TMP_DIR, file)
-                logger.info(f"loading model {modelPath}")
-                model = NNModel(0, 3)
-                model.load(modelPath)
-                self.models.append(model)
+    """
+    Serves predictions with the latest model version of the registry. New versions are
+    loaded and warmed up in a thread and then swapped in with a single assignment, so a
+    prediction runs with the ensemble it started with while the next one loads.
+    """
+
+    def __init__(self, backend: str = "numpy", registry: Optional[ModelRegistry] = None, voting: str = "hard", chunk_rows: int = 16384) -> None:
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown INFERENCE_BACKEND {backend}. Expected one of {INFERENCE_BACKENDS}")
+        if voting not in VOTING_MODES:
+            raise ValueError(f"Unknown VOTING {voting}. Expected one of {VOTING_MODES}")
+        self._backend = backend
+        self._voting = voting
+        self._chunk_rows = chunk_rows
+        self.registry = registry or ModelRegistry()
+        self._active: Optional[ActiveModels] = None
+        self._ready = asyncio.Event()
+        logger.info(f"Inference engine configured [backend={backend}, voting={voting}]")
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._active.version if self._active else None
+
+    def _load(self, model_version: ModelVersion):
+        for path in model_version.paths:
+            logger.info(f"loading model {path} of version {model_version.number}")
+        if self._backend == "numpy":
+            ensemble = StackedEnsemble([load_dense_layers(path) for path in model_version.paths])
+        else:
+            ensemble = KerasEnsemble(model_version.paths)
+        # The first prediction of a freshly loaded model is the slow one, it happens here instead of on a message
+        ensemble.predict(np.zeros((1, ensemble.features), dtype=np.float32))
+        return ensemble
+
+    async def watch_registry(self):
+        version = 0
+        while True:
+            model_version = await self.registry.wait_for_newer(version)
+            version = model_version.number
+            try:
+                ensemble = await asyncio.to_thread(self._load, model_version)
+            except Exception as e:
+                logger.error(f"Failed to load model version {version}, still serving version {self.version}: {e}")
+                continue
+            self._active = ActiveModels(version, ensemble)
+            self.registry.served(model_version)
+            self._ready.set()
+            logger.info(f"Serving model version {version}")
 
     async def predict(self, df: DataFrame) -> NDArray:
-        self.__load_models()
-        predictions = np.array([model.predict(df) for model in self.models])
-        aggregated_predictions = np.apply_along_axis(lambda x: np.bincount(x).argmax(), axis=0, arr=predictions)
-        return aggregated_predictions - 1
+        return await self.predict_array(df.to_numpy(dtype=np.float32))
+
+    async def predict_array(self, rows: NDArray) -> NDArray:
+        labels, _ = await self.score_array(rows)
+        return labels
+
+    async def score_array(self, rows: NDArray) -> Tuple[NDArray, NDArray]:
+        """
+        Voted label (-1, 0 or 1) and confidence of every row. Rows go through the ensemble
+        in chunks of `chunk_rows`, so millions of them don't need all the activations at once.
+        """
+        active = self._active
+        if active is None:
+            logger.info("Waiting for the first model version...")
+            await self._ready.wait()
+            active = self._active
+
+        labels = np.empty(len(rows), dtype=np.int64)
+        confidence = np.empty(len(rows), dtype=np.float64)
+        for start in range(0, len(rows), self._chunk_rows):
+            chunk = rows[start:start + self._chunk_rows]
+            if self._voting == "soft":
+                winners, scores = soft_vote(active.ensemble.predict_proba(chunk))
+            else:
+                winners, scores = hard_vote(active.ensemble.predict(chunk), active.ensemble.classes)
+            labels[start:start + len(chunk)] = winners
+            confidence[start:start + len(chunk)] = scores
+        return labels - 1, confidence
@@ -4,6 +4,7 @@ from asyncio.tasks import Task
 import logging
 from typing import List
 from model_manager import ModelManager
+from model_registry import ModelRegistry
 from service import PredictionService
 from webserver import webserver
 
@@ -18,8 +19,10 @@ async def shutdown():
     [task.cancel() for task in all_tasks]
 
 async def main():
-    predictionService = PredictionService()
-    model_manager = ModelManager()
+    # ModelManager publishes model versions, the prediction service swaps them in as they come
+    registry = ModelRegistry()
+    predictionService = PredictionService(registry)
+    model_manager = ModelManager(registry)
     try:
         async with asyncio.TaskGroup() as tg:
             all_tasks.append(tg.create_task(webserver.serve()))
@@ -1,5 +1,4 @@
 import asyncio
-import json
 import logging
 from nats.aio.client import Client
 from nats.aio.msg import Msg
@@ -7,9 +6,9 @@ from nats.js import JetStreamContext
 from nats.js.api import AckPolicy, ConsumerConfig, DeliverPolicy
 from numpy.typing import NDArray
 from pandas import DataFrame
-import pandas as pd
 
 from inference import InferenceEngine
+from wire_format import decode_message
 
 logger = logging.getLogger(__name__)
 
@@ -48,9 +47,8 @@ class NATSMessageConsumer:
     async def process_message(self, msg: Msg):
         try:
             subject = msg.subject
-            data = msg.data.decode()
             coin_pair = subject.split(".")[-1]
-            df: DataFrame = pd.DataFrame(json.loads(data))
+            df: DataFrame = decode_message(msg.data, msg.headers)
             if df.empty:
                 logger.warning(f"Empty message received for coin pair {coin_pair}")
                 await msg.ack()
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from pandas import DataFrame
+
+from inference import InferenceEngine
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Gathers the feature rows of many pairs and scores them with one forward pass of the
+    ensemble. A batch goes out `max_delay` seconds after its first rows arrived or as soon
+    as it holds `max_rows` rows, whichever comes first, and every caller gets back the
+    predictions and confidences of its own rows.
+    """
+
+    def __init__(self, engine: InferenceEngine, max_rows: int, max_delay: float) -> None:
+        self._engine = engine
+        self._max_rows = max_rows
+        self._max_delay = max_delay
+        self._pending: List[Tuple[NDArray, asyncio.Future]] = []
+        self._rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def predict(self, df: DataFrame) -> Tuple[NDArray, NDArray]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((df.to_numpy(dtype=np.float32), future))
+        self._rows += len(df)
+
+        if self._rows >= self._max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._rows = self._pending, [], 0
+        if not batch:
+            return
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[NDArray, asyncio.Future]]) -> None:
+        try:
+            predictions, confidence = await self._engine.score_array(np.concatenate([rows for rows, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.debug(f"Scored {len(predictions)} rows of {len(batch)} messages in one batch")
+        offset = 0
+        for rows, future in batch:
+            # A caller that was cancelled meanwhile just doesn't get its rows
+            if not future.done():
+                future.set_result((predictions[offset:offset + len(rows)], confidence[offset:offset + len(rows)]))
+            offset += len(rows)
@@ -1,6 +1,8 @@
 import asyncio
 import os
+import shutil
 import sys
+from typing import Optional
 from nats.errors import TimeoutError
 from nats.aio.client import Client
 from nats.js import JetStreamContext
@@ -8,18 +10,30 @@ from nats.js.errors import BucketNotFoundError
 from nats.js.object_store import ObjectStore
 
 from config import Config
+from model_registry import ModelRegistry
+from numpy_backend import model_paths
 
 TMP_DIR = "/tmp/neural-trade/models"
+# Downloads land in the staging directory, every version gets an immutable copy of it
+STAGING_DIR = "staging"
+VERSION_PREFIX = "v"
+
+def _version_number(name: str) -> Optional[int]:
+    number = name[len(VERSION_PREFIX):]
+    return int(number) if name.startswith(VERSION_PREFIX) and number.isdigit() else None
 
 class ModelManager:
-    def __init__(self) -> None:
+    def __init__(self, registry: Optional[ModelRegistry] = None) -> None:
         self.nc = Client()
+        self.registry = registry or ModelRegistry()
         self.js: JetStreamContext
         self._config = Config()
         self.object_store: ObjectStore
         self.nats_server = self._config.nats_url
         self.bucket_name = self._config.model_storage
         self.run_watcher = self._config.run_model_watcher
+        self.settle_seconds = self._config.model_settle_seconds
+        self.versions_published = 0
 
     async def connect_nats(self):
         await self.nc.connect(self.nats_server)
@@ -32,12 +46,54 @@ class ModelManager:
             self.object_store = await self.js.create_object_store(self.bucket_name)
 
     async def store_file(self, modelName: str):
-        filename = f"{TMP_DIR}/{modelName}"
+        filename = f"{TMP_DIR}/{STAGING_DIR}/{modelName}"
+        # Written next to the model and renamed over it, a reader never opens a half written file
+        tmp_filename = os.path.join(os.path.dirname(filename), f".{os.path.basename(filename)}.tmp")
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, mode="wb") as write_file:
-            model_file = await self.object_store.get(modelName)
+        model_file = await self.object_store.get(modelName)
+        with open(tmp_filename, mode="wb") as write_file:
             write_file.write(model_file.data) # type: ignore
-            write_file.close()
+            write_file.flush()
+            os.fsync(write_file.fileno())
+        os.replace(tmp_filename, filename)
+
+    def remove_file(self, modelName: str):
+        filename = f"{TMP_DIR}/{STAGING_DIR}/{modelName}"
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    async def publish_version(self):
+        staging_dir = f"{TMP_DIR}/{STAGING_DIR}"
+        staged = model_paths(staging_dir) if os.path.isdir(staging_dir) else []
+        if not staged:
+            print("No models left on disk. Keeping the version being served.")
+            return
+        # Hard links, store_file replaces a staged model with a new file so the version keeps the old one
+        self.versions_published += 1
+        version_dir = f"{TMP_DIR}/{VERSION_PREFIX}{self.versions_published}"
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.makedirs(version_dir)
+        paths = [os.path.join(version_dir, os.path.basename(path)) for path in staged]
+        for staged_path, path in zip(staged, paths):
+            os.link(staged_path, path)
+        await self.registry.publish(paths)
+
+    def remove_old_versions(self):
+        """
+        Deletes the version directories older than the one the engine serves. Newer ones stay,
+        the engine may be loading them.
+        """
+        serving = self.registry.serving
+        if serving is None or not serving.paths:
+            return
+        served = _version_number(os.path.basename(os.path.dirname(serving.paths[0])))
+        if served is None:
+            return
+        for name in os.listdir(TMP_DIR):
+            number = _version_number(name)
+            if number is not None and number < served:
+                shutil.rmtree(f"{TMP_DIR}/{name}", ignore_errors=True)
+                print(f"Removed model version directory {name}")
 
     async def get_models(self):
         models = await self.object_store.list()
@@ -47,6 +103,7 @@ class ModelManager:
         
         for model in models:
             await self.store_file(model.name)
+        await self.publish_version()
 
     async def init_nats_connections(self):
         try:
@@ -63,18 +120,31 @@ class ModelManager:
             print(f"Skipping the model object store watcher.")
             return
 
+        # Watching first, a model uploaded while the others download still gets picked up
         object_watcher = await self.object_store.watch(include_history=False)
+        try:
+            await self.get_models()
+        except Exception as e:
+            print(f"No models to start with ({e}). Waiting for the object store watcher.")
+        # A rollout uploads or deletes its models one after the other, a single version goes
+        # out once the object store didn't change for `settle_seconds`
+        changed = False
         while True:
             try:
-                modelObject = await object_watcher.updates(timeout=30)
+                modelObject = await object_watcher.updates(timeout=self.settle_seconds)
                 if not modelObject:
                     continue
-                
-                if modelObject.deleted:
-                    continue
 
-                await self.store_file(modelObject.name)
+                if modelObject.deleted:
+                    self.remove_file(modelObject.name)
+                else:
+                    await self.store_file(modelObject.name)
+                changed = True
             except TimeoutError:
+                if changed:
+                    await self.publish_version()
+                    changed = False
+                self.remove_old_versions()
                 continue
             except asyncio.CancelledError:
                 return
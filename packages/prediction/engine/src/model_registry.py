@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ModelVersion(NamedTuple):
+    number: int
+    paths: Tuple[str, ...]
+
+class ModelRegistry:
+    """
+    Versions of the model set shared by ModelManager and InferenceEngine. ModelManager
+    publishes a new version once its files are completely on disk, the engine waits for
+    versions newer than the one it serves and reports the one it swapped in.
+    """
+
+    def __init__(self) -> None:
+        self._latest: Optional[ModelVersion] = None
+        self._serving: Optional[ModelVersion] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def latest(self) -> Optional[ModelVersion]:
+        return self._latest
+
+    @property
+    def serving(self) -> Optional[ModelVersion]:
+        return self._serving
+
+    def served(self, version: ModelVersion) -> None:
+        self._serving = version
+
+    async def publish(self, paths: Sequence[str]) -> ModelVersion:
+        async with self._changed:
+            number = self._latest.number + 1 if self._latest else 1
+            self._latest = ModelVersion(number, tuple(sorted(paths)))
+            self._changed.notify_all()
+        logger.info(f"Published model version {number} with {len(paths)} models")
+        return self._latest
+
+    async def wait_for_newer(self, number: int) -> ModelVersion:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._latest is not None and self._latest.number > number)
+            return self._latest
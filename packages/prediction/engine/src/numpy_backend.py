@@ -0,0 +1,196 @@
+"""
+NumPy forward pass for the NNModel ensemble.
+
+The dense layers of every .h5 model are read with h5py and run as plain matmuls, so
+inference needs neither Keras nor TensorFlow. The members of the ensemble share their
+layer shapes, so their weights are stacked into (members, in, out) tensors and the whole
+ensemble runs as one batched matmul per layer.
+
+Parity with Keras is checked with
+
+    python src/numpy_backend.py /tmp/neural-trade/models/staging
+
+which needs Keras installed and exits with 1 when the probabilities differ. The tests
+check the forward pass against a plain NumPy reference, and against Keras when it is
+installed.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import h5py
+import numpy as np
+from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+# NNModel builds its hidden layers with LeakyReLU(negative_slope=0.01) and a softmax output
+NNMODEL_NEGATIVE_SLOPE = 0.01
+# Keras' own default when a LeakyReLU config doesn't carry the slope
+_KERAS_NEGATIVE_SLOPE = 0.3
+
+
+class DenseLayer(NamedTuple):
+    kernel: NDArray
+    bias: NDArray
+    activation: str
+    negative_slope: float = 0.0
+
+
+def _activation(activation) -> Tuple[str, float]:
+    # Keras 3 serialises layer objects used as activations as {"class_name", "config"}
+    if isinstance(activation, dict):
+        config = activation.get("config", {})
+        if activation.get("class_name") == "LeakyReLU":
+            return "leaky_relu", float(config.get("negative_slope", config.get("alpha", _KERAS_NEGATIVE_SLOPE)))
+        activation = config.get("activation", activation.get("class_name"))
+    if activation == "leaky_relu":
+        return "leaky_relu", 0.2
+    if activation in ("linear", "relu", "softmax"):
+        return activation, 0.0
+    raise ValueError(f"Unsupported activation {activation}")
+
+
+def _dense_activations(model_config: Optional[str]) -> Optional[List[Tuple[str, float]]]:
+    if not model_config:
+        return None
+    config = json.loads(model_config)
+    layers = config.get("config", {}).get("layers", [])
+    return [_activation(layer["config"].get("activation", "linear")) for layer in layers if layer.get("class_name") == "Dense"]
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def load_dense_layers(path: str) -> List[DenseLayer]:
+    """
+    Kernel, bias and activation of every Dense layer of a Keras .h5 model, in order.
+    """
+    with h5py.File(path, "r") as f:
+        weights = f["model_weights"] if "model_weights" in f else f
+        model_config = f.attrs.get("model_config")
+        activations = _dense_activations(_decode(model_config) if model_config is not None else None)
+
+        tensors = []
+        for layer_name in weights.attrs["layer_names"]:
+            group = weights[_decode(layer_name)]
+            names = [_decode(name) for name in group.attrs.get("weight_names", [])]
+            if names:
+                # Dense layers store [kernel, bias]
+                tensors.append(tuple(np.asarray(group[name]) for name in names))
+
+    if activations is None:
+        activations = [("leaky_relu", NNMODEL_NEGATIVE_SLOPE)] * (len(tensors) - 1) + [("softmax", 0.0)]
+    if len(activations) != len(tensors):
+        raise ValueError(f"{path} has {len(tensors)} weighted layers but {len(activations)} Dense layers")
+    return [DenseLayer(kernel, bias, activation, slope) for (kernel, bias), (activation, slope) in zip(tensors, activations)]
+
+
+def _softmax(logits: NDArray) -> NDArray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class StackedEnsemble:
+    """
+    The members of an ensemble of dense models run together. Inputs of shape (rows,
+    features) give probabilities of shape (members, rows, classes).
+    """
+
+    def __init__(self, models: Sequence[List[DenseLayer]], dtype=np.float32) -> None:
+        if not models:
+            raise ValueError("An ensemble needs at least one model")
+        layout = [(layer.kernel.shape, layer.activation, layer.negative_slope) for layer in models[0]]
+        for model in models[1:]:
+            if [(layer.kernel.shape, layer.activation, layer.negative_slope) for layer in model] != layout:
+                raise ValueError("Every model of the ensemble needs the same layers to be stacked")
+
+        self.members = len(models)
+        self.features = models[0][0].kernel.shape[0]
+        self.classes = models[0][-1].kernel.shape[1]
+        self._dtype = dtype
+        self._kernels = [np.stack([model[i].kernel for model in models]).astype(dtype) for i in range(len(layout))]
+        self._biases = [np.stack([model[i].bias for model in models])[:, np.newaxis, :].astype(dtype) for i in range(len(layout))]
+        self._activations = [(activation, dtype(slope)) for _, activation, slope in layout]
+
+    def predict_proba(self, rows: NDArray) -> NDArray:
+        hidden = np.asarray(rows, dtype=self._dtype)
+        for kernel, bias, (activation, slope) in zip(self._kernels, self._biases, self._activations):
+            # (rows, in) or (members, rows, in) times (members, in, out), one matmul for all members
+            hidden = np.matmul(hidden, kernel)
+            hidden += bias
+            if activation == "leaky_relu":
+                hidden = np.maximum(hidden, hidden * slope)
+            elif activation == "relu":
+                hidden = np.maximum(hidden, 0)
+            elif activation == "softmax":
+                hidden = _softmax(hidden)
+        return hidden
+
+    def predict(self, rows: NDArray) -> NDArray:
+        """
+        Class of every row for every member, like NNModel.predict of each model stacked.
+        """
+        return np.argmax(self.predict_proba(rows), axis=-1)
+
+
+def model_paths(directory: str) -> List[str]:
+    return sorted(os.path.join(directory, file) for file in os.listdir(directory) if file.endswith(".h5"))
+
+
+def check_parity(paths: Sequence[str], rows: int = 1024, seed: int = 0) -> List[float]:
+    """
+    Largest absolute difference between the NumPy and Keras probabilities of every model
+    on random rows. Needs Keras.
+    """
+    from NNModel_lib import NNModel
+
+    ensemble = StackedEnsemble([load_dense_layers(path) for path in paths])
+    data = np.random.default_rng(seed).normal(size=(rows, ensemble.features)).astype(np.float32)
+    probabilities = ensemble.predict_proba(data)
+
+    differences = []
+    for member, path in enumerate(paths):
+        model = NNModel(0, ensemble.classes)
+        model.load(path)
+        expected = model.model.predict(data, verbose=0)
+        differences.append(float(np.abs(probabilities[member] - expected).max()))
+    return differences
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check the NumPy backend against Keras")
+    parser.add_argument("models", help="Directory with the .h5 models")
+    parser.add_argument("--rows", type=int, default=1024)
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="Largest accepted probability difference")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = _parse_args(argv)
+    paths = model_paths(args.models)
+    differences = check_parity(paths, args.rows)
+    for path, difference in zip(paths, differences):
+        logger.info(f"{os.path.basename(path)}: max probability difference {difference:.2e}")
+
+    ensemble = StackedEnsemble([load_dense_layers(path) for path in paths])
+    row = np.zeros((1, ensemble.features), dtype=np.float32)
+    started = time.perf_counter()
+    for _ in range(1000):
+        ensemble.predict(row)
+    logger.info(f"Single row prediction of {ensemble.members} models: {(time.perf_counter() - started) * 1000:.1f}us")
+
+    if max(differences) > args.tolerance:
+        logger.error(f"NumPy backend differs from Keras by more than {args.tolerance}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
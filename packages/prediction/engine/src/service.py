@@ -1,6 +1,10 @@
 import asyncio
-import json
 import logging
+import zlib
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
 
 from nats.aio.client import Client
 from nats.aio.msg import Msg
@@ -8,26 +12,49 @@ from nats.js import JetStreamContext
 from nats.js.api import AckPolicy, ConsumerConfig, DeliverPolicy
 from numpy.typing import NDArray
 from pandas import DataFrame
-import pandas as pd
 
 from config import Config
 from inference import InferenceEngine
+from micro_batcher import MicroBatcher
+from model_registry import ModelRegistry
+from wire_format import decode_message
 
 
 _logger = logging.getLogger(__name__)
 
+CANDLE_DATE_HEADER = "Auguris-Candle-Date"
+CONFIDENCE_HEADER = "Auguris-Confidence"
+
+def split_dates(df: DataFrame) -> Tuple[Optional[NDArray], DataFrame]:
+    """
+    Candle dates of a feature frame and the model inputs. Columnar frames carry the dates
+    as their index, JSON ones as a Date column.
+    """
+    if df.index.name == "Date":
+        return df.index.to_numpy(dtype="datetime64[ns]"), df
+    if "Date" in df.columns:
+        return df["Date"].to_numpy(dtype="datetime64[ns]"), df.drop(columns="Date")
+    return None, df
+
 class PredictionService:
-    def __init__(self) -> None:
+    def __init__(self, registry: Optional[ModelRegistry] = None) -> None:
         self._nc: Client = Client()
         self._js: JetStreamContext
         self._config = Config()
         self._running = False
-        self._engine: InferenceEngine = InferenceEngine()
+        self._engine: InferenceEngine = InferenceEngine(
+                self._config.inference_backend, registry, self._config.voting, self._config.chunk_rows
+                )
+        self._batcher = MicroBatcher(self._engine, self._config.batch_max_rows, self._config.batch_window)
+        # Candle date of the last prediction published for each pair
+        self._cursors: Dict[str, np.datetime64] = {}
+        self._pair_locks: Dict[str, asyncio.Lock] = {}
 
     async def start(self):
         await self.__connect_nats()
         await self.__ensure_consumer()
         self._running = True
+        model_loader = asyncio.create_task(self._engine.watch_registry())
 
         try:
             while self._running:
@@ -36,6 +63,7 @@ class PredictionService:
             _logger.info("Service cancelled. Exiting task loop")
             await self.stop()
         finally:
+            model_loader.cancel()
             _logger.info("Service finished.")
 
     async def stop(self):
@@ -51,7 +79,7 @@ class PredictionService:
     async def __ensure_consumer(self):
         try:
             _logger.info(f"Checking consumer {self._config.consumer_name}")
-            await self._js.consumer_info(self._config.stream_name, self._config.consumer_name)
+            info = await self._js.consumer_info(self._config.stream_name, self._config.consumer_name)
         except:
             _logger.warning(f"Consumer did not exist. Configuring it now.")
             consumerConfig = ConsumerConfig(
@@ -61,38 +89,90 @@ class PredictionService:
             )
             await self._js.add_consumer(self._config.stream_name, consumerConfig)
             _logger.info(f"Consumer {self._config.consumer_name} created.")
+            return
+
+        # A consumer created with an older RAW_SUBJECT would keep delivering the frames of every timeframe
+        if info.config.filter_subject != self._config.raw_subject:
+            _logger.warning(f"Consumer {self._config.consumer_name} filters {info.config.filter_subject}. Updating it to {self._config.raw_subject}")
+            info.config.filter_subject = self._config.raw_subject
+            await self._js.add_consumer(self._config.stream_name, info.config)
+            _logger.info(f"Consumer {self._config.consumer_name} updated.")
 
     async def __consume_messages(self):
         sub = await self._js.pull_subscribe(self._config.raw_subject, self._config.consumer_name)
         while self._running:
             try:
-                msgs = await sub.fetch(1, timeout=5)
-                for msg in msgs:
-                    await self.__process_message(msg)
+                msgs = await sub.fetch(self._config.fetch_batch, timeout=5)
             except asyncio.TimeoutError:
                 continue
+            # The messages of a fetch are processed together so the micro-batcher can score them in one pass
+            await asyncio.gather(*(self.__process_message(msg) for msg in msgs))
+
+    def __pair_lock(self, coin_pair: str) -> asyncio.Lock:
+        lock = self._pair_locks.get(coin_pair)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._pair_locks[coin_pair] = lock
+        return lock
+
+    def __new_rows(self, coin_pair: str, df: DataFrame) -> Tuple[Optional[NDArray], DataFrame]:
+        """
+        Rows of the frame from the last scored candle of the pair on, only the latest one when
+        the pair has no cursor yet. The last scored candle was usually still open, so it is
+        scored again with the values it closed with.
+        """
+        dates, features = split_dates(df)
+        if self._config.inference_mode == "window":
+            # What every frame used to be reduced to, the first row without its date
+            return None, features.iloc[:1]
+        if dates is None:
+            return None, features.iloc[-1:]
+
+        cursor = self._cursors.get(coin_pair)
+        if cursor is None:
+            return dates[-1:], features.iloc[-1:]
+        newer = dates >= cursor
+        return dates[newer], features[newer]
 
     async def __process_message(self, msg: Msg):
         subject = msg.subject
-        data = msg.data.decode()
         coin_pair = subject.split(".")[-1]
-        df: DataFrame = pd.DataFrame(json.loads(data))
+        df: DataFrame = decode_message(msg.data, msg.headers)
 
         if df.empty:
             _logger.warning(f"Empty message received for {coin_pair}")
             await msg.ack()
             return
 
-        try:
-            predictions: NDArray = await self._engine.predict(df)
-            await self.__send_prediction(predictions[0], coin_pair)
-            await msg.ack()
-        except Exception as e:
-            _logger.error(f"Error occurred trying to process prediction for {coin_pair}. Exception: {e}")
-            await msg.nak()
+        # Messages of the same pair are scored in order, the cursor moves between them
+        async with self.__pair_lock(coin_pair):
+            try:
+                dates, rows = self.__new_rows(coin_pair, df)
+                if rows.empty:
+                    _logger.info(f"No candles of {coin_pair} from {self._cursors.get(coin_pair)} on. Skipping")
+                    await msg.ack()
+                    return
+
+                predictions, confidence = await self._batcher.predict(rows)
+                for position, prediction in enumerate(predictions):
+                    await self.__send_prediction(prediction, coin_pair, confidence[position], dates[position] if dates is not None else None)
+                if dates is not None:
+                    self._cursors[coin_pair] = dates[-1]
+                await msg.ack()
+            except Exception as e:
+                _logger.error(f"Error occurred trying to process prediction for {coin_pair}. Exception: {e}")
+                await msg.nak()
 
-    async def __send_prediction(self, predictions: NDArray, coin_pair: str):
+    async def __send_prediction(self, predictions: NDArray, coin_pair: str, confidence: float, candle_date: Optional[np.datetime64] = None):
         data = str(predictions)
         subject = f"{self._config.prediction_subject}.{coin_pair.replace('/', '-')}"
-        ack = await self._js.publish(subject, data.encode("utf-8"))
+        headers = {CONFIDENCE_HEADER: f"{confidence:.4f}"}
+        if candle_date is not None:
+            timestamp = pd.Timestamp(candle_date)
+            headers[CANDLE_DATE_HEADER] = timestamp.isoformat()
+            # A candle scored again with the same outcome is dropped within the stream's duplicate
+            # window, a revised prediction for it goes out
+            revision = zlib.crc32(f"{data}:{headers[CONFIDENCE_HEADER]}".encode("utf-8"))
+            headers["Nats-Msg-Id"] = f"{subject}:{int(timestamp.timestamp())}:{revision:08x}"
+        ack = await self._js.publish(subject, data.encode("utf-8"), headers=headers)
         _logger.info(f"Prediction published to {subject} [{ack}]")
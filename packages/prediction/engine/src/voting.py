@@ -0,0 +1,31 @@
+"""
+Ensemble votes over the outputs of every member.
+
+hard_vote takes the class each member predicted, shape (members, rows), and picks the
+most voted class of every row, the lowest one on ties like np.bincount(...).argmax().
+soft_vote averages the class probabilities, shape (members, rows, classes), and picks
+the most likely class. Both also give a confidence per row: the share of members that
+voted for the winner, or its averaged probability.
+"""
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+VOTING_MODES = ("hard", "soft")
+
+
+def hard_vote(predictions: NDArray, classes: int) -> Tuple[NDArray, NDArray]:
+    votes = np.empty((predictions.shape[1], classes), dtype=np.int32)
+    # One pass over the votes per class instead of a bincount per row
+    for label in range(classes):
+        np.sum(predictions == label, axis=0, out=votes[:, label])
+    winners = votes.argmax(axis=1)
+    confidence = np.take_along_axis(votes, winners[:, np.newaxis], axis=1)[:, 0] / predictions.shape[0]
+    return winners, confidence
+
+
+def soft_vote(probabilities: NDArray) -> Tuple[NDArray, NDArray]:
+    mean = probabilities.mean(axis=0)
+    winners = mean.argmax(axis=1)
+    return winners, np.take_along_axis(mean, winners[:, np.newaxis], axis=1)[:, 0]
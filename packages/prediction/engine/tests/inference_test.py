@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from src.inference import ActiveModels, InferenceEngine
+from src.model_registry import ModelRegistry
+from src.numpy_backend import DenseLayer, StackedEnsemble
+
+
+def get_ensemble(members: int = 5, features: int = 8, seed: int = 0) -> StackedEnsemble:
+    rng = np.random.default_rng(seed)
+    shapes = [(features, 16), (16, 3)]
+    return StackedEnsemble([
+        [DenseLayer(rng.normal(size=shape), rng.normal(size=shape[1]), activation, 0.01)
+         for shape, activation in zip(shapes, ("leaky_relu", "softmax"))]
+        for _ in range(members)
+    ])
+
+
+class TestInferenceEngine(unittest.IsolatedAsyncioTestCase):
+    def get_engine(self, voting: str, chunk_rows: int) -> InferenceEngine:
+        engine = InferenceEngine(voting=voting, chunk_rows=chunk_rows)
+        engine._active = ActiveModels(1, get_ensemble())
+        return engine
+
+    async def test_chunked_scores_match_a_single_pass(self):
+        rows = np.random.default_rng(1).normal(size=(1000, 8)).astype(np.float32)
+        for voting in ("hard", "soft"):
+            labels, confidence = await self.get_engine(voting, 1000).score_array(rows)
+            chunked_labels, chunked_confidence = await self.get_engine(voting, 64).score_array(rows)
+
+            np.testing.assert_array_equal(chunked_labels, labels)
+            np.testing.assert_allclose(chunked_confidence, confidence)
+
+    async def test_labels_are_shifted_to_sell_hold_buy(self):
+        rows = np.random.default_rng(2).normal(size=(200, 8)).astype(np.float32)
+        engine = self.get_engine("hard", 64)
+
+        labels, confidence = await engine.score_array(rows)
+
+        predictions = engine._active.ensemble.predict(rows)
+        expected = np.array([np.bincount(column, minlength=3).argmax() for column in predictions.T]) - 1
+        np.testing.assert_array_equal(labels, expected)
+        assert set(np.unique(labels)) <= {-1, 0, 1}
+        assert ((confidence > 0) & (confidence <= 1)).all()
+
+    async def watch(self, ensembles) -> InferenceEngine:
+        engine = InferenceEngine(registry=ModelRegistry(), chunk_rows=64)
+
+        def load(model_version):
+            ensemble = ensembles[model_version.paths[0]]
+            if isinstance(ensemble, Exception):
+                raise ensemble
+            return ensemble
+        engine._load = load
+        watcher = asyncio.create_task(engine.watch_registry())
+        self.addAsyncCleanup(self.stop, watcher)
+        return engine
+
+    async def stop(self, watcher):
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+    async def wait_for_version(self, engine: InferenceEngine, version: int):
+        for _ in range(100):
+            if engine.version == version:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"Engine serves version {engine.version} instead of {version}")
+
+    async def test_watch_registry_swaps_in_new_versions(self):
+        ensembles = {"v1/model.h5": get_ensemble(seed=1), "v2/model.h5": get_ensemble(seed=2)}
+        engine = await self.watch(ensembles)
+
+        await engine.registry.publish(["v1/model.h5"])
+        await self.wait_for_version(engine, 1)
+        assert engine._active.ensemble is ensembles["v1/model.h5"]
+
+        await engine.registry.publish(["v2/model.h5"])
+        await self.wait_for_version(engine, 2)
+        assert engine._active.ensemble is ensembles["v2/model.h5"]
+        assert engine.registry.serving.number == 2
+
+    async def test_a_version_that_fails_to_load_keeps_the_one_served(self):
+        ensembles = {"v1/model.h5": get_ensemble(seed=1), "v2/model.h5": OSError("truncated file"), "v3/model.h5": get_ensemble(seed=3)}
+        engine = await self.watch(ensembles)
+
+        await engine.registry.publish(["v1/model.h5"])
+        await self.wait_for_version(engine, 1)
+        await engine.registry.publish(["v2/model.h5"])
+        await asyncio.sleep(0.05)
+
+        assert engine.version == 1
+        assert engine.registry.serving.number == 1
+        await engine.registry.publish(["v3/model.h5"])
+        await self.wait_for_version(engine, 3)
+
+    async def test_scoring_in_flight_finishes_on_the_ensemble_it_started_with(self):
+        rows = np.random.default_rng(3).normal(size=(256, 8)).astype(np.float32)
+        first, second = get_ensemble(seed=1), get_ensemble(seed=2)
+        reference = InferenceEngine(chunk_rows=64)
+        reference._active = ActiveModels(1, get_ensemble(seed=1))
+        expected, _ = await reference.score_array(rows)
+        engine = await self.watch({"v1/model.h5": first, "v2/model.h5": second})
+        await engine.registry.publish(["v1/model.h5"])
+        await self.wait_for_version(engine, 1)
+        predict = first.predict
+        chunks = []
+
+        def predict_and_swap(chunk):
+            # The next version is swapped in while the first chunk is scored
+            chunks.append(len(chunk))
+            if len(chunks) == 1:
+                engine._active = ActiveModels(2, second)
+            return predict(chunk)
+        first.predict = predict_and_swap
+
+        labels, _ = await engine.score_array(rows)
+
+        assert chunks == [64, 64, 64, 64]
+        np.testing.assert_array_equal(labels, expected)
+        assert engine._active.ensemble is second
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+import numpy as np
+import pandas as pd
+
+from src.micro_batcher import MicroBatcher
+
+
+def get_rows(first: int, rows: int) -> pd.DataFrame:
+    values = np.arange(first, first + rows, dtype=np.float32)
+    return pd.DataFrame({"a": values, "b": values * 10})
+
+
+class TestMicroBatcher(unittest.IsolatedAsyncioTestCase):
+    def get_batcher(self, max_rows: int, max_delay: float) -> MicroBatcher:
+        # Predictions echo the first feature and confidences the second, so every row can be traced back
+        self.engine = Mock(score_array=AsyncMock(side_effect=lambda rows: (rows[:, 0].copy(), rows[:, 1].copy())))
+        return MicroBatcher(self.engine, max_rows, max_delay)
+
+    async def test_every_caller_gets_its_own_rows(self):
+        batcher = self.get_batcher(max_rows=100, max_delay=0.01)
+
+        results = await asyncio.gather(*(batcher.predict(get_rows(first, rows)) for first, rows in ((0, 3), (100, 1), (200, 5))))
+
+        self.engine.score_array.assert_awaited_once()
+        for (predictions, confidence), (first, rows) in zip(results, ((0, 3), (100, 1), (200, 5))):
+            np.testing.assert_array_equal(predictions, np.arange(first, first + rows))
+            np.testing.assert_array_equal(confidence, np.arange(first, first + rows) * 10)
+
+    async def test_flushes_as_soon_as_max_rows_are_pending(self):
+        batcher = self.get_batcher(max_rows=4, max_delay=60)
+
+        results = await asyncio.wait_for(asyncio.gather(batcher.predict(get_rows(0, 2)), batcher.predict(get_rows(2, 2))), timeout=1)
+
+        self.engine.score_array.assert_awaited_once()
+        assert len(self.engine.score_array.call_args.args[0]) == 4
+        np.testing.assert_array_equal(results[1][0], [2, 3])
+
+    async def test_flushes_when_the_window_ends(self):
+        batcher = self.get_batcher(max_rows=100, max_delay=0.05)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        predictions, _ = await batcher.predict(get_rows(0, 1))
+
+        # The event loop may run a timer up to its clock resolution early
+        assert loop.time() - started >= 0.04
+        np.testing.assert_array_equal(predictions, [0])
+        self.engine.score_array.assert_awaited_once()
+
+    async def test_a_scoring_error_reaches_every_caller(self):
+        batcher = self.get_batcher(max_rows=100, max_delay=0.01)
+        self.engine.score_array.side_effect = RuntimeError("ensemble failed")
+
+        results = await asyncio.gather(batcher.predict(get_rows(0, 2)), batcher.predict(get_rows(2, 3)), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert batcher._pending == []
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from nats.errors import TimeoutError
+
+from src.model_manager import ModelManager
+from src.model_registry import ModelRegistry
+
+
+def model_update(name: str, deleted: bool = False) -> Mock:
+    update = Mock(deleted=deleted)
+    update.name = name
+    return update
+
+
+class TestModelManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.patcher_os_environ = patch.dict("os.environ", {"RUN_MODEL_WATCHER": "true", "MODEL_SETTLE_SECONDS": "0.01"})
+        self.patcher_os_environ.start()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_tmp_dir = patch("src.model_manager.TMP_DIR", self.tmp_dir.name)
+        self.patcher_tmp_dir.start()
+        self.registry = Mock(publish=AsyncMock(), serving=None)
+        self.manager = ModelManager(self.registry)
+        self.manager.init_nats_connections = AsyncMock()
+        self.manager.get_models = AsyncMock()
+        self.manager.object_store = AsyncMock()
+        self.uploads = 0
+
+        async def get(name):
+            self.uploads += 1
+            return Mock(data=f"{name}:{self.uploads}".encode())
+        self.manager.object_store.get.side_effect = get
+        self.watcher = AsyncMock()
+        self.manager.object_store.watch.return_value = self.watcher
+
+    async def asyncTearDown(self):
+        self.patcher_os_environ.stop()
+        self.patcher_tmp_dir.stop()
+        self.tmp_dir.cleanup()
+
+    async def test_publishes_one_version_per_rollout(self):
+        self.watcher.updates.side_effect = [
+            model_update("model_1.h5"), model_update("model_2.h5"), None, model_update("model_3.h5"),
+            TimeoutError(), TimeoutError(), asyncio.CancelledError()
+        ]
+
+        await self.manager.watch_models()
+
+        self.registry.publish.assert_awaited_once()
+        paths = self.registry.publish.call_args.args[0]
+        assert [path.split("/")[-1] for path in paths] == ["model_1.h5", "model_2.h5", "model_3.h5"]
+
+    async def test_deleted_models_leave_the_next_version(self):
+        self.watcher.updates.side_effect = [
+            model_update("model_1.h5"), model_update("model_2.h5"), TimeoutError(),
+            model_update("model_1.h5", deleted=True), TimeoutError(), asyncio.CancelledError()
+        ]
+
+        await self.manager.watch_models()
+
+        assert self.registry.publish.await_count == 2
+        paths = self.registry.publish.call_args.args[0]
+        assert [path.split("/")[-1] for path in paths] == ["model_2.h5"]
+
+    async def test_does_not_publish_an_empty_version(self):
+        self.watcher.updates.side_effect = [
+            model_update("model_1.h5"), TimeoutError(), model_update("model_1.h5", deleted=True), TimeoutError(),
+            asyncio.CancelledError()
+        ]
+
+        await self.manager.watch_models()
+
+        self.registry.publish.assert_awaited_once()
+
+    async def test_every_version_keeps_its_own_files(self):
+        self.watcher.updates.side_effect = [
+            model_update("model_1.h5"), TimeoutError(), model_update("model_1.h5"), TimeoutError(), asyncio.CancelledError()
+        ]
+
+        await self.manager.watch_models()
+
+        first, second = (publish.args[0] for publish in self.registry.publish.call_args_list)
+        assert first != second
+        with open(first[0], "rb") as f:
+            assert f.read() == b"model_1.h5:1"
+        with open(second[0], "rb") as f:
+            assert f.read() == b"model_1.h5:2"
+
+    async def test_removes_versions_older_than_the_one_served(self):
+        self.registry = ModelRegistry()
+        self.manager.registry = self.registry
+        self.watcher.updates.side_effect = [
+            model_update("model_1.h5"), TimeoutError(), model_update("model_1.h5"), TimeoutError(),
+            model_update("model_1.h5"), TimeoutError(), asyncio.CancelledError()
+        ]
+        # The engine swaps in the second version and is still loading the third when the watcher cleans up
+        publish = self.registry.publish
+
+        async def publish_and_serve(paths):
+            version = await publish(paths)
+            if version.number == 2:
+                self.registry.served(version)
+            return version
+        self.registry.publish = publish_and_serve
+
+        await self.manager.watch_models()
+
+        assert sorted(os.listdir(self.tmp_dir.name)) == ["staging", "v2", "v3"]
@@ -0,0 +1,93 @@
+import json
+
+import h5py
+import numpy as np
+import pytest
+
+from src.numpy_backend import DenseLayer, StackedEnsemble, check_parity, load_dense_layers
+
+LEAKY_RELU = {"class_name": "LeakyReLU", "config": {"negative_slope": 0.01}}
+
+
+def get_weights(seed: int, shapes=((8, 16), (16, 4), (4, 3))):
+    rng = np.random.default_rng(seed)
+    return [(rng.normal(size=shape).astype(np.float32), rng.normal(size=shape[1]).astype(np.float32)) for shape in shapes]
+
+
+def write_model(path, weights, activations) -> str:
+    """
+    Dense layers laid out like Keras saves them to .h5.
+    """
+    names = [f"dense_{i}" for i in range(len(weights))]
+    with h5py.File(path, "w") as f:
+        f.attrs["model_config"] = json.dumps({"class_name": "Sequential", "config": {"layers": [
+            {"class_name": "Dense", "config": {"name": name, "activation": activation}}
+            for name, activation in zip(names, activations)
+        ]}})
+        model_weights = f.create_group("model_weights")
+        model_weights.attrs["layer_names"] = [name.encode() for name in names]
+        for name, (kernel, bias) in zip(names, weights):
+            group = model_weights.create_group(name)
+            group.attrs["weight_names"] = [f"{name}/kernel:0".encode(), f"{name}/bias:0".encode()]
+            group.create_dataset(f"{name}/kernel:0", data=kernel)
+            group.create_dataset(f"{name}/bias:0", data=bias)
+    return str(path)
+
+
+def reference_proba(weights, rows):
+    hidden = rows.astype(np.float64)
+    for i, (kernel, bias) in enumerate(weights):
+        hidden = hidden @ kernel + bias
+        if i < len(weights) - 1:
+            hidden = np.where(hidden > 0, hidden, 0.01 * hidden)
+    exp = np.exp(hidden - hidden.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def test_loads_the_dense_layers_of_a_keras_file(tmp_path):
+    weights = get_weights(0)
+    path = write_model(tmp_path / "model.h5", weights, [LEAKY_RELU, "relu", "softmax"])
+
+    layers = load_dense_layers(path)
+
+    assert [(layer.activation, layer.negative_slope) for layer in layers] == [("leaky_relu", 0.01), ("relu", 0.0), ("softmax", 0.0)]
+    for layer, (kernel, bias) in zip(layers, weights):
+        np.testing.assert_array_equal(layer.kernel, kernel)
+        np.testing.assert_array_equal(layer.bias, bias)
+
+
+def test_stacked_forward_pass_matches_each_model(tmp_path):
+    weights = [get_weights(seed) for seed in range(3)]
+    paths = [write_model(tmp_path / f"model_{seed}.h5", model, [LEAKY_RELU, LEAKY_RELU, "softmax"]) for seed, model in enumerate(weights)]
+    rows = np.random.default_rng(10).normal(size=(50, 8)).astype(np.float32)
+
+    ensemble = StackedEnsemble([load_dense_layers(path) for path in paths])
+    probabilities = ensemble.predict_proba(rows)
+
+    assert probabilities.shape == (3, 50, 3)
+    for member, model in enumerate(weights):
+        np.testing.assert_allclose(probabilities[member], reference_proba(model, rows), rtol=1e-4, atol=1e-6)
+    np.testing.assert_array_equal(ensemble.predict(rows), probabilities.argmax(axis=-1))
+
+
+def test_models_with_different_layers_cannot_be_stacked():
+    first = [DenseLayer(kernel, bias, "leaky_relu", 0.01) for kernel, bias in get_weights(0)]
+    second = [DenseLayer(kernel, bias, "leaky_relu", 0.01) for kernel, bias in get_weights(1, ((8, 16), (16, 3)))]
+
+    with pytest.raises(ValueError):
+        StackedEnsemble([first, second])
+
+
+def test_matches_keras(tmp_path):
+    # Keras needs one of its backends installed, the service itself runs without it
+    pytest.importorskip("keras")
+    from NNModel_lib import NNModel
+
+    paths = []
+    for seed in range(2):
+        model = NNModel(8, 3)
+        path = str(tmp_path / f"model_{seed}.h5")
+        model.model.save(path)
+        paths.append(path)
+
+    assert max(check_parity(paths, rows=256)) < 1e-5
@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+import pandas as pd
+from nats.js.api import ConsumerConfig
+
+from src.service import CANDLE_DATE_HEADER, PredictionService
+from src.wire_format import encode_message
+
+mock_environ = {
+        "STREAM_NAME": "market-data",
+        "CONSUMER_NAME": "prediction-engine",
+        "RAW_SUBJECT": "market-data.processed.15m.>"
+    }
+
+def get_features(first: int, rows: int) -> pd.DataFrame:
+    index = pd.Index(pd.date_range("2025-01-01", periods=first + rows, freq="15min")[first:].to_numpy(dtype="datetime64[ns]"), name="Date")
+    return pd.DataFrame({"RSI": np.arange(first, first + rows, dtype=np.float64)}, index=index)
+
+def get_msg(features: pd.DataFrame, wire_format: str = "columnar") -> Mock:
+    data, headers = encode_message(features.reset_index() if wire_format == "json" else features, wire_format)
+    return Mock(subject="market-data.processed.15m.BTC-USD", data=data, headers=headers, ack=AsyncMock(), nak=AsyncMock())
+
+class TestPredictionService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.patcher_os_environ = patch.dict("os.environ", mock_environ)
+        self.patcher_os_environ.start()
+        self.service = PredictionService()
+        self.service._js = AsyncMock()
+
+    async def asyncTearDown(self):
+        self.patcher_os_environ.stop()
+
+    async def test_creates_the_consumer_on_the_configured_subject(self):
+        self.service._js.consumer_info.side_effect = Exception("consumer not found")
+
+        await self.service._PredictionService__ensure_consumer()
+
+        config = self.service._js.add_consumer.call_args.args[1]
+        assert config.durable_name == "prediction-engine"
+        assert config.filter_subject == "market-data.processed.15m.>"
+
+    async def test_updates_the_filter_of_an_existing_consumer(self):
+        existing = ConsumerConfig(durable_name="prediction-engine", filter_subject="market-data.processed.>")
+        self.service._js.consumer_info.return_value = Mock(config=existing)
+
+        await self.service._PredictionService__ensure_consumer()
+
+        self.service._js.add_consumer.assert_awaited_once()
+        stream, config = self.service._js.add_consumer.call_args.args
+        assert stream == "market-data"
+        assert config.filter_subject == "market-data.processed.15m.>"
+
+    async def test_keeps_a_consumer_that_already_filters_the_subject(self):
+        existing = ConsumerConfig(durable_name="prediction-engine", filter_subject="market-data.processed.15m.>")
+        self.service._js.consumer_info.return_value = Mock(config=existing)
+
+        await self.service._PredictionService__ensure_consumer()
+
+        self.service._js.add_consumer.assert_not_awaited()
+
+    def score_rows(self):
+        scored = []
+
+        async def predict(rows):
+            scored.append(list(rows["RSI"]))
+            return np.zeros(len(rows), dtype=np.int64), np.ones(len(rows))
+
+        self.service._batcher.predict = predict
+        return scored
+
+    def published_dates(self):
+        return [call.kwargs["headers"][CANDLE_DATE_HEADER] for call in self.service._js.publish.call_args_list]
+
+    async def test_first_message_scores_only_the_latest_row(self):
+        scored = self.score_rows()
+        msg = get_msg(get_features(0, 5))
+
+        await self.service._PredictionService__process_message(msg)
+
+        assert scored == [[4.0]]
+        assert self.published_dates() == ["2025-01-01T01:00:00"]
+        headers = self.service._js.publish.call_args.kwargs["headers"]
+        assert headers["Nats-Msg-Id"].startswith(f"prediction.BTC-USD:{int(pd.Timestamp('2025-01-01T01:00').timestamp())}:")
+        msg.ack.assert_awaited_once()
+
+    async def test_later_messages_score_the_cursor_candle_again_and_rows_after_it(self):
+        scored = self.score_rows()
+
+        await self.service._PredictionService__process_message(get_msg(get_features(0, 5)))
+        await self.service._PredictionService__process_message(get_msg(get_features(2, 6)))
+        await self.service._PredictionService__process_message(get_msg(get_features(3, 5)))
+        await self.service._PredictionService__process_message(get_msg(get_features(0, 5)))
+
+        assert scored == [[4.0], [4.0, 5.0, 6.0, 7.0], [7.0]]
+        assert self.published_dates() == [
+            "2025-01-01T01:00:00", "2025-01-01T01:00:00", "2025-01-01T01:15:00", "2025-01-01T01:30:00",
+            "2025-01-01T01:45:00", "2025-01-01T01:45:00"
+        ]
+
+    async def test_a_revised_prediction_of_a_candle_is_not_deduplicated(self):
+        predictions = iter([[0], [0], [1]])
+
+        async def predict(rows):
+            return np.array(next(predictions)), np.ones(len(rows))
+        self.service._batcher.predict = predict
+
+        for _ in range(3):
+            await self.service._PredictionService__process_message(get_msg(get_features(0, 5)))
+
+        ids = [call.kwargs["headers"]["Nats-Msg-Id"] for call in self.service._js.publish.call_args_list]
+        # The open candle closed with the same outcome the first time and a different one the second
+        assert ids[0] == ids[1] != ids[2]
+
+    async def test_json_frames_carry_their_dates_in_a_column(self):
+        scored = self.score_rows()
+
+        await self.service._PredictionService__process_message(get_msg(get_features(0, 5), "json"))
+        await self.service._PredictionService__process_message(get_msg(get_features(0, 7), "json"))
+
+        assert scored == [[4.0], [4.0, 5.0, 6.0]]
+        assert self.published_dates()[-1] == "2025-01-01T01:30:00"
+
+    async def test_a_failed_publish_does_not_move_the_cursor(self):
+        scored = self.score_rows()
+        self.service._js.publish.side_effect = [Exception("no responders"), None]
+        msg = get_msg(get_features(0, 5))
+
+        await self.service._PredictionService__process_message(msg)
+        msg.nak.assert_awaited_once()
+        msg.ack.assert_not_awaited()
+        assert "BTC-USD" not in self.service._cursors
+
+        await self.service._PredictionService__process_message(msg)
+        assert scored == [[4.0], [4.0]]
+        msg.ack.assert_awaited_once()
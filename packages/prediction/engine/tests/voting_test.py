@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from src.voting import hard_vote, soft_vote
+
+
+def bincount_vote(predictions: np.ndarray, classes: int):
+    # The vote of every row before it was vectorized
+    winners = np.array([np.bincount(row, minlength=classes).argmax() for row in predictions.T])
+    confidence = np.array([np.bincount(row, minlength=classes).max() for row in predictions.T]) / predictions.shape[0]
+    return winners, confidence
+
+
+@pytest.mark.parametrize("members", [1, 4, 5])
+def test_hard_vote_matches_bincount(members):
+    predictions = np.random.default_rng(members).integers(0, 3, size=(members, 1000))
+
+    winners, confidence = hard_vote(predictions, 3)
+
+    expected_winners, expected_confidence = bincount_vote(predictions, 3)
+    np.testing.assert_array_equal(winners, expected_winners)
+    np.testing.assert_allclose(confidence, expected_confidence)
+
+
+def test_hard_vote_ties_go_to_the_lowest_class():
+    # Every row is a two-two tie
+    predictions = np.array([
+        [1, 2, 2, 2],
+        [0, 1, 0, 1],
+        [0, 1, 2, 2],
+        [1, 2, 0, 1]
+    ])
+
+    winners, confidence = hard_vote(predictions, 3)
+
+    np.testing.assert_array_equal(winners, [0, 1, 0, 1])
+    np.testing.assert_array_equal(winners, bincount_vote(predictions, 3)[0])
+    np.testing.assert_allclose(confidence, [0.5, 0.5, 0.5, 0.5])
+
+
+def test_soft_vote_averages_the_probabilities():
+    probabilities = np.array([
+        [[0.6, 0.3, 0.1], [0.1, 0.1, 0.8]],
+        [[0.2, 0.5, 0.3], [0.3, 0.3, 0.4]]
+    ])
+
+    winners, confidence = soft_vote(probabilities)
+
+    np.testing.assert_array_equal(winners, [0, 2])
+    np.testing.assert_allclose(confidence, [0.4, 0.6])